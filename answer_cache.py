@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of generated answers keyed by question embeddings.
+
+    A question whose embedding is within `threshold` cosine similarity of a
+    cached one gets the cached answer, so paraphrases and repeats ("what is
+    my haplogroup", "What is my haplogroup?") skip retrieval and the
+    completion. Embeddings live in one preallocated normalized matrix, so a
+    lookup is a single matrix-vector product. Entries expire after `ttl`
+    seconds, the least recently used entry is evicted when full, and the
+    whole cache is dropped when the knowledge base version changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 86400.0,
+        threshold: float = 0.95,
+    ) -> None:
+        """
+        Create an empty cache.
+        :param max_entries: Maximum number of cached answers.
+        :param ttl: Seconds before a cached answer expires.
+        :param threshold: Minimum cosine similarity for a hit.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        # slot -> (question, answer), least recently used first
+        self._entries: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        """Return the embedding as a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: str) -> None:
+        """
+        Drop every entry if the knowledge base version changed.
+        Must be called with the lock held.
+        """
+        if version != self.version:
+            if self._entries:
+                LOGGER.info(
+                    "Knowledge base changed, dropping %d cached answers",
+                    len(self._entries),
+                )
+            self._entries.clear()
+            self._valid[:] = False
+            self.version = version
+
+    def _drop(self, slot: int) -> None:
+        """Free a slot. Must be called with the lock held."""
+        self._entries.pop(slot, None)
+        self._valid[slot] = False
+
+    def get(
+        self, embedding: Sequence[float], version: str
+    ) -> Optional[Dict[str, Union[str, float]]]:
+        """
+        Find a cached answer for a question embedding.
+        :param embedding: The question embedding.
+        :param version: The current knowledge base version.
+        :return: Dict with the cached question, answer and similarity,
+            or None on a miss.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            # Expired entries are evicted first, so they never shadow a
+            # fresh match.
+            expired = self._valid & (time.time() - self._created > self.ttl)
+            for slot in np.flatnonzero(expired):
+                self._drop(int(slot))
+            hit = None
+            if self._entries and self._matrix is not None:
+                scores = self._matrix @ query
+                scores[~self._valid] = -np.inf
+                slot = int(np.argmax(scores))
+                similarity = float(scores[slot])
+                if similarity >= self.threshold:
+                    question, answer = self._entries[slot]
+                    self._entries.move_to_end(slot)
+                    hit = {
+                        "question": question,
+                        "answer": answer,
+                        "similarity": similarity,
+                    }
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return hit
+
+    def put(
+        self,
+        question: str,
+        embedding: Sequence[float],
+        answer: str,
+        version: str,
+    ) -> None:
+        """
+        Cache an answer, evicting the least recently used one if full.
+        :param question: The question that was answered.
+        :param embedding: The question embedding.
+        :param answer: The generated answer.
+        :param version: The knowledge base version the answer is based on.
+        :return: None.
+        """
+        if self.max_entries < 1:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._matrix = np.zeros(
+                    (self.max_entries, len(vector)), dtype=np.float32
+                )
+                self._entries.clear()
+                self._valid[:] = False
+            if len(self._entries) >= self.max_entries:
+                slot, _ = self._entries.popitem(last=False)
+                self._valid[slot] = False
+            slot = int(np.argmin(self._valid))
+            self._matrix[slot] = vector
+            self._valid[slot] = True
+            self._created[slot] = time.time()
+            self._entries[slot] = (question, answer)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Report cache counters.
+        :return: Dict with hits, misses, hit_rate and size.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
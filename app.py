@@ -18,24 +18,105 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import contextvars
+import functools
+import hmac
 import json
 import os
-from typing import Any, Dict, List, Optional, Tuple, Union
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+import numpy as np
 from flask import (
     Flask,
     Response,
+    g,
     jsonify,
+    make_response,
     render_template,
     request,
     send_from_directory,
+    stream_with_context,
 )
 from flask_cors import CORS
-from openai import OpenAI, OpenAIError
+from openai import (
+    NOT_GIVEN,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    NotGiven,
+    OpenAI,
+    OpenAIError,
+    RateLimitError,
+)
 from pinecone import Pinecone  # ServerlessSpec
 from pinecone.exceptions import PineconeException
 
-from utils import get_module_logger
+from answer_cache import SemanticAnswerCache
+from chunking import Passage, chunk_entry
+from circuit_breaker import STATE_VALUES, CircuitBreaker, CircuitOpenError
+from deadline import (
+    DeadlineExceeded,
+    deadline,
+    remaining,
+    stage,
+    upstream_timeout,
+)
+from embedding_cache import EmbeddingCache
+from fusion import reciprocal_rank_fusion, weighted_fusion
+from index_manifest import (
+    diff_manifest,
+    entry_hash,
+    kb_fingerprint,
+    load_manifest,
+    save_manifest,
+)
+from kb_store import SqliteKnowledgeBase
+from lexical import (
+    BM25Index,
+    build_exact_index,
+    detect_language,
+    normalize_question,
+)
+from metrics import (
+    MetricsRegistry,
+    begin_request,
+    emit_emf,
+    end_request,
+    server_timing,
+)
+from prompt_context import assemble_context, format_context
+from ratelimit import (
+    ConcurrencyLimiter,
+    RedisTokenBucket,
+    TokenBucket,
+    client_ip,
+    retry_after_header,
+)
+from singleflight import RedisSingleFlight, SingleFlight
+from utils import (
+    EXACT_TOKEN_COUNTS,
+    count_tokens,
+    get_module_logger,
+    logging_stats,
+)
+from vector_store import LocalVectorStore
 
 LOGGER = get_module_logger(__name__)
 
@@ -46,10 +127,71 @@ KB = "circassiandna-knowledgebase"
 OPENAI_API_KEY: Optional[str] = os.environ.get("OPENAI_API_KEY")
 PINECONE_API_KEY: Optional[str] = os.environ.get("PINECONE_API_KEY")
 PINECONE_INDEX: str = os.environ.get("PINECONE_INDEX", KB)
+KB_BACKEND: str = os.environ.get("KB_BACKEND", "json")
+KB_DB_PATH: str = os.environ.get("KB_DB_PATH", "knowledgebase.sqlite3")
+RETRIEVER_BACKEND: str = os.environ.get("RETRIEVER_BACKEND", "pinecone")
+RETRIEVAL_MODE: str = os.environ.get("RETRIEVAL_MODE", "vector")
+HYBRID_FUSION: str = os.environ.get("HYBRID_FUSION", "rrf")
+HYBRID_ALPHA: float = float(os.environ.get("HYBRID_ALPHA", "0.5"))
+LANGUAGE_ROUTING: bool = os.environ.get(
+    "LANGUAGE_ROUTING", "true"
+).lower() not in ("0", "false", "no")
+EXPAND_PASSAGES: bool = os.environ.get("EXPAND_PASSAGES", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+LOCAL_INDEX_PATH: str = os.environ.get("LOCAL_INDEX_PATH", "local_index.bin")
+LOCAL_INDEX_DTYPE: str = os.environ.get("LOCAL_INDEX_DTYPE", "float32")
 PINECONE_ENVIRONMENT: Optional[str] = os.environ.get("PINECONE_ENVIRONMENT")
 PINECONE_CLOUD: Optional[str] = os.environ.get("PINECONE_CLOUD")
 PINECONE_REGION: Optional[str] = os.environ.get("PINECONE_REGION")
 PINECONE_NAMESPACE: Optional[str] = os.environ.get("PINECONE_NAMESPACE")
+INDEX_MANIFEST: str = os.environ.get("INDEX_MANIFEST", "index_manifest.json")
+EMBEDDING_CACHE_PATH: str = os.environ.get(
+    "EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"
+)
+EMBEDDING_CACHE_SIZE: int = int(
+    os.environ.get("EMBEDDING_CACHE_SIZE", "100000")
+)
+CONTEXT_TOKEN_BUDGET: int = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+ANSWER_CACHE_SIZE: int = int(os.environ.get("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL: float = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD: float = float(
+    os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")
+)
+REDIS_URL: Optional[str] = os.environ.get("REDIS_URL")
+METRICS_DIR: Optional[str] = os.environ.get("METRICS_DIR") or None
+SERVER_TIMING: bool = os.environ.get("SERVER_TIMING", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+# On Lambda nobody can scrape /metrics across containers, so request
+# timings are logged as CloudWatch EMF records by default.
+METRICS_EMF: bool = os.environ.get(
+    "METRICS_EMF", "true" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else ""
+).lower() in ("1", "true", "yes")
+# Seconds a chat request may take end to end; 0 disables the deadline.
+REQUEST_DEADLINE: float = float(os.environ.get("REQUEST_DEADLINE", "25"))
+# Chat requests per client IP: sustained rate and burst; 0 disables.
+RATE_LIMIT_PER_MINUTE: float = float(
+    os.environ.get("RATE_LIMIT_PER_MINUTE", "20")
+)
+RATE_LIMIT_BURST: float = float(os.environ.get("RATE_LIMIT_BURST", "10"))
+# Chats run at once per worker, and chats allowed to wait; 0 disables.
+# The cap is per process: it needs threaded workers (gthread, see the
+# Dockerfile) with more threads than both together, since a sync worker
+# only ever runs one request.
+MAX_CONCURRENT_CHATS: int = int(os.environ.get("MAX_CONCURRENT_CHATS", "8"))
+CHAT_QUEUE_SIZE: int = int(os.environ.get("CHAT_QUEUE_SIZE", "4"))
+# Bearer token of trusted clients (nightly jobs): they skip the per-client
+# rate limit and may use /api/chat/batch, which is disabled without it.
+API_TOKEN: Optional[str] = os.environ.get("API_TOKEN") or None
+# Reverse proxies (load balancer, Render) in front of the app whose
+# X-Forwarded-For entries are trusted to identify the client. 0 uses the
+# peer address: without a proxy, X-Forwarded-For is whatever the client sent.
+TRUSTED_PROXIES: int = int(os.environ.get("TRUSTED_PROXIES", "0"))
 PORT_STR: Optional[str] = os.environ.get("PORT")
 PORT: int = int(PORT_STR) if PORT_STR is not None else 8080
 
@@ -60,68 +202,536 @@ LOGGER.info("Starting app on port %d", PORT)
 # -------------------
 MODEL = "gpt-4o-mini"
 TOP_N = 3  # for model
+CONTEXT_MIN_TOKENS = 50  # smallest budget left worth a truncated context
 BATCH_SIZE = 50  # for indexes
+DELETE_BATCH_SIZE = 1000  # max IDs per Pinecone delete request
+PINECONE_INDEX_CHECK_TTL = 300.0  # seconds between index existence checks
+PINECONE_POOL_MAXSIZE = 10  # keep-alive connections per worker process
+HYBRID_DEPTH_FACTOR = 3  # candidates per retriever = top_k * factor
+RETRIEVAL_WORKERS = 8  # threads running vector searches in hybrid mode
+EMBED_MODEL = "text-embedding-3-small"
+CHUNK_MAX_TOKENS = 256  # max tokens of an embedded passage
+CHUNK_OVERLAP_TOKENS = 32  # max tokens repeated between passages
+CHUNKING = {"max_tokens": CHUNK_MAX_TOKENS, "overlap": CHUNK_OVERLAP_TOKENS}
+EMBED_BATCH_SIZE = 100  # inputs per embeddings request
+EMBED_WORKERS = 4  # concurrent embeddings requests during build
+EMBED_MAX_RETRIES = 5  # attempts per batch before it is skipped
+EMBED_BACKOFF = 1.0  # base delay (seconds) for exponential backoff
+FLIGHT_LOCK_TTL = 60.0  # seconds a cross-worker leader lock is held at most
+FLIGHT_WAIT_TIMEOUT = 30.0  # max wait for another worker's answer
+FLIGHT_RESULT_TTL = 10.0  # seconds a shared answer stays in Redis
+METRICS_FLUSH_INTERVAL = 1.0  # seconds between per-worker metric snapshots
+CIRCUIT_FAILURES = 5  # consecutive upstream failures that open a circuit
+CIRCUIT_COOLDOWN = 30.0  # seconds an open circuit fails fast before probing
+METRICS_NAMESPACE = "cdna"  # metric name prefix (and CloudWatch namespace)
+LOOKUP_BUDGET_SHARE = 0.2  # of the deadline, for the answer cache lookup
+RETRIEVAL_BUDGET_SHARE = 0.4  # of what is left, for retrieval
+COMPLETION_MIN_BUDGET = 1.0  # seconds a completion needs to be worth trying
+LAMBDA_DEADLINE_MARGIN = 1.0  # seconds kept to respond before Lambda's timeout
+# An SDK retry would start with the request budget already spent: with a
+# deadline, failures go to the circuit breakers and fallbacks instead.
+OPENAI_MAX_RETRIES = 0 if REQUEST_DEADLINE else 2
+CHAT_QUEUE_TIMEOUT = 2.0  # seconds a queued chat waits for a slot at most
+RATE_LIMIT_MAX_CLIENTS = 100_000  # in-process buckets kept at most
+BATCH_WORKERS = 8  # questions of a batch answered concurrently
+# Questions per /api/chat/batch request: a few rounds of BATCH_WORKERS
+# fit in the one request budget the whole batch shares.
+MAX_BATCH_SIZE = 4 * BATCH_WORKERS
+TRY_AGAIN_ANSWER = (
+    "Sorry, I cannot answer right now. Please try again in a moment."
+)
+
+# Transient OpenAI failures worth retrying; anything else fails fast.
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError, RateLimitError)
 
 
+if not EXACT_TOKEN_COUNTS:
+    LOGGER.warning(
+        "tiktoken is not installed: passage and prompt token counts are "
+        "estimated"
+    )
+
 if not OPENAI_API_KEY:
     LOGGER.critical("OPENAI_API_KEY is missing!")
     raise RuntimeError("OPENAI_API_KEY is required")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=OPENAI_MAX_RETRIES)
 LOGGER.info("OpenAI client initialized.")
 
 
+def openai_timeout(minimum: float = 0.0) -> Union[float, NotGiven]:
+    """
+    Timeout for the next OpenAI call from the request deadline.
+    :param minimum: Seconds the call needs to be worth making.
+    :return: The seconds left, or NOT_GIVEN (client default) without a
+        deadline.
+    :raises DeadlineExceeded: If less than `minimum` is left.
+    """
+    timeout = upstream_timeout(minimum)
+    return NOT_GIVEN if timeout is None else timeout
+
+
+# Persistent embedding cache shared by index builds and queries.
+# An empty EMBEDDING_CACHE_PATH disables it.
+EMBEDDING_CACHE: Optional[EmbeddingCache] = None
+if EMBEDDING_CACHE_PATH:
+    try:
+        EMBEDDING_CACHE = EmbeddingCache(
+            EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_SIZE
+        )
+    except (OSError, sqlite3.Error) as err:
+        LOGGER.warning(
+            "Embedding cache disabled, cannot open %s: %s",
+            EMBEDDING_CACHE_PATH,
+            err,
+        )
+
+
 # -------------------
 # Load Knowledge Base
 # -------------------
-try:
-    with open("knowledgebase.json", "r", encoding="utf-8") as f:
-        KNOWLEDGEBASE: Dict[str, str] = json.load(f)
-    LOGGER.info("Knowledge base loaded: %d entries", len(KNOWLEDGEBASE))
-except (OSError, json.JSONDecodeError) as err:
-    LOGGER.critical("Failed to load knowledgebase.json: %s", err)
-    raise RuntimeError(f"Failed to load knowledgebase.json: {err}") from err
+# KB_BACKEND=sqlite reads entries on demand from the database written by
+# combine_jsons.py (or `python kb_store.py`) instead of holding the whole
+# JSON file in every worker; keyword search then uses its FTS5 index.
+KNOWLEDGEBASE: Mapping[str, str]
+if KB_BACKEND == "sqlite":
+    try:
+        KNOWLEDGEBASE = SqliteKnowledgeBase(KB_DB_PATH)
+    except (sqlite3.Error, ValueError) as err:
+        LOGGER.critical("Failed to open %s: %s", KB_DB_PATH, err)
+        raise RuntimeError(f"Failed to open {KB_DB_PATH}: {err}") from err
+else:
+    try:
+        with open("knowledgebase.json", "r", encoding="utf-8") as f:
+            KNOWLEDGEBASE = json.load(f)
+        LOGGER.info("Knowledge base loaded: %d entries", len(KNOWLEDGEBASE))
+    except (OSError, json.JSONDecodeError) as err:
+        LOGGER.critical("Failed to load knowledgebase.json: %s", err)
+        raise RuntimeError(
+            f"Failed to load knowledgebase.json: {err}"
+        ) from err
+
+
+def _kb_fingerprint(kb: Mapping[str, str]) -> str:
+    """
+    Hash a knowledge base, reusing the hash stored in a KB database.
+    :param kb: The knowledge base mapping key -> text.
+    :return: The knowledge base fingerprint.
+    """
+    if isinstance(kb, SqliteKnowledgeBase):
+        return kb.fingerprint
+    return kb_fingerprint(kb)
+
+
+# Inverted index for keyword (fallback) search, built once per process.
+# Not needed with a KB database, which has its own FTS5 index.
+_LEXICAL_STATE: Dict[str, Optional[BM25Index]] = {
+    "index": (
+        None
+        if isinstance(KNOWLEDGEBASE, SqliteKnowledgeBase)
+        else BM25Index(KNOWLEDGEBASE)
+    )
+}
+
+# Normalized question -> KB key, for answering pasted KB questions directly.
+_EXACT_STATE: Dict[str, Any] = {
+    "source": KNOWLEDGEBASE,
+    "size": len(KNOWLEDGEBASE),
+    "table": (
+        {}
+        if isinstance(KNOWLEDGEBASE, SqliteKnowledgeBase)
+        else build_exact_index(KNOWLEDGEBASE)
+    ),
+}
+
+# Content hash of the loaded KB; cached answers are tied to it.
+_KB_VERSION_STATE: Dict[str, Any] = {
+    "source": KNOWLEDGEBASE,
+    "size": len(KNOWLEDGEBASE),
+    "version": _kb_fingerprint(KNOWLEDGEBASE),
+}
+
+# Per-process cache of generated answers for near-duplicate questions.
+# ANSWER_CACHE_SIZE=0 disables it.
+ANSWER_CACHE: Optional[SemanticAnswerCache] = (
+    SemanticAnswerCache(
+        max_entries=ANSWER_CACHE_SIZE,
+        ttl=ANSWER_CACHE_TTL,
+        threshold=ANSWER_CACHE_THRESHOLD,
+    )
+    if ANSWER_CACHE_SIZE > 0
+    else None
+)
+
+# Concurrent identical questions share one retrieval + completion.
+# Threads of a worker always coalesce; with REDIS_URL, workers do too.
+SINGLE_FLIGHT: SingleFlight = SingleFlight()
+if REDIS_URL:
+    try:
+        SINGLE_FLIGHT = RedisSingleFlight.from_url(
+            REDIS_URL,
+            lock_ttl=FLIGHT_LOCK_TTL,
+            wait_timeout=FLIGHT_WAIT_TIMEOUT,
+            result_ttl=FLIGHT_RESULT_TTL,
+            # Degraded answers (kb_fallback, try_again) are not reused.
+            shareable=lambda answer: answer.get("source") == "llm",
+        )
+        LOGGER.info("Cross-worker single-flight enabled")
+    except ImportError:
+        LOGGER.warning("REDIS_URL is set but redis is not installed")
+
+# Per-worker circuit breakers: after CIRCUIT_FAILURES consecutive failures
+# an upstream is not called for CIRCUIT_COOLDOWN seconds, and requests go
+# straight to their fallback (keyword search, a KB answer) instead of
+# each waiting for a timeout. OpenAI circuits only count transient errors.
+CIRCUITS: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=CIRCUIT_FAILURES,
+        cooldown=CIRCUIT_COOLDOWN,
+        failure_types=failure_types,
+    )
+    for name, failure_types in (
+        ("pinecone", (Exception,)),
+        ("openai_embeddings", RETRYABLE_ERRORS),
+        ("openai_chat", RETRYABLE_ERRORS),
+    )
+}
+
+# Admission control for the chat endpoints: a token bucket per client IP
+# (shared by all workers with REDIS_URL) and a cap on the chats a worker
+# runs at once, with a short queue. Excess requests get a 429 at once.
+RATE_LIMITER: Optional[TokenBucket] = None
+if RATE_LIMIT_PER_MINUTE > 0:
+    _rate_limit = {
+        "rate": RATE_LIMIT_PER_MINUTE / 60.0,
+        "burst": RATE_LIMIT_BURST,
+        "max_keys": RATE_LIMIT_MAX_CLIENTS,
+    }
+    RATE_LIMITER = TokenBucket(**_rate_limit)
+    if REDIS_URL:
+        try:
+            RATE_LIMITER = RedisTokenBucket.from_url(REDIS_URL, **_rate_limit)
+            LOGGER.info("Shared rate limiting enabled")
+        except ImportError:
+            pass  # already warned for single-flight
+CHAT_SLOTS: Optional[ConcurrencyLimiter] = (
+    ConcurrencyLimiter(
+        MAX_CONCURRENT_CHATS, CHAT_QUEUE_SIZE, CHAT_QUEUE_TIMEOUT
+    )
+    if MAX_CONCURRENT_CHATS > 0
+    else None
+)
+
+
+# -------------------
+# Metrics
+# -------------------
+# Stage latencies, fallbacks, upstream errors and cache lookups, served
+# at /metrics. With METRICS_DIR, Gunicorn workers share their samples
+# through snapshot files so any worker can answer a scrape.
+METRICS = MetricsRegistry(
+    namespace=METRICS_NAMESPACE,
+    directory=METRICS_DIR,
+    flush_interval=METRICS_FLUSH_INTERVAL,
+)
+METRICS.describe(
+    "stage_seconds", "histogram", "Latency of chat pipeline stages."
+)
+METRICS.describe("request_seconds", "histogram", "HTTP request latency.")
+METRICS.describe("requests_total", "counter", "HTTP requests by status.")
+METRICS.describe(
+    "fallbacks_total", "counter", "Retrievals served by a fallback."
+)
+METRICS.describe(
+    "upstream_errors_total", "counter", "Failed OpenAI and Pinecone calls."
+)
+METRICS.describe(
+    "cache_requests_total", "counter", "Cache lookups by cache and result."
+)
+METRICS.describe("cache_entries", "gauge", "Entries held by each cache.")
+METRICS.describe(
+    "singleflight_calls", "gauge", "Coalesced answer generations by role."
+)
+METRICS.describe(
+    "log_records", "gauge", "Log records queued for output or dropped."
+)
+METRICS.describe(
+    "circuit_state", "gauge", "Circuit state: 0 closed, 1 half-open, 2 open."
+)
+METRICS.describe(
+    "circuit_rejected_calls", "gauge", "Calls short-circuited per circuit."
+)
+METRICS.describe(
+    "rejected_requests_total", "counter", "Chats refused with a 429."
+)
+METRICS.describe("chat_slots", "gauge", "Chats running or queued.")
+
+
+def _collect_gauges() -> List[Tuple[str, Dict[str, str], float]]:
+    """
+    Sample cache sizes, single-flight, log queue, circuit breaker and
+    chat slot counters for /metrics.
+    :return: (name, labels, value) gauge samples.
+    """
+    samples: List[Tuple[str, Dict[str, str], float]] = []
+    if ANSWER_CACHE is not None:
+        size = ANSWER_CACHE.stats()["size"]
+        samples.append(("cache_entries", {"cache": "answer"}, size))
+    if EMBEDDING_CACHE is not None:
+        size = EMBEDDING_CACHE.stats()["size"]
+        samples.append(("cache_entries", {"cache": "embedding"}, size))
+    for role, count in SINGLE_FLIGHT.stats().items():
+        samples.append(("singleflight_calls", {"role": role}, count))
+    for state, count in logging_stats().items():
+        samples.append(("log_records", {"state": state}, count))
+    for name, circuit in CIRCUITS.items():
+        stats = circuit.stats()
+        labels = {"circuit": name}
+        samples.append(("circuit_state", labels, STATE_VALUES[stats["state"]]))
+        samples.append(("circuit_rejected_calls", labels, stats["rejected"]))
+    if CHAT_SLOTS is not None:
+        slots = CHAT_SLOTS.stats()
+        for state in ("active", "waiting"):
+            samples.append(("chat_slots", {"state": state}, slots[state]))
+    return samples
+
+
+METRICS.add_collector(_collect_gauges)
 
 
 # -------------------
 # Embedding
 # -------------------
+# Question embeddings computed ahead in bulk by `answer_batch`, so the
+# per-question pipeline it runs does not embed them one by one again.
+_KNOWN_EMBEDDINGS: contextvars.ContextVar[Dict[str, List[float]]] = (
+    contextvars.ContextVar("known_embeddings", default={})
+)
+
+
 def embed_text(text: str) -> List[float]:
     """
     Generate an embedding using OpenAI.
     Uses the `text-embedding-3-small` embedding model.
     The dimension (1536) matches the Pinecone index configuration.
+    Vectors are served from the embedding cache when available.
     :param text: The input text to be converted into a vector representation.
     :return: A 1536-dim embedding vector corresponding to the input text.
     """
+    known = _KNOWN_EMBEDDINGS.get().get(text)
+    if known is not None:
+        return known
+    if EMBEDDING_CACHE is not None:
+        cached = EMBEDDING_CACHE.get(EMBED_MODEL, text)
+        result = "miss" if cached is None else "hit"
+        METRICS.inc(
+            "cache_requests_total", {"cache": "embedding", "result": result}
+        )
+        if cached is not None:
+            LOGGER.debug(
+                "Embedding cache hit for text of length %d", len(text)
+            )
+            return cached
     try:
-        model = "text-embedding-3-small"
-        response = client.embeddings.create(model=model, input=text)
+        timeout = openai_timeout()
+        with METRICS.timer("embedding"), CIRCUITS["openai_embeddings"]:
+            response = client.embeddings.create(
+                model=EMBED_MODEL, input=text, timeout=timeout
+            )
         LOGGER.debug("Embedding generated for text of length %d", len(text))
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        if EMBEDDING_CACHE is not None:
+            EMBEDDING_CACHE.put(EMBED_MODEL, text, embedding)
+        return embedding
     except OpenAIError as err:
         LOGGER.error(
             "Embedding generation failed for text='%s': %s", text, err
         )
+        METRICS.inc(
+            "upstream_errors_total",
+            {"service": "openai", "operation": "embeddings"},
+        )
+        raise
+    except (CircuitOpenError, DeadlineExceeded):
         raise
     except Exception:
         LOGGER.exception("Unexpected error during embedding generation.")
         raise
 
 
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Generate embeddings for several texts with a single OpenAI request.
+    The embeddings API accepts a list of inputs and tags every returned
+    item with its input position, so the output order matches `texts`.
+    Under a request deadline it is bounded by the time left and, like
+    `embed_text`, goes through the embeddings circuit breaker. Offline
+    builds skip the breaker and rely on `_embed_batch_with_retry`, so a few
+    rate-limited batches do not drop the rest of the build.
+    :param texts: The input texts to be converted into vectors.
+    :return: A list of 1536-dim embedding vectors, one per input text.
+    """
+    try:
+        timeout = openai_timeout()
+        circuit = (
+            nullcontext()
+            if remaining() is None
+            else CIRCUITS["openai_embeddings"]
+        )
+        with circuit:
+            response = client.embeddings.create(
+                model=EMBED_MODEL, input=texts, timeout=timeout
+            )
+        LOGGER.debug("Embeddings generated for %d texts", len(texts))
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in ordered]
+    except OpenAIError as err:
+        LOGGER.error(
+            "Batch embedding generation failed for %d texts: %s",
+            len(texts),
+            err,
+        )
+        raise
+
+
+def _embed_batch_with_retry(texts: List[str]) -> List[List[float]]:
+    """
+    Embed one batch, retrying transient failures with exponential backoff.
+    Non-retryable errors (bad request, auth) are raised immediately, and
+    under a request deadline the batch is not retried at all.
+    :param texts: The batch of input texts.
+    :return: A list of embedding vectors in the order of `texts`.
+    """
+    attempts = EMBED_MAX_RETRIES if remaining() is None else 1
+    for attempt in range(1, attempts + 1):
+        try:
+            return embed_texts(texts)
+        except RETRYABLE_ERRORS as err:
+            if attempt == attempts:
+                raise
+            # Full jitter keeps concurrent workers from retrying in lockstep.
+            delay = random.uniform(0, EMBED_BACKOFF * 2 ** (attempt - 1))
+            LOGGER.warning(
+                "Embedding batch failed (attempt %d/%d): %s. "
+                "Retrying in %.1fs",
+                attempt,
+                attempts,
+                err,
+                delay,
+            )
+            time.sleep(delay)
+    raise RuntimeError("EMBED_MAX_RETRIES must be >= 1")
+
+
+def embed_many(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Embed many texts in batches using a bounded pool of concurrent requests.
+    Texts found in the embedding cache are not sent to OpenAI. The rest are
+    grouped in batches of up to EMBED_BATCH_SIZE inputs with at most
+    EMBED_WORKERS batches in flight, each under the caller's deadline. A
+    batch that still fails after its retries (or finds the circuit open)
+    is logged and skipped, leaving None in place of its embeddings.
+    :param texts: The input texts to be converted into vectors.
+    :return: A list aligned with `texts` holding a vector or None.
+    """
+    results: List[Optional[List[float]]] = (
+        EMBEDDING_CACHE.get_many(EMBED_MODEL, texts)
+        if EMBEDDING_CACHE is not None
+        else [None] * len(texts)
+    )
+    missing = [i for i, emb in enumerate(results) if emb is None]
+    if EMBEDDING_CACHE is not None:
+        LOGGER.info(
+            "Embedding cache: %d hits, %d misses",
+            len(texts) - len(missing),
+            len(missing),
+        )
+    pending = [texts[i] for i in missing]
+    starts = range(0, len(pending), EMBED_BATCH_SIZE)
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run,
+                _embed_batch_with_retry,
+                pending[start : start + EMBED_BATCH_SIZE],
+            ): start
+            for start in starts
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            end = min(start + EMBED_BATCH_SIZE, len(pending))
+            try:
+                embeddings = future.result()
+            except (OpenAIError, CircuitOpenError, DeadlineExceeded) as err:
+                LOGGER.warning(
+                    "Skipping %d entries due to embedding failure: %s",
+                    end - start,
+                    err,
+                )
+                continue
+            if len(embeddings) != end - start:
+                LOGGER.warning(
+                    "Skipping batch: expected %d embeddings, got %d",
+                    end - start,
+                    len(embeddings),
+                )
+                continue
+            for i, emb in zip(missing[start:end], embeddings):
+                results[i] = emb
+            if EMBEDDING_CACHE is not None:
+                EMBEDDING_CACHE.put_many(
+                    EMBED_MODEL, pending[start:end], embeddings
+                )
+
+    return results
+
+
 # -------------------
 # Build indexes
 # -------------------
-def build_index(pc, index_name: str = PINECONE_INDEX) -> None:
+def _stale_vector_ids(idx, keep: Set[str]) -> List[str]:
     """
-    Build or rebuild the Pinecone index with knowledgebase data.
+    List the vector IDs stored in the namespace that are not in `keep`.
+    :param idx: The Pinecone index.
+    :param keep: IDs of the vectors the knowledge base still produces.
+    :return: The stale IDs, or an empty list if the index cannot be listed.
+    """
+    try:
+        return [
+            i
+            for page in idx.list(namespace=PINECONE_NAMESPACE)
+            for i in page
+            if i not in keep
+        ]
+    except PineconeException as err:
+        LOGGER.warning("Could not list stored vectors: %s", err)
+        return []
+
+
+def build_index(
+    pc, index_name: str = PINECONE_INDEX, full: bool = False
+) -> None:
+    """
+    Build or incrementally update the Pinecone index with knowledgebase data.
     This function checks if the specified Pinecone index exists and creates it
-    if necessary. It then embeds each entry from the knowledge base using
-    OpenAI's embedding API and uploads the vectors to Pinecone in batches.
+    if necessary. It then compares the knowledge base with the manifest of
+    the previous build (INDEX_MANIFEST): only new or changed entries are
+    split into passages, embedded in concurrent batches and upserted, and
+    vectors of removed entries (or of passages an entry no longer has) are
+    deleted. Without a manifest every entry is upserted first, then stored
+    vectors the build did not produce are deleted, so the index keeps
+    serving during a rebuild; if any entry fails to embed, nothing is
+    deleted and no manifest is written. Vector IDs are derived from entry keys, so
+    they stay stable when entries are inserted or reordered. Throughput is
+    logged in passages per second.
     :param pc: An initialized Pinecone client instance.
     :param index_name: Name of the index to create or update.
+    :param full: Ignore the manifest and re-embed every entry.
     :return: None.
     """
+    build_started = time.perf_counter()
     try:
         indexes = pc.list_indexes().names()
         LOGGER.info("Current Pinecone indexes: %s", indexes)
@@ -146,15 +756,50 @@ def build_index(pc, index_name: str = PINECONE_INDEX) -> None:
         idx = pc.Index(index_name)
         LOGGER.info("Indexes stats: %s", idx.describe_index_stats())
 
-        vectors = []
-        for i, (k, v) in enumerate(KNOWLEDGEBASE.items()):
-            try:
-                text = f"{k}\n{v}"
-                emb = embed_text(text)
-                vectors.append((str(i), emb, {"title": k, "text": v}))
-            except OpenAIError:
-                LOGGER.warning("Skipping entry %r due to embedding failure", k)
-                continue
+        manifest = (
+            {}
+            if full
+            else load_manifest(
+                INDEX_MANIFEST, index_name, PINECONE_NAMESPACE, CHUNKING
+            )
+        )
+        rebuild = not manifest and index_name in indexes
+
+        changed, removed = diff_manifest(KNOWLEDGEBASE, manifest)
+        LOGGER.info(
+            "Index update: %d new/changed, %d removed, %d unchanged",
+            len(changed),
+            len(removed),
+            len(KNOWLEDGEBASE) - len(changed),
+        )
+
+        passages = chunk_passages(changed)
+        started = time.perf_counter()
+        embeddings = embed_many([_embedding_input(p) for p in passages])
+        elapsed = time.perf_counter() - started
+
+        vectors = [
+            (p.id, emb, _vector_metadata(p))
+            for p, emb in zip(passages, embeddings)
+            if emb is not None
+        ]
+        LOGGER.info(
+            "Embedded %d/%d passages of %d entries in %.1fs "
+            "(%.1f passages/s)",
+            len(vectors),
+            len(passages),
+            len(changed),
+            elapsed,
+            len(vectors) / elapsed if elapsed > 0 else 0.0,
+        )
+        # An entry is only recorded once all of its passages are embedded;
+        # otherwise its old vectors stay and the next build retries it.
+        failed = {
+            p.parent for p, emb in zip(passages, embeddings) if emb is None
+        }
+        new_ids: Dict[str, List[str]] = {}
+        for p in passages:
+            new_ids.setdefault(p.parent, []).append(p.id)
 
         for i in range(0, len(vectors), BATCH_SIZE):
             batch = vectors[i : i + BATCH_SIZE]
@@ -170,10 +815,64 @@ def build_index(pc, index_name: str = PINECONE_INDEX) -> None:
             #     i + len(batch) - 1,
             #     len(batch),
             # )
-            idx.upsert(vectors=batch)
+            idx.upsert(vectors=batch, namespace=PINECONE_NAMESPACE)
             LOGGER.debug("Uploaded batch %d-%d", i, i + len(batch))
 
-        LOGGER.info("Index build complete with %d vectors.", len(vectors))
+        removed_ids = [i for k in removed for i in manifest[k]["ids"]]
+        for k in changed:
+            if k in failed:
+                continue
+            if k in manifest:
+                kept = set(new_ids[k])
+                removed_ids.extend(
+                    i for i in manifest[k]["ids"] if i not in kept
+                )
+            manifest[k] = {
+                "hash": entry_hash(k, KNOWLEDGEBASE[k]),
+                "ids": new_ids[k],
+            }
+        # A rebuild that could not embed every entry is incomplete: keep
+        # the stored vectors and write no manifest, so the next build
+        # retries the whole rebuild.
+        incomplete = rebuild and bool(failed)
+        if incomplete:
+            LOGGER.warning(
+                "%d entries failed to embed; keeping stored vectors and "
+                "not saving the manifest",
+                len(failed),
+            )
+        elif rebuild:
+            # Without a manifest we cannot tell which stored vectors are
+            # stale (e.g. legacy positional IDs), so once the new vectors
+            # are in, drop every stored ID this build did not produce.
+            removed_ids.extend(
+                _stale_vector_ids(idx, {p.id for p in passages})
+            )
+        for i in range(0, len(removed_ids), DELETE_BATCH_SIZE):
+            batch_ids = removed_ids[i : i + DELETE_BATCH_SIZE]
+            idx.delete(ids=batch_ids, namespace=PINECONE_NAMESPACE)
+            LOGGER.info("Deleted %d removed vectors", len(batch_ids))
+        for k in removed:
+            del manifest[k]
+
+        if not incomplete:
+            save_manifest(
+                INDEX_MANIFEST,
+                index_name,
+                PINECONE_NAMESPACE,
+                manifest,
+                CHUNKING,
+            )
+
+        total = time.perf_counter() - build_started
+        LOGGER.info(
+            "Index build complete: %d vectors upserted, %d deleted "
+            "in %.1fs (%.1f passages/s).",
+            len(vectors),
+            len(removed_ids),
+            total,
+            len(vectors) / total if total > 0 else 0.0,
+        )
     except PineconeException:
         LOGGER.exception("Pinecone operation failed during index build.")
         raise
@@ -182,92 +881,517 @@ def build_index(pc, index_name: str = PINECONE_INDEX) -> None:
         raise
 
 
+def chunk_passages(keys: List[str]) -> List[Passage]:
+    """
+    Split knowledge base entries into token-bounded, overlapping passages.
+    :param keys: The knowledge base keys (questions/titles) to split.
+    :return: The passages of all entries, entry by entry.
+    """
+    passages = [
+        p
+        for k in keys
+        for p in chunk_entry(
+            k, KNOWLEDGEBASE[k], CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+        )
+    ]
+    if len(passages) > len(keys):
+        LOGGER.info(
+            "Chunked %d entries into %d passages", len(keys), len(passages)
+        )
+    return passages
+
+
+def _embedding_input(passage: Passage) -> str:
+    """
+    Text embedded for a passage: its entry question, then the passage, so
+    every passage of a long answer still carries the question it answers.
+    :param passage: The passage.
+    :return: The embedding input.
+    """
+    return f"{passage.parent}\n{passage.text}"
+
+
+def _vector_metadata(passage: Passage) -> Dict[str, Any]:
+    """
+    Build the Pinecone metadata stored with a passage's vector.
+    The title is that of the parent entry, so retrieval results carry the
+    entry question and the passage text. The "lang" tag (language of the
+    entry question) lets queries filter to one language; entries without
+    a detectable language are untagged.
+    :param passage: The passage.
+    :return: Metadata dict with title, text, passage index and, if
+        detected, lang.
+    """
+    meta: Dict[str, Any] = {
+        "title": passage.parent,
+        "text": passage.text,
+        "passage": passage.index,
+    }
+    lang = detect_language(passage.parent)
+    if lang:
+        meta["lang"] = lang
+    return meta
+
+
+def build_local_index(path: str = LOCAL_INDEX_PATH) -> LocalVectorStore:
+    """
+    Build the embedding matrix used by the local retriever backend.
+    Every knowledge base entry is split into passages and embedded (reusing
+    the embedding cache, so rebuilding after a small KB edit only pays for
+    the changed entries). One row per passage is written with its entry
+    title and passage text as one mmap-able binary artifact, stored as
+    LOCAL_INDEX_DTYPE (float32 or float16). Rows are sharded by the
+    language of their question.
+    :param path: Path of the local index artifact file.
+    :return: The freshly built store.
+    """
+    started = time.perf_counter()
+    passages = chunk_passages(list(KNOWLEDGEBASE))
+    embeddings = embed_many([_embedding_input(p) for p in passages])
+    rows = [
+        (p, emb) for p, emb in zip(passages, embeddings) if emb is not None
+    ]
+    if len(rows) < len(passages):
+        LOGGER.warning(
+            "Local index is missing %d passages due to embedding failures",
+            len(passages) - len(rows),
+        )
+    if not rows:
+        raise RuntimeError("No embeddings available for the local index.")
+
+    store = LocalVectorStore(
+        np.array([emb for _, emb in rows], dtype=np.float32),
+        [p.parent for p, _ in rows],
+        [p.text for p, _ in rows],
+        [detect_language(p.parent) for p, _ in rows],
+    )
+    store.save(path, dtype=LOCAL_INDEX_DTYPE)
+    with _LOCAL_STORE_LOCK:
+        _LOCAL_STORE_STATE["store"] = store
+
+    elapsed = time.perf_counter() - started
+    LOGGER.info(
+        "Local index build complete with %d vectors in %.1fs "
+        "(%.1f passages/s).",
+        len(store),
+        elapsed,
+        len(store) / elapsed if elapsed > 0 else 0.0,
+    )
+    return store
+
+
 # -------------------
-# Query
+# Pinecone connection
 # -------------------
-def query_index(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+_PINECONE_LOCK = threading.Lock()
+_PINECONE_STATE: Dict[str, Any] = {
+    "client": None,
+    "index": None,
+    "checked_at": None,
+}
+
+
+def get_pinecone_index() -> Optional[Any]:
     """
-    Query Pinecone index, fallback to knowledge base if unavailable.
-    :param query: Search query.
-    :param top_k: Max number of results.
-    :return: List of matched documents with
-        - entry title;
-        - entry text;
-        - similarity score (1.0 for keyword matches).
+    Return the process-wide Pinecone index handle, creating it lazily.
+    The client and `Index` handle are created once per process and reused,
+    so queries share pooled keep-alive connections. Whether the index exists
+    is checked via the control plane at most once every
+    PINECONE_INDEX_CHECK_TTL seconds instead of on every request.
+    :return: The Pinecone index handle, or None if the index does not exist.
     """
-    LOGGER.debug("Query received: %s (top_k=%d)", query, top_k)
-    if top_k < 1:
-        raise ValueError("top_k must be >= 1")
+    state = _PINECONE_STATE
+    checked_at = state["checked_at"]
+    if (
+        checked_at is not None
+        and time.monotonic() - checked_at < PINECONE_INDEX_CHECK_TTL
+    ):
+        return state["index"]
 
-    def _fallback_search() -> List[Dict[str, Union[str, float]]]:
-        """
-        Perform a simple keyword search over the local knowledge base.
-        This function searches both the keys (titles) and values (content)
-        of the knowledge base dictionary for the given query string.
-        Matching entries are returned with a fixed score of 1.0.
-        :return: A list of matching entries.
-        """
-        results = []
-        for k, v in KNOWLEDGEBASE.items():
-            if query.lower() in k.lower() or query.lower() in v.lower():
-                results.append({"title": k, "text": v, "score": 1.0})
-        LOGGER.debug("Fallback search found %d results", len(results))
-        return results[:top_k]
+    with _PINECONE_LOCK:
+        # Another thread may have refreshed the state while we waited.
+        checked_at = state["checked_at"]
+        if (
+            checked_at is not None
+            and time.monotonic() - checked_at < PINECONE_INDEX_CHECK_TTL
+        ):
+            return state["index"]
 
-    try:
-        if not PINECONE_API_KEY:
-            LOGGER.warning(
-                "PINECONE_API_KEY not set. Using fallback KB search."
+        if state["client"] is None:
+            state["client"] = Pinecone(
+                api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT
             )
-            return _fallback_search()
+            LOGGER.info("Pinecone client initialized.")
 
-        # Initialize Pinecone client
-        pc = Pinecone(
-            api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT
-        )
+        with METRICS.timer("pinecone_list_indexes"), CIRCUITS["pinecone"]:
+            names = state["client"].list_indexes().names()
+        if PINECONE_INDEX in names:
+            if state["index"] is None:
+                state["index"] = state["client"].Index(
+                    PINECONE_INDEX,
+                    connection_pool_maxsize=PINECONE_POOL_MAXSIZE,
+                )
+                LOGGER.info(
+                    "Pinecone index handle created: %s", PINECONE_INDEX
+                )
+        else:
+            state["index"] = None
+        state["checked_at"] = time.monotonic()
+        return state["index"]
 
-        if PINECONE_INDEX not in pc.list_indexes().names():
-            LOGGER.warning(
-                "Pinecone index not found: %s. Using fallback KB search",
-                PINECONE_INDEX,
-            )
-            return _fallback_search()
 
-        idx = pc.Index(PINECONE_INDEX)
-        try:
-            q_emb = embed_text(query)
-        except OpenAIError as err:
-            LOGGER.error("OpenAI embedding generation failed: %s", err)
-            return _fallback_search()
+def reset_pinecone() -> None:
+    """
+    Drop the cached Pinecone client and index handle.
+    The next call to `get_pinecone_index` reconnects and re-checks the index.
+    :return: None.
+    """
+    with _PINECONE_LOCK:
+        _PINECONE_STATE.update(client=None, index=None, checked_at=None)
+
+
+# -------------------
+# Local vector store
+# -------------------
+_LOCAL_STORE_LOCK = threading.Lock()
+_LOCAL_STORE_STATE: Dict[str, Optional[LocalVectorStore]] = {"store": None}
+
 
-        # Query Pinecone API
+def get_local_store() -> Optional[LocalVectorStore]:
+    """
+    Return the process-wide local vector store, loading it on first use.
+    Loading only maps the artifact file into memory, so it is cheap even on
+    a cold start; pages are read from disk as searches touch them.
+    :return: The store, or None if no local index has been built.
+    """
+    store = _LOCAL_STORE_STATE["store"]
+    if store is not None:
+        return store
+    with _LOCAL_STORE_LOCK:
+        if _LOCAL_STORE_STATE["store"] is None:
+            try:
+                _LOCAL_STORE_STATE["store"] = LocalVectorStore.load(
+                    LOCAL_INDEX_PATH
+                )
+            except (OSError, ValueError, KeyError) as err:
+                LOGGER.warning(
+                    "Cannot load local index %s: %s", LOCAL_INDEX_PATH, err
+                )
+        return _LOCAL_STORE_STATE["store"]
+
+
+# -------------------
+# Retrievers
+# -------------------
+# A retriever takes (query, top_k, lang) and returns a list of
+# {"title", "text", "score"} dicts, best match first. A non-None lang
+# restricts the search to entries in that language.
+Retriever = Callable[[str, int, Optional[str]], List[Dict[str, Any]]]
+
+
+class RetrieverUnavailableError(RuntimeError):
+    """Raised when a retriever backend is not configured or not built."""
+
+
+def _pinecone_search(
+    query: str, top_k: int, lang: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Retrieve entries from the Pinecone index.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language to filter on (vector "lang" metadata).
+    :return: List of matched documents with title, text and score.
+    """
+    if not PINECONE_API_KEY:
+        raise RetrieverUnavailableError("PINECONE_API_KEY not set.")
+
+    idx = get_pinecone_index()
+    if idx is None:
+        raise RetrieverUnavailableError(
+            f"Pinecone index not found: {PINECONE_INDEX}."
+        )
+
+    q_emb = embed_text(query)
+
+    # Query Pinecone API, within what is left of the request deadline
+    timeout = upstream_timeout()
+    with METRICS.timer("pinecone_query"), CIRCUITS["pinecone"]:
         results = idx.query(
             vector=q_emb,
             top_k=top_k,
             namespace=PINECONE_NAMESPACE,
+            filter={"lang": {"$eq": lang}} if lang else None,
             include_metadata=True,
+            _request_timeout=timeout,
         )
 
-        # Extract matches
-        # Access matches correctly from the QueryResponse object
-        # Uses match.metadata.get() so missing keys won’t cause crashes.
-        data = [
-            {
-                "title": match.metadata.get("title"),
-                "text": match.metadata.get("text"),
-                "score": match.score,
-            }
-            for match in results.matches
-        ]
-        LOGGER.debug("Pinecone query returned %d matches", len(data))
+    # Extract matches
+    # Access matches correctly from the QueryResponse object
+    # Uses match.metadata.get() so missing keys won’t cause crashes.
+    return [
+        {
+            "title": match.metadata.get("title"),
+            "text": match.metadata.get("text"),
+            "score": match.score,
+        }
+        for match in results.matches
+    ]
+
+
+def _local_search(
+    query: str, top_k: int, lang: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Retrieve entries from the in-process NumPy vector store.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language shard to search.
+    :return: List of matched documents with title, text and score.
+    """
+    store = get_local_store()
+    if store is None:
+        raise RetrieverUnavailableError(
+            f"Local index not found: {LOCAL_INDEX_PATH}."
+        )
+    q_emb = embed_text(query)
+    with METRICS.timer("local_search"):
+        return store.search(q_emb, top_k, lang)
+
+
+RETRIEVERS: Dict[str, Retriever] = {
+    "pinecone": _pinecone_search,
+    "local": _local_search,
+}
+
+# Shared pool so hybrid retrieval overlaps the vector and BM25 searches.
+_RETRIEVAL_POOL = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval"
+)
+
+
+# -------------------
+# Keyword search
+# -------------------
+_LEXICAL_LOCK = threading.Lock()
+
+
+def get_lexical_index() -> Union[BM25Index, SqliteKnowledgeBase]:
+    """
+    Return the keyword index of the current knowledge base.
+    A KB database is its own (FTS5) index. Otherwise the BM25 index is
+    built at KB load; it is rebuilt only if KNOWLEDGEBASE has been
+    replaced or resized since (e.g. reloaded or patched in tests).
+    :return: The BM25 index or the KB database.
+    """
+    if isinstance(KNOWLEDGEBASE, SqliteKnowledgeBase):
+        return KNOWLEDGEBASE
+    index = _LEXICAL_STATE["index"]
+    if (
+        index is not None
+        and index.source is KNOWLEDGEBASE
+        and len(index) == len(KNOWLEDGEBASE)
+    ):
+        return index
+    with _LEXICAL_LOCK:
+        index = _LEXICAL_STATE["index"]
+        if (
+            index is None
+            or index.source is not KNOWLEDGEBASE
+            or len(index) != len(KNOWLEDGEBASE)
+        ):
+            index = _LEXICAL_STATE["index"] = BM25Index(KNOWLEDGEBASE)
+        return index
+
+
+def _fallback_search(
+    query: str, top_k: int, lang: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Perform a keyword search over the local knowledge base.
+    Uses the BM25 inverted index (or the FTS5 index of a KB database) over
+    keys (titles) and values (content), so results are ranked by relevance
+    and carry their BM25 score.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language to restrict the search to.
+    :return: A list of matching entries, best first.
+    """
+    with METRICS.timer("keyword_search"):
+        results = get_lexical_index().search(query, top_k, lang)
+    LOGGER.debug("Fallback search found %d results", len(results))
+    return results
+
+
+# -------------------
+# Query
+# -------------------
+def _vector_search(
+    query: str, top_k: int, lang: Optional[str] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Run the vector retriever selected by RETRIEVER_BACKEND.
+    Failures are logged here so that callers only decide what to fall
+    back to.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language partition to search.
+    :return: List of matched documents, or None if the retriever is
+        unavailable or failed.
+    """
+    retriever = RETRIEVERS.get(RETRIEVER_BACKEND)
+    if retriever is None:
+        LOGGER.error("Unknown RETRIEVER_BACKEND %r.", RETRIEVER_BACKEND)
+        return None
+
+    try:
+        data = retriever(query, top_k, lang)
+        LOGGER.debug(
+            "%s retriever returned %d matches", RETRIEVER_BACKEND, len(data)
+        )
         return data
+    except (
+        RetrieverUnavailableError,
+        CircuitOpenError,
+        DeadlineExceeded,
+    ) as err:
+        LOGGER.warning("%s", err)
+        return None
+
+    except OpenAIError as err:
+        LOGGER.error("OpenAI embedding generation failed: %s", err)
+        return None
+
     except PineconeException as err:
         LOGGER.error("Pinecone query failed: %s", err)
-        return _fallback_search()
+        METRICS.inc(
+            "upstream_errors_total",
+            {"service": "pinecone", "operation": "query"},
+        )
+        return None
 
     except Exception as err:
-        LOGGER.exception("Unexpected error during query_index(): %s", err)
-        return _fallback_search()
+        LOGGER.exception("Unexpected error during vector search: %s", err)
+        return None
+
+
+def _hybrid_search(
+    query: str, top_k: int, lang: Optional[str] = None, use_vector: bool = True
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Run vector and BM25 retrieval concurrently and fuse their rankings.
+    The vector search runs on the shared retrieval pool while BM25 runs in
+    the calling thread, so latency is that of the slower of the two.
+    Results are fused with reciprocal rank fusion or, with
+    HYBRID_FUSION="weighted", a HYBRID_ALPHA-weighted sum of normalized
+    scores. If the vector retriever fails, BM25 results are used alone.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language partition to search.
+    :param use_vector: False to use BM25 alone, e.g. when the vector
+        retriever just failed for this query.
+    :return: Fused list of matched documents, best first, and whether the
+        vector retriever answered.
+    """
+    depth = top_k * HYBRID_DEPTH_FACTOR
+    # Run in a copy of the request context so its stage timings count.
+    vector_future = (
+        _RETRIEVAL_POOL.submit(
+            contextvars.copy_context().run, _vector_search, query, depth, lang
+        )
+        if use_vector
+        else None
+    )
+    lexical_hits = _fallback_search(query, depth, lang)
+    vector_hits = vector_future.result() if vector_future else None
+
+    if vector_hits is None:
+        if use_vector:
+            LOGGER.warning(
+                "Vector search unavailable. Using BM25 results only."
+            )
+            METRICS.inc("fallbacks_total", {"reason": "hybrid_keyword_only"})
+        return lexical_hits[:top_k], False
+
+    if HYBRID_FUSION == "weighted":
+        fused = weighted_fusion(
+            [vector_hits, lexical_hits],
+            [HYBRID_ALPHA, 1.0 - HYBRID_ALPHA],
+            top_k,
+        )
+    else:
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+    LOGGER.debug(
+        "Hybrid search fused %d vector + %d BM25 hits into %d",
+        len(vector_hits),
+        len(lexical_hits),
+        len(fused),
+    )
+    return fused, True
+
+
+def _search(
+    query: str, top_k: int, lang: Optional[str], use_vector: bool = True
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Run the retrieval strategy selected by RETRIEVAL_MODE.
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :param lang: Optional language partition to search.
+    :param use_vector: False to skip the vector retriever, e.g. when it
+        just failed for this query.
+    :return: List of matched documents, best first, and whether the vector
+        retriever answered (False in lexical mode or after a fallback).
+    """
+    if RETRIEVAL_MODE == "lexical":
+        return _fallback_search(query, top_k, lang), False
+    if RETRIEVAL_MODE == "hybrid":
+        return _hybrid_search(query, top_k, lang, use_vector)
+
+    data = _vector_search(query, top_k, lang) if use_vector else None
+    if data is None:
+        if use_vector:
+            LOGGER.warning("Using fallback KB search.")
+            METRICS.inc("fallbacks_total", {"reason": "keyword_search"})
+        return _fallback_search(query, top_k, lang), False
+    return data, True
+
+
+def query_index(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    """
+    Query the configured retriever, fallback to knowledge base if unavailable.
+    RETRIEVAL_MODE selects the strategy: "vector" (default) uses the
+    RETRIEVER_BACKEND retriever, "pinecone" or "local" (the in-process NumPy
+    index built by `python app.py build local`); "lexical" uses BM25 only;
+    "hybrid" runs both concurrently and fuses the rankings.
+    With LANGUAGE_ROUTING, the query script (Cyrillic or Latin) selects the
+    Russian or English partition; if that yields fewer than `top_k`
+    results, they are topped up from a search over both languages (by
+    keyword only if the vector retriever failed for the first search).
+    :param query: Search query.
+    :param top_k: Max number of results.
+    :return: List of matched documents with
+        - entry title;
+        - entry text;
+        - similarity score (BM25 score for keyword matches,
+          fused score in hybrid mode).
+    """
+    LOGGER.debug("Query received: %s (top_k=%d)", query, top_k)
+    if top_k < 1:
+        raise ValueError("top_k must be >= 1")
+
+    lang = detect_language(query) if LANGUAGE_ROUTING else None
+    results, vector_answered = _search(query, top_k, lang)
+    if lang is not None and len(results) < top_k:
+        LOGGER.debug(
+            "Only %d %s results, searching all languages", len(results), lang
+        )
+        seen = {r["title"] for r in results}
+        # A vector retriever that just failed is not asked again.
+        extra, _ = _search(query, top_k, None, vector_answered)
+        extra = [r for r in extra if r["title"] not in seen]
+        results = results + extra[: top_k - len(results)]
+    return results
 
 
 # -------------------
@@ -277,19 +1401,16 @@ app = Flask(__name__, static_folder="static", template_folder="templates")
 
 # CORS(app)
 # CORS(app, origins=["https://circassiandna.com"])
+CORS_ORIGINS = [
+    "https://www.circassiandna.com",
+    "https://circassiandna.com",
+    "http://localhost:5000",
+    "http://localhost:8000",
+    "http://localhost:8080",
+]
 CORS(
     app,
-    resources={
-        r"/api/*": {
-            "origins": [
-                "https://www.circassiandna.com",
-                "https://circassiandna.com",
-                "http://localhost:5000",
-                "http://localhost:8000",
-                "http://localhost:8080",
-            ]
-        }
-    },
+    resources={r"/api/*": {"origins": CORS_ORIGINS}},
     # supports_credentials=True
 )
 
@@ -303,30 +1424,419 @@ def retrieve_context(
     question: str, top_n: int = TOP_N
 ) -> List[Dict[str, Any]]:
     """
-    Retrieve the most relevant knowledge base entries for a given question.
+    Retrieve the most relevant knowledge base passages for a given question.
+    Long entries are indexed as several passages, so by default only the
+    matching passage of an entry goes into the prompt. With
+    EXPAND_PASSAGES, each hit is replaced by its whole parent entry (once
+    per entry, at the rank of its best passage).
     :param question: The user's input question.
-    :param top_n: Maximum number of relevant entries to return.
+    :param top_n: Maximum number of relevant passages to return.
     :return: A list of dictionaries, each containing
         (q) The question/title from the knowledge base.
-        (a) The corresponding answer/text.
+        (a) The corresponding answer/text (passage or whole entry).
         (score) Relevance score from Pinecone, if available.
     """
     LOGGER.debug("Retrieving context for question: %s", question)
     try:
-        hits = query_index(question, top_k=top_n)
+        with METRICS.timer("retrieval"):
+            hits = query_index(question, top_k=top_n)
         LOGGER.info("Context retrieval found %d hits", len(hits))
+        if EXPAND_PASSAGES:
+            hits = expand_passages(hits)
         return [
             {"q": h["title"], "a": h["text"], "score": h.get("score")}
             for h in hits
         ]
     except PineconeException as err:
         LOGGER.exception("Pinecone query failed. %s", err)
+        METRICS.inc("fallbacks_total", {"reason": "no_context"})
         return []
     except Exception as err:
         LOGGER.exception("Unexpected error during context retrieval. %s", err)
+        METRICS.inc("fallbacks_total", {"reason": "no_context"})
         return []
 
 
+def expand_passages(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Replace passage hits by their whole parent entries.
+    :param hits: Retrieval results, best first.
+    :return: One hit per parent entry, with the entry text.
+    """
+    expanded: Dict[str, Dict[str, Any]] = {}
+    for hit in hits:
+        if hit["title"] not in expanded:
+            text = KNOWLEDGEBASE.get(hit["title"], hit["text"])
+            expanded[hit["title"]] = {**hit, "text": text}
+    return list(expanded.values())
+
+
+# -------------------
+# Exact Match
+# -------------------
+def _count_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup in the cache_requests_total metric."""
+    METRICS.inc(
+        "cache_requests_total",
+        {"cache": cache, "result": "hit" if hit else "miss"},
+    )
+
+
+def lookup_exact(question: str) -> Optional[str]:
+    """
+    Answer a question that is literally a knowledge base key.
+    Matching ignores case, whitespace, punctuation and "ё"/"е", and costs
+    one dict lookup (one indexed query with a KB database). The table is
+    rebuilt only if KNOWLEDGEBASE has been replaced or resized since it
+    was built.
+    :param question: The user's input question.
+    :return: The knowledge base answer, or None if there is no such key.
+    """
+    if isinstance(KNOWLEDGEBASE, SqliteKnowledgeBase):
+        entry = KNOWLEDGEBASE.lookup_exact(normalize_question(question))
+        _count_cache("exact", entry is not None)
+        if entry is None:
+            return None
+        LOGGER.info("Exact KB match: %r", entry[0])
+        return entry[1]
+    state = _EXACT_STATE
+    if state["source"] is not KNOWLEDGEBASE or state["size"] != len(
+        KNOWLEDGEBASE
+    ):
+        state.update(
+            source=KNOWLEDGEBASE,
+            size=len(KNOWLEDGEBASE),
+            table=build_exact_index(KNOWLEDGEBASE),
+        )
+    key = state["table"].get(normalize_question(question))
+    _count_cache("exact", key is not None)
+    if key is None:
+        return None
+    LOGGER.info("Exact KB match: %r", key)
+    return KNOWLEDGEBASE[key]
+
+
+# -------------------
+# Answer Cache
+# -------------------
+def get_kb_version() -> str:
+    """
+    Return the content hash of the current knowledge base.
+    Recomputed only if KNOWLEDGEBASE has been replaced or resized since
+    it was last hashed (e.g. reloaded or patched in tests).
+    :return: The knowledge base fingerprint.
+    """
+    state = _KB_VERSION_STATE
+    if state["source"] is not KNOWLEDGEBASE or state["size"] != len(
+        KNOWLEDGEBASE
+    ):
+        state.update(
+            source=KNOWLEDGEBASE,
+            size=len(KNOWLEDGEBASE),
+            version=_kb_fingerprint(KNOWLEDGEBASE),
+        )
+    return state["version"]
+
+
+def lookup_answer(
+    question: str,
+) -> Tuple[Optional[str], Optional[List[float]]]:
+    """
+    Look up a cached answer for a question or a close paraphrase of it.
+    The question embedding is returned so a generated answer can be stored
+    without embedding the question again.
+    :param question: The user's input question.
+    :return: A tuple of (cached answer or None, question embedding or None
+        if the cache is disabled or embedding failed).
+    """
+    if ANSWER_CACHE is None:
+        return None, None
+    try:
+        embedding = embed_text(question)
+    except (OpenAIError, CircuitOpenError, DeadlineExceeded) as err:
+        LOGGER.warning("Answer cache lookup skipped: %s", err)
+        return None, None
+
+    hit = ANSWER_CACHE.get(embedding, get_kb_version())
+    _count_cache("answer", hit is not None)
+    stats = ANSWER_CACHE.stats()
+    if hit is None:
+        LOGGER.debug("Answer cache miss (hit rate %.3f)", stats["hit_rate"])
+        return None, embedding
+    LOGGER.info(
+        "Answer cache hit for %r (similarity %.3f, hit rate %.3f)",
+        hit["question"],
+        hit["similarity"],
+        stats["hit_rate"],
+    )
+    return hit["answer"], embedding
+
+
+def store_answer(
+    question: str, embedding: Optional[List[float]], answer: Optional[str]
+) -> None:
+    """
+    Cache a generated answer under its question embedding.
+    :param question: The user's input question.
+    :param embedding: The question embedding from `lookup_answer`.
+    :param answer: The generated answer.
+    :return: None.
+    """
+    if ANSWER_CACHE is None or embedding is None or not answer:
+        return
+    ANSWER_CACHE.put(question, embedding, answer, get_kb_version())
+
+
+def answer_without_llm(
+    question: str,
+) -> Tuple[Optional[Dict[str, str]], Optional[List[float]]]:
+    """
+    Try the answers that need no retrieval or completion, cheapest first:
+    an exact knowledge base key, then the semantic answer cache (given
+    LOOKUP_BUDGET_SHARE of the request deadline).
+    :param question: The user's input question.
+    :return: A tuple of ({"answer", "source"} or None, question embedding
+        or None if it was not computed).
+    """
+    exact = lookup_exact(question)
+    if exact is not None:
+        return {"answer": exact, "source": "kb_exact"}, None
+    with stage(LOOKUP_BUDGET_SHARE):
+        cached, embedding = lookup_answer(question)
+    if cached is not None:
+        return {"answer": cached, "source": "answer_cache"}, embedding
+    return None, embedding
+
+
+def build_prompt(question: str, contexts: List[Dict[str, Any]]) -> str:
+    """
+    Build the chat completion prompt from the question and its context.
+    Contexts are deduplicated and fitted into CONTEXT_TOKEN_BUDGET tokens
+    (lowest ranked dropped or truncated first), so the prompt size is
+    bounded whatever retrieval returns.
+    :param question: The user's input question.
+    :param contexts: Entries returned by `retrieve_context`, best first.
+    :return: The prompt sent to the OpenAI model.
+    """
+    contexts, context_tokens = assemble_context(
+        contexts, CONTEXT_TOKEN_BUDGET, MODEL, CONTEXT_MIN_TOKENS
+    )
+    combined_context = "\n\n".join(format_context(c) for c in contexts)
+    prompt = (
+        "You are a helpful assistant for Circassian DNA.\n"
+        "First, check the knowledge base entries below.\n"
+        "If you find a relevant answer, use it directly.\n"
+        "If the knowledge base does not have a clear answer, "
+        "you may use your own knowledge.\n"
+        "Always prefer the knowledge base if there is a match.\n\n"
+        f"Knowledge base: {combined_context}\n\n"
+        f"Question: {question}\n"
+        "Answer:"
+    )
+    LOGGER.info(
+        "Prompt: %d tokens (%d in %d contexts)",
+        count_tokens(prompt, MODEL),
+        context_tokens,
+        len(contexts),
+    )
+    return prompt
+
+
+# -------------------
+# Answer Generation
+# -------------------
+class AnswerGenerationError(RuntimeError):
+    """Retrieval or completion failed; the message is safe to return."""
+
+
+# Completion failures answered without the LLM: an open chat circuit, or
+# a request deadline spent before or during the completion.
+DEGRADED_ERRORS = (CircuitOpenError, DeadlineExceeded, APITimeoutError)
+
+
+def degraded_answer(
+    question: str, contexts: List[Dict[str, Any]], err: Exception
+) -> Dict[str, str]:
+    """
+    Answer without a completion: the best retrieved entry if any,
+    otherwise a request to try again. Neither is cached.
+    :param question: The user's input question.
+    :param contexts: Entries returned by `retrieve_context`, best first.
+    :param err: Why no completion is available (see DEGRADED_ERRORS).
+    :return: {"answer", "source": "kb_fallback" | "try_again"}.
+    """
+    LOGGER.warning("Degraded answer for %r: %s", question, err)
+    if not contexts:
+        METRICS.inc("fallbacks_total", {"reason": "try_again"})
+        return {"answer": TRY_AGAIN_ANSWER, "source": "try_again"}
+    METRICS.inc("fallbacks_total", {"reason": "kb_answer"})
+    return {"answer": contexts[0]["a"], "source": "kb_fallback"}
+
+
+def generate_answer(
+    question: str, embedding: Optional[List[float]] = None
+) -> Dict[str, str]:
+    """
+    Answer a question with retrieval and a chat completion, then cache it.
+    Retrieval gets RETRIEVAL_BUDGET_SHARE of the time left before the
+    request deadline and the completion the rest. If the chat circuit is
+    open or the deadline leaves no time for a completion, a
+    `degraded_answer` is returned instead.
+    :param question: The user's input question.
+    :param embedding: The question embedding from `lookup_answer`.
+    :return: {"answer", "source"} with source "llm", "kb_fallback" or
+        "try_again".
+    :raises AnswerGenerationError: If retrieval or the completion fails.
+    """
+    try:
+        with stage(RETRIEVAL_BUDGET_SHARE):
+            contexts = retrieve_context(question)
+        LOGGER.info(
+            "Contexts retrieved: %d (%s)",
+            len(contexts),
+            ", ".join(repr(c["q"]) for c in contexts),
+        )
+        LOGGER.debug("Context texts: %s", contexts)
+    except PineconeException as err:
+        LOGGER.exception("Pinecone query failed.")
+        raise AnswerGenerationError(f"Pinecone error: {str(err)}") from err
+    except Exception as err:
+        LOGGER.exception("Unexpected error during context retrieval.")
+        raise AnswerGenerationError(
+            f"Context retrieval error: {str(err)}"
+        ) from err
+
+    prompt = build_prompt(question, contexts)
+    try:
+        timeout = openai_timeout(COMPLETION_MIN_BUDGET)
+        with METRICS.timer("completion"), CIRCUITS["openai_chat"]:
+            completion = client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                timeout=timeout,
+            )
+        answer = completion.choices[0].message.content
+    except DEGRADED_ERRORS as err:
+        return degraded_answer(question, contexts, err)
+    except OpenAIError as err:
+        LOGGER.exception("OpenAI API request failed.")
+        METRICS.inc(
+            "upstream_errors_total",
+            {"service": "openai", "operation": "completion"},
+        )
+        raise AnswerGenerationError(f"OpenAI API error: {str(err)}") from err
+    except Exception as err:
+        LOGGER.exception("Unexpected error during OpenAI request.")
+        raise AnswerGenerationError(
+            f"Answer generation error: {str(err)}"
+        ) from err
+
+    store_answer(question, embedding, answer)
+    return {"answer": answer, "source": "llm"}
+
+
+def flight_key(question: str) -> str:
+    """
+    Key under which identical questions are coalesced.
+    :param question: The user's input question.
+    :return: The normalized question tied to the current KB version.
+    """
+    return f"{get_kb_version()}:{normalize_question(question)}"
+
+
+def generate_answer_once(
+    question: str, embedding: Optional[List[float]] = None
+) -> Dict[str, str]:
+    """
+    Like `generate_answer`, but concurrent calls for the same normalized
+    question wait for the first one and share its answer (or error).
+    :param question: The user's input question.
+    :param embedding: The question embedding from `lookup_answer`.
+    :return: {"answer", "source"} as from `generate_answer`, or a
+        "try_again" answer if the deadline passes while waiting.
+    :raises AnswerGenerationError: If retrieval or the completion fails.
+    """
+    try:
+        return SINGLE_FLIGHT.do(
+            flight_key(question), lambda: generate_answer(question, embedding)
+        )
+    except DeadlineExceeded as err:
+        return degraded_answer(question, [], err)
+
+
+def answer_batch(
+    questions: List[str], workers: int = BATCH_WORKERS
+) -> List[Dict[str, str]]:
+    """
+    Answer many questions at once (FAQ regeneration, regression checks).
+    The questions are embedded together, EMBED_BATCH_SIZE per embeddings
+    request, instead of one request each, within LOOKUP_BUDGET_SHARE of
+    the time left. Then each distinct question goes through the
+    `/api/chat` pipeline (exact match, answer cache, retrieval,
+    completion) on a pool of `workers` threads, each under its own
+    REQUEST_DEADLINE, capped by the caller's deadline for the whole
+    batch. Duplicates are answered once.
+    :param questions: The questions, in order.
+    :param workers: Questions answered concurrently.
+    :return: One dict per question, in order: {"question", "answer",
+        "source"}, or {"question", "error"} if it failed. Questions the
+        deadline left no time to answer get the error "deadline exceeded"
+        instead of a degraded answer, so callers can retry them.
+    """
+    unique = list(dict.fromkeys(questions))
+    # Exact matches need no embedding.
+    to_embed = [q for q in unique if lookup_exact(q) is None]
+    with METRICS.timer("embedding"), stage(LOOKUP_BUDGET_SHARE):
+        embeddings = embed_many(to_embed) if to_embed else []
+    known = {q: e for q, e in zip(to_embed, embeddings) if e is not None}
+    LOGGER.info(
+        "Batch of %d questions (%d distinct, %d embedded)",
+        len(questions),
+        len(unique),
+        len(known),
+    )
+
+    def answer_one(question: str) -> Dict[str, str]:
+        """Answer one question like `chat()` does."""
+        with deadline(REQUEST_DEADLINE or None):
+            shortcut, q_emb = answer_without_llm(question)
+            if shortcut is not None:
+                return shortcut
+            answer = generate_answer_once(question, q_emb)
+            left = remaining()
+            if (
+                answer["source"] in ("kb_fallback", "try_again")
+                and left is not None
+                and left < COMPLETION_MIN_BUDGET
+            ):
+                return {"error": "deadline exceeded"}
+            return answer
+
+    token = _KNOWN_EMBEDDINGS.set(known)
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {
+                q: pool.submit(contextvars.copy_context().run, answer_one, q)
+                for q in unique
+            }
+    finally:
+        _KNOWN_EMBEDDINGS.reset(token)
+
+    answers: Dict[str, Dict[str, str]] = {}
+    for question, future in futures.items():
+        try:
+            answers[question] = {"question": question, **future.result()}
+        except AnswerGenerationError as err:
+            answers[question] = {"question": question, "error": str(err)}
+        except Exception as err:
+            LOGGER.exception("Batch question failed: %r", question)
+            answers[question] = {
+                "question": question,
+                "error": f"Answer generation error: {err}",
+            }
+    return [answers[q] for q in questions]
+
+
 # -------------------
 # Serve Static Files
 # -------------------
@@ -360,30 +1870,206 @@ def index() -> str:
 # -------------------
 # Heatlh Check
 # -------------------
+def health_status() -> Dict[str, Any]:
+    """
+    Summarize the server health from its circuit breakers.
+    :return: {"status": "ok" | "degraded", "circuits": {name: state}}.
+    """
+    circuits = {name: c.state for name, c in CIRCUITS.items()}
+    degraded = any(state != "closed" for state in circuits.values())
+    return {"status": "degraded" if degraded else "ok", "circuits": circuits}
+
+
 @app.route("/healthz")
-def healthz() -> Tuple[str, int]:
+def healthz() -> Tuple[Response, int]:
     """
     Health check endpoint to verify server status.
-    :return: A tuple containing a status message and HTTP status code.
+    A degraded server (some upstream circuit open) still answers, from
+    fallbacks, so the status code stays 200.
+    :return: A tuple containing the health JSON and HTTP status code.
     """
     LOGGER.debug("Health check requested")
-    return "OK", 200
+    return jsonify(health_status()), 200
+
+
+# -------------------
+# Metrics Endpoint
+# -------------------
+@app.before_request
+def start_request_metrics() -> None:
+    """
+    Start timing the request and collecting its stage spans.
+    :return: None.
+    """
+    g.metrics_token = begin_request()
+    g.metrics_started = time.perf_counter()
+
+
+@app.after_request
+def finish_request_metrics(response: Response) -> Response:
+    """
+    Record the request latency and status, and report its stage timings
+    in a Server-Timing header (and as an EMF log record with METRICS_EMF).
+    Streamed responses only report the stages before the stream started.
+    :param response: The response about to be sent.
+    :return: The same response.
+    """
+    token = g.pop("metrics_token", None)
+    if token is None:
+        return response
+    total = time.perf_counter() - g.pop("metrics_started")
+    spans = end_request(token)
+    endpoint = request.endpoint or "unknown"
+    METRICS.observe("request_seconds", total, {"endpoint": endpoint})
+    METRICS.inc(
+        "requests_total",
+        {"endpoint": endpoint, "status": str(response.status_code)},
+    )
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(spans, total)
+    if METRICS_EMF:
+        emit_emf(METRICS_NAMESPACE, {"endpoint": endpoint}, spans, total)
+    METRICS.flush()
+    return response
+
+
+@app.route("/metrics")
+def metrics() -> Response:
+    """
+    Expose metrics in the Prometheus text format.
+    With METRICS_DIR the samples of every worker sharing the directory
+    are merged; otherwise only this process is reported.
+    :return: Plain text response for a Prometheus scrape.
+    """
+    return Response(
+        METRICS.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# -------------------
+# Admission Control
+# -------------------
+def client_key() -> str:
+    """
+    Identify the client of the current request for rate limiting.
+    :return: The client IP, as seen through TRUSTED_PROXIES proxies.
+    """
+    return client_ip(
+        request.remote_addr,
+        request.headers.get("X-Forwarded-For"),
+        TRUSTED_PROXIES,
+    )
+
+
+def trusted_client() -> bool:
+    """
+    Whether the request carries the API_TOKEN bearer token.
+    :return: True for trusted clients (never without API_TOKEN).
+    """
+    if API_TOKEN is None:
+        return False
+    supplied = request.headers.get("Authorization", "")
+    return hmac.compare_digest(
+        supplied.encode("utf-8"), f"Bearer {API_TOKEN}".encode("utf-8")
+    )
+
+
+def too_many_requests(
+    message: str, retry_after: float, reason: str
+) -> Response:
+    """
+    Build a 429 response telling the client when to retry.
+    :param message: Error message for the JSON body.
+    :param retry_after: Seconds until a retry may be admitted.
+    :param reason: Metrics label ("rate_limit" or "concurrency").
+    :return: The JSON error response with a Retry-After header.
+    """
+    LOGGER.warning("Rejected chat from %s: %s", client_key(), reason)
+    METRICS.inc("rejected_requests_total", {"reason": reason})
+    response = jsonify({"error": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = retry_after_header(retry_after)
+    return response
+
+
+def admission_control(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Apply the per-client rate limit and the chat concurrency cap to a
+    view. Trusted clients (`trusted_client`) skip the rate limit.
+    Streamed responses hold their slot until the stream ends.
+    :param view: The Flask view function.
+    :return: The wrapped view.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Response:
+        if request.method == "OPTIONS":
+            return view(*args, **kwargs)
+        if RATE_LIMITER is not None and not trusted_client():
+            wait = RATE_LIMITER.acquire(client_key())
+            if wait > 0:
+                return too_many_requests(
+                    "Too many requests, please slow down.", wait, "rate_limit"
+                )
+        if CHAT_SLOTS is None:
+            return view(*args, **kwargs)
+        if not CHAT_SLOTS.acquire():
+            return too_many_requests(
+                "Server busy, please try again shortly.",
+                CHAT_QUEUE_TIMEOUT,
+                "concurrency",
+            )
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            CHAT_SLOTS.release()
+            raise
+        if response.is_streamed:
+            response.call_on_close(CHAT_SLOTS.release)
+        else:
+            CHAT_SLOTS.release()
+        return response
+
+    return wrapper
 
 
 # -------------------
 # Chat API Endpoint
 # -------------------
+def request_budget() -> Optional[float]:
+    """
+    Time budget of the current chat request: REQUEST_DEADLINE, and on
+    AWS Lambda at most the invocation time left minus a safety margin.
+    :return: Seconds, or None for no deadline.
+    """
+    budget = REQUEST_DEADLINE or None
+    context = request.environ.get("apig_wsgi.context")
+    if hasattr(context, "get_remaining_time_in_millis"):
+        left = context.get_remaining_time_in_millis() / 1000.0
+        left = max(left - LAMBDA_DEADLINE_MARGIN, 1e-3)
+        budget = left if budget is None else min(budget, left)
+    return budget
+
+
 @app.route("/api/chat", methods=["POST", "OPTIONS"])
+@admission_control
 def chat() -> Response:
     """
     Handle chat requests from the client.
 
     This endpoint:
       - Receives a JSON payload with a "question" field.
+      - Answers directly if the question is a knowledge base key, or with a
+        cached answer if a near-identical question was answered.
       - Retrieves relevant context from Pinecone or a fallback knowledge base.
-      - Constructs a prompt for the OpenAI model.
+      - Constructs a prompt for the OpenAI model. Identical questions in
+        flight at the same time share one retrieval and completion.
       - Returns the model's answer as JSON.
 
+    Every upstream call is bounded by what is left of the request
+    deadline (`request_budget`); when it runs out the answer comes from
+    the retrieved context, or asks the user to try again.
+
     Request JSON:
         {
             "question": "<user's question>"
@@ -391,7 +2077,9 @@ def chat() -> Response:
 
     Response JSON:
         {
-            "answer": "<generated answer>"
+            "answer": "<generated answer>",
+            "source": "llm" | "answer_cache" | "kb_exact" | "kb_fallback"
+                | "try_again"
         }
     :return: Flask response as JSON with generated answer or an error msg.
     """
@@ -424,58 +2112,228 @@ def chat() -> Response:
             response_data, status_code = error_response(
                 "No question provided", 400
             )
+        elif not isinstance(question, str):
+            response_data, status_code = error_response(
+                "Question must be a string", 400
+            )
         else:
-            try:
-                contexts = retrieve_context(question)
-                LOGGER.info("Contexts retrieved: %s", contexts)
-            except PineconeException as err:
-                LOGGER.exception("Pinecone query failed.")
-                response_data, status_code = error_response(
-                    f"Pinecone error: {str(err)}", 500
-                )
-            except Exception as err:
-                LOGGER.exception("Unexpected error during context retrieval.")
-                response_data, status_code = error_response(
-                    f"Context retrieval error: {str(err)}", 500
-                )
-            else:
-                LOGGER.info("Pinecone results: %s", contexts)
-                combined_context = "\n\n".join(
-                    f"Q: {c['q']}\nA: {c['a']}" for c in contexts
-                )
+            with deadline(request_budget()):
+                shortcut, q_emb = answer_without_llm(question)
+                if shortcut is not None:
+                    response_data = shortcut
+                else:
+                    try:
+                        response_data = generate_answer_once(question, q_emb)
+                    except AnswerGenerationError as err:
+                        response_data, status_code = error_response(
+                            str(err), 500
+                        )
 
-                prompt = (
-                    "You are a helpful assistant for Circassian DNA.\n"
-                    "First, check the knowledge base entries below.\n"
-                    "If you find a relevant answer, use it directly.\n"
-                    "If the knowledge base does not have a clear answer, "
-                    "you may use your own knowledge.\n"
-                    "Always prefer the knowledge base if there is a match.\n\n"
-                    f"Knowledge base: {combined_context}\n\n"
-                    f"Question: {question}\n"
-                    "Answer:"
+    return jsonify(response_data), status_code
+
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Format one Server-Sent Event.
+    The payload is JSON-encoded, so newlines in tokens never break framing.
+    :param data: The event payload.
+    :param event: Optional event name; unnamed events are "message".
+    :return: The event as text, terminated by a blank line.
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+@app.route("/api/chat/stream", methods=["POST", "OPTIONS"])
+@admission_control
+def chat_stream() -> Response:
+    """
+    Handle chat requests with a streamed answer.
+
+    Same request as `/api/chat`, but the answer is relayed token by token
+    as Server-Sent Events while OpenAI generates it, so the first words
+    reach the client after the retrieval and first-token latency instead of
+    after the whole generation.
+
+    Request JSON:
+        {
+            "question": "<user's question>"
+        }
+
+    Response (text/event-stream):
+        data: {"token": "<text>"}         (repeated)
+        event: done
+        data: {"source": "llm" | "answer_cache" | "kb_exact" | ...}
+    or, if generation fails (or the request deadline passes) midway:
+        event: error
+        data: {"error": "<message>"}
+
+    Invalid requests get the same JSON 400 errors as `/api/chat`.
+    :return: Flask streaming response, or a JSON error.
+    """
+    LOGGER.info("Chat stream API.")
+    if request.method == "OPTIONS":
+        return "", 204
+
+    try:
+        data = request.json or {}
+    except Exception as err:
+        LOGGER.exception("Invalid JSON in request. %s", err)
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    question = data.get("question")
+    if not question:
+        LOGGER.warning("Error response: No question provided")
+        return jsonify({"error": "No question provided"}), 400
+    if not isinstance(question, str):
+        LOGGER.warning("Error response: Question must be a string")
+        return jsonify({"error": "Question must be a string"}), 400
+
+    with deadline(request_budget()):
+        shortcut, q_emb = answer_without_llm(question)
+        if shortcut is not None:
+            return Response(
+                sse_event({"token": shortcut["answer"]})
+                + sse_event({"source": shortcut["source"]}, "done"),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+        with stage(RETRIEVAL_BUDGET_SHARE):
+            contexts = retrieve_context(question)
+        # The stream outlives this scope: carry the time left over to it.
+        budget = remaining()
+    prompt = build_prompt(question, contexts)
+
+    def generate() -> Iterator[str]:
+        """Relay completion deltas as SSE events."""
+        started = time.perf_counter()
+        first_token = None
+        tokens: List[str] = []
+        try:
+            if budget is not None and budget < COMPLETION_MIN_BUDGET:
+                raise DeadlineExceeded("no time left for a completion")
+            ends_at = None if budget is None else time.monotonic() + budget
+            with CIRCUITS["openai_chat"]:
+                stream = client.chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    timeout=NOT_GIVEN if budget is None else budget,
                 )
+                for chunk in stream:
+                    if ends_at is not None and time.monotonic() > ends_at:
+                        raise DeadlineExceeded("request deadline exceeded")
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if not token:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                        LOGGER.info("Time to first token: %.3fs", first_token)
+                        METRICS.observe(
+                            "stage_seconds",
+                            first_token,
+                            {"stage": "first_token"},
+                        )
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+        except DEGRADED_ERRORS as err:
+            if tokens:
+                LOGGER.warning("Stream cut short: %s", err)
+                yield sse_event({"error": f"Answer timed out: {err}"}, "error")
+                return
+            fallback = degraded_answer(question, contexts, err)
+            yield sse_event({"token": fallback["answer"]})
+            yield sse_event({"source": fallback["source"]}, "done")
+            return
+        except OpenAIError as err:
+            LOGGER.exception("OpenAI API streaming request failed.")
+            METRICS.inc(
+                "upstream_errors_total",
+                {"service": "openai", "operation": "completion"},
+            )
+            yield sse_event({"error": f"OpenAI API error: {err}"}, "error")
+            return
+        except Exception as err:
+            LOGGER.exception("Unexpected error during OpenAI streaming.")
+            yield sse_event(
+                {"error": f"Answer generation error: {err}"}, "error"
+            )
+            return
+        elapsed = time.perf_counter() - started
+        LOGGER.info("Streamed answer in %.3fs", elapsed)
+        METRICS.observe("stage_seconds", elapsed, {"stage": "completion"})
+        store_answer(question, q_emb, "".join(tokens))
+        yield sse_event({"source": "llm"}, "done")
 
-                try:
-                    completion = client.chat.completions.create(
-                        model=MODEL,
-                        messages=[{"role": "user", "content": prompt}],
-                    )
-                    answer = completion.choices[0].message.content
-                except OpenAIError as err:
-                    LOGGER.exception("OpenAI API request failed.")
-                    response_data, status_code = error_response(
-                        f"OpenAI API error: {str(err)}", 500
-                    )
-                except Exception as err:
-                    LOGGER.exception("Unexpected error during OpenAI request.")
-                    response_data, status_code = error_response(
-                        f"Answer generation error: {str(err)}", 500
-                    )
-                else:
-                    response_data = {"answer": answer}
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx-style proxies from buffering the stream.
+            "X-Accel-Buffering": "no",
+        },
+    )
 
-    return jsonify(response_data), status_code
+
+@app.route("/api/chat/batch", methods=["POST", "OPTIONS"])
+@admission_control
+def chat_batch() -> Response:
+    """
+    Answer a list of questions in one request (see `answer_batch`).
+    Meant for internal jobs: it needs the API_TOKEN bearer token and is
+    disabled without one.
+
+    Request JSON:
+        {
+            "questions": ["<question>", ...]
+        }
+
+    Response JSON:
+        {
+            "results": [
+                {"question": "...", "answer": "...", "source": "..."}
+                or {"question": "...", "error": "..."},
+                ...
+            ]
+        }
+    Results are in the order of the questions.
+    :return: Flask response as JSON with the results or an error msg.
+    """
+    LOGGER.info("Chat batch API.")
+    if request.method == "OPTIONS":
+        return "", 204
+    if API_TOKEN is None:
+        return jsonify({"error": "Batch API is disabled"}), 403
+    if not trusted_client():
+        return jsonify({"error": "Invalid or missing API token"}), 401
+
+    data = request.get_json(silent=True)
+    questions = data.get("questions") if isinstance(data, dict) else None
+    if (
+        not isinstance(questions, list)
+        or not questions
+        or not all(isinstance(q, str) and q.strip() for q in questions)
+    ):
+        LOGGER.warning("Error response: invalid batch")
+        return (
+            jsonify(
+                {"error": "questions must be a list of non-empty strings"}
+            ),
+            400,
+        )
+    if len(questions) > MAX_BATCH_SIZE:
+        return (
+            jsonify(
+                {"error": f"At most {MAX_BATCH_SIZE} questions per request"}
+            ),
+            413,
+        )
+    with deadline(request_budget()):
+        results = answer_batch(questions)
+    return jsonify({"results": results}), 200
 
 
 # -------------------
@@ -486,10 +2344,18 @@ if __name__ == "__main__":
     import sys
 
     if len(sys.argv) > 1 and sys.argv[1] == "build":
-        if not PINECONE_API_KEY:
-            raise RuntimeError("PINECONE_API_KEY is required for index build.")
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        build_index(pc)
+        # python app.py build [pinecone|local] [--full]
+        args = sys.argv[2:]
+        target = next((a for a in args if a in RETRIEVERS), RETRIEVER_BACKEND)
+        if target == "local":
+            build_local_index()
+        else:
+            if not PINECONE_API_KEY:
+                raise RuntimeError(
+                    "PINECONE_API_KEY is required for index build."
+                )
+            pc = Pinecone(api_key=PINECONE_API_KEY)
+            build_index(pc, full="--full" in args)
     else:
         port = int(os.environ.get("PORT", PORT))
         app.run(host="0.0.0.0", port=port)
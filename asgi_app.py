@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI, OpenAIError
+from pinecone.exceptions import PineconeException
+
+from app import (
+    CIRCUITS,
+    COMPLETION_MIN_BUDGET,
+    CORS_ORIGINS,
+    DEGRADED_ERRORS,
+    METRICS,
+    MODEL,
+    OPENAI_API_KEY,
+    OPENAI_MAX_RETRIES,
+    RATE_LIMITER,
+    REQUEST_DEADLINE,
+    RETRIEVAL_BUDGET_SHARE,
+    SERVER_TIMING,
+    TRUSTED_PROXIES,
+    answer_without_llm,
+    build_prompt,
+    degraded_answer,
+    flight_key,
+    health_status,
+    openai_timeout,
+    retrieve_context,
+    store_answer,
+)
+from deadline import deadline, stage
+from metrics import begin_request, end_request, server_timing
+from ratelimit import RedisTokenBucket, client_ip, retry_after_header
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# -------------------
+# Environment
+# -------------------
+ASGI_BLOCKING_WORKERS: int = int(os.environ.get("ASGI_BLOCKING_WORKERS", "32"))
+
+# -------------------
+# Config
+# -------------------
+MAX_BODY_SIZE = 64 * 1024  # bytes accepted for a chat request body
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Completions are awaited on the event loop, so a worker holds hundreds of
+# chats while OpenAI generates. Retrieval (cache lookups, embeddings,
+# Pinecone/local/BM25 search with all their fallbacks) reuses the
+# synchronous pipeline of app.py on a bounded thread pool.
+ASYNC_CLIENT = AsyncOpenAI(
+    api_key=OPENAI_API_KEY, max_retries=OPENAI_MAX_RETRIES
+)
+_BLOCKING_POOL = ThreadPoolExecutor(
+    max_workers=ASGI_BLOCKING_WORKERS, thread_name_prefix="asgi-blocking"
+)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking function on the bounded thread pool.
+    It runs in a copy of the caller's context, so its stage timings are
+    reported for the current request.
+    :param func: The function to call.
+    :param args: Its positional arguments.
+    :return: The function result.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await loop.run_in_executor(_BLOCKING_POOL, call)
+
+
+# Identical questions in flight on this worker's event loop share one
+# retrieval + completion (the asyncio counterpart of app.SINGLE_FLIGHT).
+_IN_FLIGHT: Dict[str, "asyncio.Future[Tuple[Dict[str, str], int]]"] = {}
+
+
+# -------------------
+# Chat pipeline
+# -------------------
+async def answer_question(question: str) -> Tuple[Dict[str, str], int]:
+    """
+    Async counterpart of the `chat()` pipeline in app.py.
+    Same order and fallbacks: exact KB match, answer cache, retrieval
+    with keyword fallback, then the completion. Concurrent identical
+    questions wait for the first one and share its response.
+    :param question: The user's input question.
+    :return: A tuple of (response JSON, HTTP status code).
+    """
+    shortcut, q_emb = await run_blocking(answer_without_llm, question)
+    if shortcut is not None:
+        return shortcut, 200
+
+    key = flight_key(question)
+    pending = _IN_FLIGHT.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(generate_answer(question, q_emb))
+        _IN_FLIGHT[key] = pending
+        pending.add_done_callback(lambda _: _IN_FLIGHT.pop(key, None))
+    # Shielded so a client disconnecting does not cancel the shared task.
+    return await asyncio.shield(pending)
+
+
+async def generate_answer(
+    question: str, q_emb: Optional[List[float]]
+) -> Tuple[Dict[str, str], int]:
+    """
+    Retrieve context, await the completion and cache the answer.
+    :param question: The user's input question.
+    :param q_emb: The question embedding from the answer cache lookup.
+    :return: A tuple of (response JSON, HTTP status code).
+    """
+    try:
+        with stage(RETRIEVAL_BUDGET_SHARE):
+            contexts = await run_blocking(retrieve_context, question)
+        LOGGER.info("Contexts retrieved: %d", len(contexts))
+    except PineconeException as err:
+        LOGGER.exception("Pinecone query failed.")
+        return {"error": f"Pinecone error: {str(err)}"}, 500
+    except Exception as err:
+        LOGGER.exception("Unexpected error during context retrieval.")
+        return {"error": f"Context retrieval error: {str(err)}"}, 500
+
+    prompt = build_prompt(question, contexts)
+    try:
+        timeout = openai_timeout(COMPLETION_MIN_BUDGET)
+        with METRICS.timer("completion"), CIRCUITS["openai_chat"]:
+            completion = await ASYNC_CLIENT.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                timeout=timeout,
+            )
+        answer = completion.choices[0].message.content
+    except DEGRADED_ERRORS as err:
+        return degraded_answer(question, contexts, err), 200
+    except OpenAIError as err:
+        LOGGER.exception("OpenAI API request failed.")
+        METRICS.inc(
+            "upstream_errors_total",
+            {"service": "openai", "operation": "completion"},
+        )
+        return {"error": f"OpenAI API error: {str(err)}"}, 500
+    except Exception as err:
+        LOGGER.exception("Unexpected error during OpenAI request.")
+        return {"error": f"Answer generation error: {str(err)}"}, 500
+
+    store_answer(question, q_emb, answer)
+    return {"answer": answer, "source": "llm"}, 200
+
+
+# -------------------
+# ASGI plumbing
+# -------------------
+async def read_body(receive: Receive) -> Optional[bytes]:
+    """
+    Read the whole request body.
+    :param receive: The ASGI receive callable.
+    :return: The body, or None if it exceeds MAX_BODY_SIZE.
+    """
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def cors_headers(scope: Scope) -> List[Tuple[bytes, bytes]]:
+    """
+    Build CORS headers for /api/* responses, as flask-cors does for app.py.
+    :param scope: The ASGI connection scope.
+    :return: Headers allowing the request origin, if it is allowed.
+    """
+    origin = dict(scope["headers"]).get(b"origin", b"").decode("latin-1")
+    if not scope["path"].startswith("/api/") or origin not in CORS_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def send_response(
+    send: Send,
+    status: int,
+    body: bytes,
+    content_type: bytes = b"application/json",
+    headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+    """
+    Send a complete HTTP response.
+    :param send: The ASGI send callable.
+    :param status: HTTP status code.
+    :param body: Response body.
+    :param content_type: Response content type.
+    :param headers: Extra response headers.
+    :return: None.
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode("ascii")),
+                *(headers or []),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(
+    send: Send,
+    data: Dict[str, Any],
+    status: int,
+    headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+    """
+    Send a JSON response.
+    :param send: The ASGI send callable.
+    :param data: The JSON payload.
+    :param status: HTTP status code.
+    :param headers: Extra response headers.
+    :return: None.
+    """
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send_response(send, status, body, headers=headers)
+
+
+async def rate_limit_wait(scope: Scope) -> float:
+    """
+    Charge the request to its client's rate limit bucket.
+    Chats are not capped per worker here: the event loop is built to hold
+    many of them, and the blocking thread pool is bounded already.
+    :param scope: The ASGI connection scope.
+    :return: 0.0 if admitted, otherwise seconds until it would be.
+    """
+    if RATE_LIMITER is None:
+        return 0.0
+    forwarded = dict(scope["headers"]).get(b"x-forwarded-for", b"")
+    key = client_ip(
+        (scope.get("client") or (None,))[0],
+        forwarded.decode("latin-1"),
+        TRUSTED_PROXIES,
+    )
+    if isinstance(RATE_LIMITER, RedisTokenBucket):
+        return await run_blocking(RATE_LIMITER.acquire, key)
+    return RATE_LIMITER.acquire(key)
+
+
+async def chat(scope: Scope, receive: Receive, send: Send) -> None:
+    """
+    Handle POST /api/chat with the same contract as `chat()` in app.py.
+    :param scope: The ASGI connection scope.
+    :param receive: The ASGI receive callable.
+    :param send: The ASGI send callable.
+    :return: None.
+    """
+    headers = cors_headers(scope)
+    if scope["method"] == "OPTIONS":
+        if headers:
+            headers += [
+                (b"access-control-allow-methods", b"POST, OPTIONS"),
+                (b"access-control-allow-headers", b"Content-Type"),
+            ]
+        await send_response(send, 204, b"", headers=headers)
+        return
+
+    wait = await rate_limit_wait(scope)
+    if wait > 0:
+        LOGGER.warning("Rejected chat: rate_limit")
+        METRICS.inc("rejected_requests_total", {"reason": "rate_limit"})
+        headers.append((b"retry-after", retry_after_header(wait).encode()))
+        await send_json(
+            send,
+            {"error": "Too many requests, please slow down."},
+            429,
+            headers,
+        )
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, {"error": "Payload too large"}, 413, headers)
+        return
+    try:
+        data = json.loads(body) if body else {}
+        if not isinstance(data, dict):
+            raise ValueError("JSON payload must be an object")
+    except (TypeError, ValueError) as err:
+        LOGGER.warning("Invalid JSON in request. %s", err)
+        await send_json(send, {"error": "Invalid JSON payload"}, 400, headers)
+        return
+
+    question = data.get("question")
+    if not question:
+        LOGGER.warning("Error response: No question provided")
+        await send_json(send, {"error": "No question provided"}, 400, headers)
+        return
+    if not isinstance(question, str):
+        LOGGER.warning("Error response: Question must be a string")
+        await send_json(
+            send, {"error": "Question must be a string"}, 400, headers
+        )
+        return
+
+    token = begin_request()
+    started = time.perf_counter()
+    try:
+        with deadline(REQUEST_DEADLINE or None):
+            response_data, status_code = await answer_question(question)
+    finally:
+        total = time.perf_counter() - started
+        spans = end_request(token)
+    METRICS.observe("request_seconds", total, {"endpoint": "chat"})
+    METRICS.inc(
+        "requests_total", {"endpoint": "chat", "status": str(status_code)}
+    )
+    METRICS.flush()
+    if SERVER_TIMING:
+        headers.append(
+            (b"server-timing", server_timing(spans, total).encode("ascii"))
+        )
+    await send_json(send, response_data, status_code, headers)
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    """
+    Handle server startup and shutdown events.
+    :param receive: The ASGI receive callable.
+    :param send: The ASGI send callable.
+    :return: None.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            LOGGER.info("ASGI app started.")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await ASYNC_CLIENT.close()
+            _BLOCKING_POOL.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope: Scope, receive: Receive, send: Send) -> None:
+    """
+    ASGI entry point serving the chat API.
+    Run with e.g. `uvicorn asgi_app:application --workers 2`. The UI and
+    the other routes stay on the Flask app; /metrics reports the same
+    registry (merged across workers with METRICS_DIR).
+    :param scope: The ASGI connection scope.
+    :param receive: The ASGI receive callable.
+    :param send: The ASGI send callable.
+    :return: None.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"], scope["method"]
+    if path == "/api/chat" and method in ("POST", "OPTIONS"):
+        await chat(scope, receive, send)
+    elif path == "/healthz" and method in ("GET", "HEAD"):
+        await send_json(send, health_status(), 200)
+    elif path == "/metrics" and method == "GET":
+        await send_response(
+            send,
+            200,
+            METRICS.render().encode("utf-8"),
+            b"text/plain; version=0.0.4; charset=utf-8",
+        )
+    else:
+        await send_json(send, {"error": "Not found"}, 404)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+EMBED_DIM = 1536
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> List[float]:
+    """
+    Derive a deterministic pseudo-embedding from the text hash.
+    :param text: The input text.
+    :param dim: The vector dimension.
+    :return: The vector.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    # Map the hash bytes to [-1, 1]; reinterpreting raw bytes as floats
+    # yields NaN/inf values that cannot be packed or compared.
+    values = [b / 127.5 - 1.0 for b in digest]
+    return [values[i % 32] * ((i % 7) - 3) for i in range(dim)]
+
+
+def sleep_latency(latency: float, jitter: float) -> None:
+    """
+    Simulate upstream latency.
+    :param latency: Base delay in seconds.
+    :param jitter: Extra delay drawn uniformly from [0, jitter] seconds.
+    :return: None.
+    """
+    delay = latency + (random.uniform(0.0, jitter) if jitter else 0.0)
+    if delay > 0:
+        time.sleep(delay)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server with a listen backlog sized for load tests.
+    The default backlog of 5 makes bursts of connections wait for SYN
+    retransmits, which shows up as multi-second tail latencies.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answer the subset of the OpenAI REST API used by the app.
+    Latencies and jitter are configured on the server object.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        """Keep the benchmark output quiet."""
+
+    def _send_json(self, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Serve embeddings and chat completions."""
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/embeddings"):
+            inputs = payload["input"]
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            # The SDK asks for base64 (packed float32) unless told otherwise.
+            packed = payload.get("encoding_format") == "base64"
+            sleep_latency(self.server.embed_latency, self.server.jitter)
+            self._send_json(
+                {
+                    "object": "list",
+                    "model": payload.get("model"),
+                    "data": [
+                        {
+                            "object": "embedding",
+                            "index": i,
+                            "embedding": (
+                                base64.b64encode(
+                                    struct.pack(
+                                        f"<{EMBED_DIM}f", *fake_embedding(text)
+                                    )
+                                ).decode("ascii")
+                                if packed
+                                else fake_embedding(text)
+                            ),
+                        }
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                }
+            )
+        elif self.path.endswith("/chat/completions"):
+            sleep_latency(self.server.completion_latency, self.server.jitter)
+            self._send_json(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "A fake answer.",
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            )
+        else:
+            self.send_error(404)
+
+
+def start_server(
+    port: int = 0,
+    completion_latency: float = 2.0,
+    embed_latency: float = 0.05,
+    jitter: float = 0.0,
+) -> FakeServer:
+    """
+    Start the fake OpenAI server on a background thread.
+    :param port: TCP port; 0 picks a free one (see `server.server_port`).
+    :param completion_latency: Seconds per chat completion.
+    :param embed_latency: Seconds per embeddings request.
+    :param jitter: Max extra seconds added to every request.
+    :return: The running server; call `shutdown()` to stop it.
+    """
+    server = FakeServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.completion_latency = completion_latency
+    server.embed_latency = embed_latency
+    server.jitter = jitter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    """
+    Run the fake OpenAI server.
+    Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument(
+        "--completion-latency",
+        type=float,
+        default=2.0,
+        help="seconds per chat completion",
+    )
+    parser.add_argument(
+        "--embed-latency",
+        type=float,
+        default=0.05,
+        help="seconds per embeddings request",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="max extra seconds added to every request",
+    )
+    args = parser.parse_args()
+
+    server = FakeServer(("127.0.0.1", args.port), FakeOpenAIHandler)
+    server.completion_latency = args.completion_latency
+    server.embed_latency = args.embed_latency
+    server.jitter = args.jitter
+    print(f"Fake OpenAI listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
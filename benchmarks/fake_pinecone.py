@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from fake_openai import FakeServer, sleep_latency
+
+
+class FakeIndex:
+    """
+    In-memory dense index with cosine search and "$eq" metadata filters.
+    One instance serves every namespace.
+    """
+
+    def __init__(self, dimension: int) -> None:
+        self.dimension = dimension
+        self.lock = threading.Lock()
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.metadata: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        """Insert or replace vectors; returns the number written."""
+        with self.lock:
+            new_rows = []
+            for vector in vectors:
+                values = np.asarray(vector["values"], dtype=np.float32)
+                norm = np.linalg.norm(values) or 1.0
+                row = self.rows.get(vector["id"])
+                if row is None:
+                    self.rows[vector["id"]] = len(self.ids) + len(new_rows)
+                    new_rows.append(values / norm)
+                    self.ids.append(vector["id"])
+                    self.metadata.append(vector.get("metadata") or {})
+                else:
+                    self.matrix[row] = values / norm
+                    self.metadata[row] = vector.get("metadata") or {}
+            if new_rows:
+                self.matrix = np.vstack([self.matrix, np.array(new_rows)])
+        return len(vectors)
+
+    def delete(self, ids: List[str], delete_all: bool) -> None:
+        """Delete vectors by ID, or all of them."""
+        with self.lock:
+            keep = (
+                []
+                if delete_all
+                else [i for i, v in enumerate(self.ids) if v not in set(ids)]
+            )
+            self.ids = [self.ids[i] for i in keep]
+            self.metadata = [self.metadata[i] for i in keep]
+            self.matrix = self.matrix[keep]
+            self.rows = {v: i for i, v in enumerate(self.ids)}
+
+    def query(
+        self, vector: List[float], top_k: int, flt: Dict[str, Any]
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return (id, score, metadata) of the best matches."""
+        with self.lock:
+            if not self.ids:
+                return []
+            scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector) or 1.0
+            scores = scores / norm
+            for field, cond in (flt or {}).items():
+                wanted = cond.get("$eq") if isinstance(cond, dict) else cond
+                mask = np.array(
+                    [m.get(field) == wanted for m in self.metadata]
+                )
+                scores = np.where(mask, scores, -np.inf)
+            top = np.argsort(-scores)[:top_k]
+            return [
+                (self.ids[i], float(scores[i]), self.metadata[i])
+                for i in top
+                if np.isfinite(scores[i])
+            ]
+
+
+class FakePineconeHandler(BaseHTTPRequestHandler):
+    """
+    Answer the subset of the Pinecone control and data plane REST APIs
+    used by the app, on one host. Every index points back at this server.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        """Keep the benchmark output quiet."""
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _index_model(self, name: str) -> Dict[str, Any]:
+        host, port = self.server.server_address[:2]
+        return {
+            "name": name,
+            "dimension": self.server.indexes[name].dimension,
+            "metric": "cosine",
+            "host": f"http://{host}:{port}",
+            "vector_type": "dense",
+            "deletion_protection": "disabled",
+            "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+            "status": {"ready": True, "state": "Ready"},
+        }
+
+    def _index(self) -> FakeIndex:
+        # Data plane requests carry no index name; use the only/first one.
+        indexes = self.server.indexes
+        if not indexes:
+            indexes["default"] = FakeIndex(self.server.dimension)
+        return next(iter(indexes.values()))
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serve list_indexes, describe_index and list (one page)."""
+        if self.path.split("?")[0] == "/vectors/list":
+            index = self._index()
+            with index.lock:
+                ids = list(index.ids)
+            self._send_json(
+                {
+                    "vectors": [{"id": i} for i in ids],
+                    "namespace": "",
+                    "usage": {"readUnits": 1},
+                }
+            )
+        elif self.path.rstrip("/") == "/indexes":
+            self._send_json(
+                {
+                    "indexes": [
+                        self._index_model(n) for n in self.server.indexes
+                    ]
+                }
+            )
+        elif self.path.startswith("/indexes/"):
+            name = self.path.split("/")[2]
+            if name in self.server.indexes:
+                self._send_json(self._index_model(name))
+            else:
+                self._send_json({"error": {"code": "NOT_FOUND"}}, 404)
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Serve create_index, query, upsert, delete and index stats."""
+        payload = self._read_json()
+        path = self.path.rstrip("/")
+        if path == "/indexes":
+            name = payload["name"]
+            self.server.indexes.setdefault(
+                name, FakeIndex(payload.get("dimension", 1536))
+            )
+            self._send_json(self._index_model(name), 201)
+        elif path == "/query":
+            sleep_latency(self.server.query_latency, self.server.jitter)
+            matches = self._index().query(
+                payload["vector"],
+                payload.get("topK", 10),
+                payload.get("filter"),
+            )
+            self._send_json(
+                {
+                    "matches": [
+                        {"id": i, "score": score, "values": [], "metadata": m}
+                        for i, score, m in matches
+                    ],
+                    "namespace": payload.get("namespace", ""),
+                    "usage": {"readUnits": 1},
+                }
+            )
+        elif path == "/vectors/upsert":
+            sleep_latency(self.server.upsert_latency, self.server.jitter)
+            count = self._index().upsert(payload.get("vectors", []))
+            self._send_json({"upsertedCount": count})
+        elif path == "/vectors/delete":
+            self._index().delete(
+                payload.get("ids", []), payload.get("deleteAll", False)
+            )
+            self._send_json({})
+        elif path == "/describe_index_stats":
+            index = self._index()
+            self._send_json(
+                {
+                    "namespaces": {},
+                    "dimension": index.dimension,
+                    "indexFullness": 0.0,
+                    "totalVectorCount": len(index.ids),
+                }
+            )
+        else:
+            self.send_error(404)
+
+
+def start_server(
+    port: int = 0,
+    query_latency: float = 0.02,
+    upsert_latency: float = 0.05,
+    jitter: float = 0.0,
+    dimension: int = 1536,
+) -> FakeServer:
+    """
+    Start the fake Pinecone server on a background thread.
+    Point the SDK at it with PINECONE_CONTROLLER_HOST=http://127.0.0.1:<port>.
+    :param port: TCP port; 0 picks a free one (see `server.server_port`).
+    :param query_latency: Seconds per query.
+    :param upsert_latency: Seconds per upsert batch.
+    :param jitter: Max extra seconds added to queries and upserts.
+    :param dimension: Dimension of indexes created implicitly.
+    :return: The running server; call `shutdown()` to stop it.
+    """
+    server = FakeServer(("127.0.0.1", port), FakePineconeHandler)
+    server.indexes = {}
+    server.dimension = dimension
+    server.query_latency = query_latency
+    server.upsert_latency = upsert_latency
+    server.jitter = jitter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    """
+    Run the fake Pinecone server.
+    Point the app at it with PINECONE_CONTROLLER_HOST=http://127.0.0.1:<port>
+    (and any PINECONE_API_KEY).
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument(
+        "--query-latency", type=float, default=0.02, help="seconds per query"
+    )
+    parser.add_argument(
+        "--upsert-latency",
+        type=float,
+        default=0.05,
+        help="seconds per upsert batch",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="max extra seconds added to every query and upsert",
+    )
+    args = parser.parse_args()
+    server = start_server(
+        args.port, args.query_latency, args.upsert_latency, args.jitter
+    )
+    print(f"Fake Pinecone listening on http://127.0.0.1:{args.port}")
+    threading.Event().wait()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
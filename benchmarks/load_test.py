@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List
+
+import httpx
+
+QUESTIONS = [
+    "How do I order a Y-DNA test",
+    "What does my haplogroup say about my ancestry",
+    "Как заказать тест ДНК",
+    "Что такое гаплогруппа",
+]
+
+
+def process_tree_cpu(pid: int) -> float:
+    """
+    CPU seconds (user + system) used so far by a process and its children,
+    e.g. a Gunicorn or Uvicorn master and its workers. Linux only.
+    :param pid: The root process ID.
+    :return: CPU seconds.
+    """
+    tick = os.sysconf("SC_CLK_TCK")
+    children: Dict[int, List[int]] = {}
+    times: Dict[int, float] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="ascii") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        times[int(entry)] = (int(fields[11]) + int(fields[12])) / tick
+
+    total, stack = 0.0, [pid]
+    while stack:
+        current = stack.pop()
+        total += times.get(current, 0.0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param values: Sorted sample.
+    :param pct: Percentile in [0, 100].
+    :return: The percentile value, or 0.0 for an empty sample.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+async def run(
+    url: str, concurrency: int, requests: int, timeout: float
+) -> Dict[str, float]:
+    """
+    Send `requests` chat requests with `concurrency` in flight.
+    Every question is made unique so the exact-match path and the answer
+    cache do not short-circuit the pipeline.
+    :param url: The chat endpoint URL.
+    :param concurrency: Number of concurrent clients.
+    :param requests: Total number of requests.
+    :param timeout: Per-request timeout in seconds.
+    :return: Summary with throughput, latency percentiles and errors.
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            for i in counter:
+                question = f"{QUESTIONS[i % len(QUESTIONS)]} #{i}"
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(url, json={"question": question})
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+    }
+
+
+def main() -> None:
+    """
+    Load test a running chat server and print a JSON summary.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8080/api/chat")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--server-pid",
+        type=int,
+        help="server master PID; reports requests per server CPU second",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="CPU cores given to the server, for requests/s per core",
+    )
+    args = parser.parse_args()
+
+    cpu_before = process_tree_cpu(args.server_pid) if args.server_pid else 0
+    summary = asyncio.run(
+        run(args.url, args.concurrency, args.requests, args.timeout)
+    )
+    summary["cores"] = args.cores
+    summary["rps_per_core"] = round(summary["rps"] / args.cores, 2)
+    if args.server_pid:
+        cpu = process_tree_cpu(args.server_pid) - cpu_before
+        ok = summary["requests"] - summary["errors"]
+        summary["server_cpu_s"] = round(cpu, 2)
+        summary["requests_per_cpu_s"] = round(ok / cpu, 2) if cpu else 0.0
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
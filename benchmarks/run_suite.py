@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Metrics where a higher value is better; all others are lower-is-better.
+HIGHER_IS_BETTER = ("rps", "ops_per_s", "entries_per_s")
+COMPARED = ("rps", "ops_per_s", "entries_per_s", "p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param values: Sorted sample.
+    :param pct: Percentile in [0, 100].
+    :return: The percentile value, or 0.0 for an empty sample.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def memory() -> Dict[str, Optional[float]]:
+    """
+    Current and peak resident memory of this process.
+    :return: Dict with rss_mb (None where /proc is unavailable) and
+        peak_rss_mb.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    rss_mb = None
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_mb = int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return {
+        "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "peak_rss_mb": round(peak_mb, 1),
+    }
+
+
+def measure(
+    fn: Callable[[Any], Any], inputs: Sequence[Any], concurrency: int
+) -> Dict[str, Any]:
+    """
+    Call `fn` once per input from `concurrency` threads.
+    :param fn: The operation under test; an exception counts as an error.
+    :param inputs: One input per call.
+    :param concurrency: Number of calling threads.
+    :return: Summary with throughput, latency percentiles and errors.
+    """
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(item: Any) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            fn(item)
+        except Exception:  # pylint: disable=broad-except
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, inputs))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(inputs),
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def unique_questions(titles: Sequence[str], count: int) -> List[str]:
+    """
+    Sample knowledge base questions, made unique so that no exact-match or
+    cache shortcut is taken.
+    :param titles: Knowledge base keys.
+    :param count: Number of questions.
+    :return: The questions.
+    """
+    rng = random.Random(0)
+    return [f"{rng.choice(titles)} #{i}" for i in range(count)]
+
+
+def bench_build_index(app: Any, entries: int) -> Dict[str, Any]:
+    """
+    Build the (fake) Pinecone index from the first `entries` KB entries.
+    :param app: The imported app module.
+    :param entries: Number of knowledge base entries to index.
+    :return: Timing and throughput of the build.
+    """
+    full_kb = app.KNOWLEDGEBASE
+    app.KNOWLEDGEBASE = dict(list(full_kb.items())[:entries])
+    try:
+        started = time.perf_counter()
+        app.build_index(app.Pinecone(api_key=app.PINECONE_API_KEY), full=True)
+        elapsed = time.perf_counter() - started
+    finally:
+        app.KNOWLEDGEBASE = full_kb
+    return {
+        "entries": entries,
+        "elapsed_s": round(elapsed, 3),
+        "entries_per_s": round(entries / elapsed, 2),
+    }
+
+
+def bench_chat(
+    app: Any, questions: List[str], concurrency: int
+) -> Dict[str, Any]:
+    """
+    Drive POST /api/chat over HTTP on a threaded development server.
+    :param app: The imported app module.
+    :param questions: One question per request.
+    :param concurrency: Number of concurrent clients.
+    :return: Latency and throughput summary.
+    """
+    # pylint: disable=import-outside-toplevel
+    import http.client
+
+    from werkzeug.serving import make_server
+
+    # One access log line per request would dominate the output.
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = threading.local()
+
+    def post(question: str) -> None:
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection(
+                "127.0.0.1", server.server_port, timeout=60
+            )
+        try:
+            local.conn.request(
+                "POST",
+                "/api/chat",
+                body=json.dumps({"question": question}),
+                headers={"Content-Type": "application/json"},
+            )
+            resp = local.conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            del local.conn
+            raise
+        if resp.status != 200:
+            raise RuntimeError(f"HTTP {resp.status}")
+
+    try:
+        summary = measure(post, questions, concurrency)
+    finally:
+        server.shutdown()
+    summary["rps"] = summary.pop("ops_per_s")
+    return summary
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Start the fake upstreams, import the app against them and run every
+    selected scenario.
+    :param args: Parsed command line arguments.
+    :return: The results document.
+    """
+    sys.path.insert(0, HERE)
+    # pylint: disable=import-outside-toplevel
+    import fake_openai
+    import fake_pinecone
+
+    openai_server = fake_openai.start_server(
+        completion_latency=args.completion_latency,
+        embed_latency=args.embed_latency,
+        jitter=args.jitter,
+    )
+    pinecone_server = fake_pinecone.start_server(
+        query_latency=args.query_latency,
+        upsert_latency=args.upsert_latency,
+        jitter=args.jitter,
+    )
+    workdir = tempfile.mkdtemp(prefix="cdna-bench-")
+    os.environ.update(
+        {
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": (
+                f"http://127.0.0.1:{openai_server.server_port}/v1"
+            ),
+            "PINECONE_API_KEY": "fake",
+            "PINECONE_CONTROLLER_HOST": (
+                f"http://127.0.0.1:{pinecone_server.server_port}"
+            ),
+            "PINECONE_CLOUD": "aws",
+            "PINECONE_REGION": "us-east-1",
+            "RETRIEVER_BACKEND": "pinecone",
+            # Measure the pipeline, not the caches in front of it.
+            "EMBEDDING_CACHE_PATH": "",
+            "ANSWER_CACHE_SIZE": "0",
+            # Every simulated client is 127.0.0.1: admission control would
+            # answer most of the load with 429s.
+            "RATE_LIMIT_PER_MINUTE": "0",
+            "MAX_CONCURRENT_CHATS": "0",
+            "INDEX_MANIFEST": os.path.join(workdir, "index_manifest.json"),
+        }
+    )
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import app  # noqa: E402
+
+    # The index exists up front, as in production; build_index only fills it.
+    pinecone_server.indexes[app.PINECONE_INDEX] = fake_pinecone.FakeIndex(1536)
+    titles = list(app.KNOWLEDGEBASE)
+    results: Dict[str, Any] = {}
+    scenarios = {
+        "build_index": lambda: bench_build_index(app, args.build_entries),
+        "fallback_search": lambda: measure(
+            lambda q: app._fallback_search(q, app.TOP_N),
+            unique_questions(titles, args.iterations),
+            1,
+        ),
+        "query_index": lambda: measure(
+            lambda q: app.query_index(q, app.TOP_N),
+            unique_questions(titles, args.requests),
+            args.concurrency,
+        ),
+        "chat": lambda: bench_chat(
+            app, unique_questions(titles, args.requests), args.concurrency
+        ),
+    }
+    for name in args.scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = {**scenarios[name](), **memory()}
+
+    openai_server.shutdown()
+    pinecone_server.shutdown()
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("output", "compare")
+        },
+        "results": results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked out commit, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """
+    Print metric changes against a baseline run and list regressions.
+    :param baseline: A results document of an earlier run.
+    :param current: The results document of this run.
+    :param tolerance: Relative change tolerated before a regression.
+    :return: Descriptions of the regressions found.
+    """
+    regressions = []
+    for name, metrics in current["results"].items():
+        before = baseline.get("results", {}).get(name, {})
+        for metric in COMPARED:
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = " REGRESSION" if worse > tolerance else ""
+            line = f"{name}.{metric}: {old} -> {new} ({change:+.1%}){flag}"
+            print(line, file=sys.stderr)
+            if flag:
+                regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    """
+    Run the offline benchmark suite and write the results as JSON.
+    OpenAI and Pinecone are replaced by local fake servers with
+    configurable latency, so the suite needs no network or API keys.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["build_index", "fallback_search", "query_index", "chat"],
+        choices=["build_index", "fallback_search", "query_index", "chat"],
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--compare", help="results JSON of an earlier run to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="relative slowdown reported as a regression",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=2000,
+        help="keyword searches in the fallback_search scenario",
+    )
+    parser.add_argument(
+        "--build-entries",
+        type=int,
+        default=1000,
+        help="knowledge base entries indexed by the build_index scenario",
+    )
+    parser.add_argument("--completion-latency", type=float, default=0.5)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--upsert-latency", type=float, default=0.02)
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.01,
+        help="max extra seconds added to every fake upstream call",
+    )
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    document = run_suite(args)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(json.dumps(document["results"], indent=2))
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), document, args.tolerance)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -358,13 +358,30 @@ document.addEventListener('DOMContentLoaded', () => {
         toggle.style.display = 'block';
     });
 
+    // Bot bubble being filled by the streamed answer
+    let streamBubble = null;
+
     // Initialize ChatWidget
     ChatWidget.init({
         apiUrl: 'https://circassiandna-chatbot.onrender.com/api/chat',
+        streamUrl: 'https://circassiandna-chatbot.onrender.com/api/chat/stream',
         containerId: 'chatbot-messages',
+        onToken: (text) => {
+            removeTypingIndicator();
+            if (!streamBubble) {
+                streamBubble = addMessage('', 'bot');
+            }
+            streamBubble.textContent = text;
+            messages.scrollTop = messages.scrollHeight;
+        },
         onMessage: (msg, sender) => {
             removeTypingIndicator();
-            addMessage(msg, sender);
+            if (sender === 'bot' && streamBubble) {
+                streamBubble.textContent = msg;
+                streamBubble = null;
+            } else {
+                addMessage(msg, sender);
+            }
         },
         onTyping: () => {
             showTypingIndicator();
@@ -382,6 +399,7 @@ document.addEventListener('DOMContentLoaded', () => {
         setTimeout(() => {
             messages.scrollTop = messages.scrollHeight;
         }, 100);
+        return bubble;
     }
 
     function showTypingIndicator() {
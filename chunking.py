@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from typing import List, NamedTuple
+
+from index_manifest import entry_id
+from utils import count_tokens, get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Sentence ends (keeping the punctuation) and line breaks.
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+class Passage(NamedTuple):
+    """A token-bounded piece of a knowledge base entry."""
+
+    id: str  # vector ID
+    parent: str  # knowledge base key (question/title) of the entry
+    index: int  # position of the passage within the entry
+    text: str
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """
+    Split a sentence longer than `max_tokens` at word boundaries.
+    :param sentence: The sentence.
+    :param max_tokens: Max tokens per piece.
+    :return: The pieces, in order.
+    """
+    pieces: List[str] = []
+    words: List[str] = []
+    size = 0
+    for word in sentence.split():
+        n = count_tokens(word)
+        if words and size + n > max_tokens:
+            pieces.append(" ".join(words))
+            words, size = [], 0
+        words.append(word)
+        size += n
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+def split_passages(text: str, max_tokens: int, overlap: int) -> List[str]:
+    """
+    Split text into passages of at most `max_tokens` tokens.
+    Passages are packed from whole sentences (a sentence that alone
+    exceeds the limit is split at word boundaries), and each passage
+    repeats the trailing sentences of the previous one, up to `overlap`
+    tokens, so facts spanning a boundary are found in one passage.
+    :param text: The entry text.
+    :param max_tokens: Max tokens per passage.
+    :param overlap: Max tokens repeated from the previous passage.
+    :return: The passages, in order; short texts are returned whole.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    units: List[str] = []
+    for sentence in SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+        else:
+            units.extend(_split_long(sentence, max_tokens))
+
+    passages: List[str] = []
+    current: List[str] = []
+    sizes: List[int] = []
+    for unit in units:
+        n = count_tokens(unit)
+        if current and sum(sizes) + n > max_tokens:
+            passages.append(" ".join(current))
+            # Keep the longest tail within `overlap` that leaves room.
+            while current and (
+                sum(sizes) > overlap or sum(sizes) + n > max_tokens
+            ):
+                current.pop(0)
+                sizes.pop(0)
+        current.append(unit)
+        sizes.append(n)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def chunk_entry(
+    key: str, text: str, max_tokens: int, overlap: int
+) -> List[Passage]:
+    """
+    Split a knowledge base entry into passages linked to the entry.
+    An entry that fits in one passage keeps the vector ID of the entry,
+    so indexes built before chunking stay valid for short entries; the
+    passages of a longer entry get the IDs "<entry id>-<index>".
+    :param key: The knowledge base key (question/title).
+    :param text: The knowledge base value (answer/text).
+    :param max_tokens: Max tokens per passage.
+    :param overlap: Max tokens repeated between consecutive passages.
+    :return: The passages of the entry, in order.
+    """
+    parts = split_passages(text, max_tokens, overlap)
+    parent_id = entry_id(key)
+    if len(parts) == 1:
+        return [Passage(parent_id, key, 0, parts[0])]
+    return [
+        Passage(f"{parent_id}-{i}", key, i, part)
+        for i, part in enumerate(parts)
+    ]
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+from types import TracebackType
+from typing import Callable, Dict, Optional, Tuple, Type, Union
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+# Numeric encoding of the states for metrics.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        """
+        :param name: Name of the circuit.
+        :param retry_after: Seconds until the circuit lets a probe through.
+        """
+        super().__init__(
+            f"{name} circuit is open, retry in {retry_after:.1f}s"
+        )
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing upstream for a while.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately with `CircuitOpenError`, so callers take their
+    fallback in microseconds instead of waiting for another timeout.
+    After `cooldown` seconds the circuit is half-open: up to
+    `half_open_max` probe calls go through, and the first result closes
+    the circuit again (success) or reopens it for another cooldown
+    (failure). Only exceptions of `failure_types` count as failures;
+    other errors (e.g. a rejected request) prove the upstream answers.
+
+    Use as a context manager around the upstream call:
+
+        with breaker:
+            response = client.call()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        half_open_max: int = 1,
+        failure_types: Tuple[Type[BaseException], ...] = (Exception,),
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param name: Name of the circuit (logs, metrics, health).
+        :param failure_threshold: Consecutive failures that open it.
+        :param cooldown: Seconds it stays open before probing.
+        :param half_open_max: Concurrent probe calls when half-open.
+        :param failure_types: Exceptions counted as upstream failures.
+        :param clock: Monotonic time source (seconds).
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_max = half_open_max
+        self.failure_types = failure_types
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def _current_state(self) -> str:
+        """State after applying the cooldown. Call with the lock held."""
+        if (
+            self._state == OPEN
+            and self._clock() - self._opened_at >= self.cooldown
+        ):
+            self._state = HALF_OPEN
+            self._probes = 0
+            LOGGER.info("Circuit %s half-open, probing", self.name)
+        return self._state
+
+    @property
+    def state(self) -> str:
+        """The circuit state: "closed", "half_open" or "open"."""
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> None:
+        """
+        Reserve a call.
+        :return: None.
+        :raises CircuitOpenError: If the circuit is open, or half-open
+            with all probe slots taken.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return
+            self.rejected += 1
+            retry_after = max(
+                self.cooldown - (self._clock() - self._opened_at), 0.0
+            )
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        """Report a successful call; closes a half-open circuit."""
+        with self._lock:
+            if self._state != CLOSED:
+                LOGGER.info("Circuit %s closed", self.name)
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        """Report a failed call; may open the circuit."""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED
+                and self._failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self.opened += 1
+                LOGGER.warning(
+                    "Circuit %s opened after %d failures, cooling down %.0fs",
+                    self.name,
+                    self._failures,
+                    self.cooldown,
+                )
+
+    def __enter__(self) -> "CircuitBreaker":
+        self.allow()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc_type is not None and issubclass(exc_type, self.failure_types):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        """
+        Report the circuit state and counters.
+        :return: Dict with state, failures (consecutive), opened (times
+            the circuit opened) and rejected (calls short-circuited).
+        """
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
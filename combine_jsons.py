@@ -20,8 +20,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
+from kb_store import build_kb_database
 from utils import get_module_logger, remove_trailing_commas
 
 LOGGER = get_module_logger(__name__)
@@ -59,12 +60,15 @@ def combine_json_files(
     required_subdirs: str,
     input_filenames: List[str],
     output_file: str,
+    db_file: Optional[str] = None,
 ) -> None:
     """
     Combine multiple JSON dict files from a directory into one JSON file.
     :param input_dir: Directory containing JSON files.
     :param input_filenames: List of JSON file names to combine.
     :param output_file: Path to the output combined JSON file.
+    :param db_file: Optional path of a SQLite database (with an FTS5
+        index) to write the combined entries to as well.
     """
     combined_data = {}
     if check_subdirs(input_dir=input_dir, required_subdirs=required_subdirs):
@@ -110,6 +114,13 @@ def combine_json_files(
             else:
                 LOGGER.warning("No valid JSON data to write.")
 
+        # Built once from the final merge (the JSON is rewritten per subdir).
+        if db_file and combined_data:
+            try:
+                build_kb_database(combined_data, db_file)
+            except Exception as err:
+                LOGGER.error("Failed to write database %s: %s", db_file, err)
+
     else:
         LOGGER.error(
             "Aborting combine: required subdirectories %s not found in %s",
@@ -125,7 +136,8 @@ def main() -> None:
     - Expects each file to contain a JSON object (dict at top-level).
     - Handles missing files and invalid JSON gracefully.
     - Merges all dicts into one combined dict.
-    - Saves the result into OUTPUT_FILE.
+    - Saves the result into OUTPUT_FILE, and into a SQLite database with
+      a full-text index for KB_BACKEND=sqlite.
     """
 
     input_dir = "data"
@@ -144,8 +156,9 @@ def main() -> None:
         "miscellaneous",
     ]
     output_path = "knowledgebase.json"
+    db_path = "knowledgebase.sqlite3"
     combine_json_files(
-        input_dir, required_subdirs, input_filenames, output_path
+        input_dir, required_subdirs, input_filenames, output_path, db_path
     )
 
 
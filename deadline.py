@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Absolute time.monotonic() by which the current request must be done.
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request deadline passed before an upstream call was made."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound the enclosed block to `seconds` from now.
+    Nested deadlines can only shorten an outer one. The deadline is kept
+    in a context variable, so it follows the request into threads started
+    with `contextvars.copy_context().run`.
+    :param seconds: Time budget (<= 0 means already expired); None
+        leaves the block unbounded unless an outer deadline applies.
+    :return: Context manager.
+    """
+    outer = _DEADLINE.get()
+    at = outer
+    if seconds is not None:
+        at = time.monotonic() + seconds
+        if outer is not None:
+            at = min(at, outer)
+    token = _DEADLINE.set(at)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def stage(share: float) -> Iterator[None]:
+    """
+    Give the enclosed stage `share` of the remaining budget, keeping the
+    rest for later stages. Without a deadline this is a no-op.
+    :param share: Fraction (0-1] of the remaining time.
+    :return: Context manager.
+    """
+    left = remaining()
+    with deadline(None if left is None else left * share):
+        yield
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left before the current deadline.
+    :return: The remaining time (<= 0 once passed), or None if unbounded.
+    """
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+def upstream_timeout(minimum: float = 0.0) -> Optional[float]:
+    """
+    Timeout for the next upstream call: the time left before the deadline.
+    :param minimum: Seconds a call needs to be worth making.
+    :return: The timeout in seconds, or None if unbounded.
+    :raises DeadlineExceeded: If less than `minimum` (or nothing) is left.
+    """
+    left = remaining()
+    if left is not None and (left <= 0 or left < minimum):
+        raise DeadlineExceeded(f"request deadline exceeded ({left:.3f}s left)")
+    return left
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence, Union
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing so trivially different inputs share a key.
+    Applies Unicode NFC normalization and collapses runs of whitespace.
+    Case is preserved since it can change the embedding.
+    :param text: The raw input text.
+    :return: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache stored in a local SQLite database.
+
+    Entries are keyed by a hash of (model, normalized text) and vectors are
+    stored as packed float32 blobs (~6 KB per 1536-dim vector). The cache is
+    bounded to `max_entries` rows; when full, the least recently used rows
+    are evicted. Hit and miss counters are kept per process.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000) -> None:
+        """
+        Open (or create) the cache database.
+        :param path: Path to the SQLite file.
+        :param max_entries: Maximum number of cached vectors.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used"
+            " ON embeddings (last_used)"
+        )
+        self._size = self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()[0]
+        LOGGER.info(
+            "Embedding cache opened: %s (%d entries)", path, self._size
+        )
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        Build the cache key for a (model, text) pair.
+        :param model: The embedding model name.
+        :param text: The input text.
+        :return: A hex digest.
+        """
+        payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_many(
+        self, model: str, texts: Sequence[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Look up several texts at once.
+        :param model: The embedding model name.
+        :param texts: The input texts.
+        :return: A list aligned with `texts` holding a vector or None.
+        """
+        if not texts:
+            return []
+        keys = [self.make_key(model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay below SQLite's default host parameter limit.
+            for i in range(0, len(keys), 500):
+                chunk = list(set(keys[i : i + 500]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings"
+                    f" WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look up a single text.
+        :param model: The embedding model name.
+        :param text: The input text.
+        :return: The cached vector or None.
+        """
+        return self.get_many(model, [text])[0]
+
+    def put_many(
+        self,
+        model: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Store several vectors, evicting least recently used rows if needed.
+        :param model: The embedding model name.
+        :param texts: The input texts.
+        :param vectors: The embedding vectors aligned with `texts`.
+        :return: None.
+        """
+        now = time.time()
+        rows = [
+            (self.make_key(model, t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used)"
+                " VALUES (?, ?, ?)",
+                rows,
+            )
+            self._size += len(rows)
+            if self._size > self.max_entries:
+                self._evict()
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        """
+        Store a single vector.
+        :param model: The embedding model name.
+        :param text: The input text.
+        :param vector: The embedding vector.
+        :return: None.
+        """
+        self.put_many(model, [text], [vector])
+
+    def _evict(self) -> None:
+        """
+        Trim the table to 90% of `max_entries`, oldest rows first.
+        Evicting a margin below the bound amortizes the cost over many puts.
+        Must be called with the lock held.
+        """
+        size = self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()[0]
+        excess = size - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            LOGGER.info("Embedding cache evicted %d entries", excess)
+        self._size = max(size - max(excess, 0), 0)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Report cache counters.
+        :return: Dict with hits, misses, hit_rate and size.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": self._size,
+        }
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+Hits = List[Dict[str, Any]]
+
+
+def _best_per_title(hits: Hits) -> Hits:
+    """
+    Keep the first, i.e. best ranked, hit of each title in a ranked list.
+    :param hits: A ranked list of {"title", "text", "score"} hits.
+    :return: The hits with later passages of the same entry dropped.
+    """
+    seen = set()
+    best = []
+    for hit in hits:
+        if hit["title"] not in seen:
+            seen.add(hit["title"])
+            best.append(hit)
+    return best
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Hits], top_k: int, k: int = 60
+) -> Hits:
+    """
+    Fuse ranked result lists with reciprocal rank fusion (RRF).
+    Each hit scores sum(1 / (k + rank)) over the lists it appears in, so
+    only ranks matter and retrievers with incomparable scores (BM25 vs
+    cosine) can be combined without calibration. Hits are fused per entry
+    title; when a list holds several passages of one entry, only its best
+    ranked passage counts, so a long entry does not outscore a better
+    match by appearing many times.
+    :param result_lists: Ranked lists of {"title", "text", "score"} hits.
+    :param top_k: Max number of fused results.
+    :param k: RRF damping constant; 60 is the value from the original paper.
+    :return: Fused hits, best first, with the RRF score as "score".
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(_best_per_title(hits), start=1):
+            entry = fused.setdefault(hit["title"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)[
+        :top_k
+    ]
+
+
+def weighted_fusion(
+    result_lists: Sequence[Hits], weights: Sequence[float], top_k: int
+) -> Hits:
+    """
+    Fuse result lists by a weighted sum of their max-normalized scores.
+    Each list's scores are divided by its best score so that every list
+    contributes on a [0, 1] scale before weighting. As in
+    `reciprocal_rank_fusion`, only the best passage of an entry counts.
+    :param result_lists: Ranked lists of {"title", "text", "score"} hits.
+    :param weights: One weight per list.
+    :param top_k: Max number of fused results.
+    :return: Fused hits, best first, with the weighted score as "score".
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for hits, weight in zip(result_lists, weights):
+        best = max((h["score"] or 0.0 for h in hits), default=0.0)
+        for hit in _best_per_title(hits):
+            entry = fused.setdefault(hit["title"], {**hit, "score": 0.0})
+            if best > 0:
+                entry["score"] += weight * (hit["score"] or 0.0) / best
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)[
+        :top_k
+    ]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Gunicorn server hooks, loaded from ./gunicorn.conf.py by default.
+
+import os
+
+from metrics import clear_directory, mark_process_dead
+
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+
+
+def on_starting(server) -> None:
+    """
+    Drop metrics snapshots of an earlier run before workers start.
+    :param server: The Gunicorn arbiter.
+    :return: None.
+    """
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        clear_directory(METRICS_DIR)
+
+
+def child_exit(server, worker) -> None:
+    """
+    Fold an exited worker's metrics snapshot into the exited totals.
+    :param server: The Gunicorn arbiter.
+    :param worker: The worker that exited.
+    :return: None.
+    """
+    if METRICS_DIR:
+        mark_process_dead(worker.pid, METRICS_DIR)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Bump when the vector layout (IDs, metadata) changes so that the next
+# build re-embeds everything instead of trusting stale hashes.
+MANIFEST_VERSION = 3
+
+# key -> {"hash": entry hash, "ids": vector IDs of the entry's passages}
+Manifest = Dict[str, Dict[str, Any]]
+
+
+def entry_id(key: str) -> str:
+    """
+    Derive a stable vector ID from a knowledge base key.
+    The ID depends only on the key, so inserting or reordering entries in
+    the source files does not shift the IDs of other entries.
+    :param key: The knowledge base key (question/title).
+    :return: A hex digest usable as a Pinecone vector ID.
+    """
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def entry_hash(key: str, text: str) -> str:
+    """
+    Hash the embedded content of a knowledge base entry.
+    :param key: The knowledge base key (question/title).
+    :param text: The knowledge base value (answer/text).
+    :return: A hex digest that changes whenever the entry changes.
+    """
+    return hashlib.sha256(f"{key}\n{text}".encode("utf-8")).hexdigest()
+
+
+def kb_fingerprint(kb: Mapping[str, str]) -> str:
+    """
+    Hash the whole knowledge base content.
+    Used to invalidate anything derived from the KB (e.g. cached answers)
+    whenever an entry is added, removed or edited.
+    :param kb: The knowledge base mapping key -> text.
+    :return: A hex digest independent of entry order.
+    """
+    digest = hashlib.sha256()
+    for key in sorted(kb):
+        digest.update(entry_hash(key, kb[key]).encode("ascii"))
+    return digest.hexdigest()
+
+
+def load_manifest(
+    path: str,
+    index_name: str,
+    namespace: Optional[str],
+    chunking: Optional[Dict[str, int]] = None,
+) -> Manifest:
+    """
+    Load the manifest describing what is currently stored in the index.
+    A missing or unreadable manifest, or one written for another index,
+    namespace, chunking configuration or manifest version, is treated as
+    empty (full rebuild).
+    :param path: Path to the manifest JSON file.
+    :param index_name: Name of the index being built.
+    :param namespace: Namespace of the index being built.
+    :param chunking: Passage chunking parameters of the build.
+    :return: Mapping of key -> {"hash": ..., "ids": [...]}.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        LOGGER.info("No index manifest at %s, full build required", path)
+        return {}
+    except (OSError, json.JSONDecodeError) as err:
+        LOGGER.warning("Ignoring unreadable index manifest %s: %s", path, err)
+        return {}
+
+    if (
+        data.get("version") != MANIFEST_VERSION
+        or data.get("index") != index_name
+        or data.get("namespace") != namespace
+        or data.get("chunking") != chunking
+    ):
+        LOGGER.info("Index manifest %s is stale, full build required", path)
+        return {}
+    return data.get("entries", {})
+
+
+def save_manifest(
+    path: str,
+    index_name: str,
+    namespace: Optional[str],
+    entries: Manifest,
+    chunking: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    Atomically write the manifest next to its previous version.
+    :param path: Path to the manifest JSON file.
+    :param index_name: Name of the index that was built.
+    :param namespace: Namespace of the index that was built.
+    :param entries: Mapping of key -> {"hash": ..., "ids": [...]}.
+    :param chunking: Passage chunking parameters of the build.
+    :return: None.
+    """
+    data = {
+        "version": MANIFEST_VERSION,
+        "index": index_name,
+        "namespace": namespace,
+        "chunking": chunking,
+        "entries": entries,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+    LOGGER.info("Index manifest saved to %s (%d entries)", path, len(entries))
+
+
+def diff_manifest(
+    kb: Mapping[str, str], manifest: Manifest
+) -> Tuple[List[str], List[str]]:
+    """
+    Compare the knowledge base with the manifest.
+    :param kb: The knowledge base mapping key -> text.
+    :param manifest: The manifest of the indexed entries.
+    :return: A tuple of (keys to embed and upsert, keys to delete).
+    """
+    changed = [
+        k
+        for k, v in kb.items()
+        if manifest.get(k, {}).get("hash") != entry_hash(k, v)
+    ]
+    removed = [k for k in manifest if k not in kb]
+    return changed, removed
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from index_manifest import kb_fingerprint
+from lexical import detect_language, normalize_question, tokenize
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Bump when the schema changes; older databases are rejected on open.
+SCHEMA_VERSION = 1
+TITLE_WEIGHT = 2.0  # BM25 column weight of titles relative to texts
+MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database read through mmap
+
+# -------------------
+# Schema
+# -------------------
+#   meta         key/value pairs: schema version, KB fingerprint, size
+#   entries      one row per KB entry, in source order; `normalized` is the
+#                exact-match form of the title, `lang` its language
+#   entries_fts  contentless FTS5 index over case-folded titles and texts,
+#                rowid = entries.id, ranked with bm25()
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE entries (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    lang TEXT,
+    normalized TEXT NOT NULL
+);
+CREATE INDEX entries_normalized ON entries (normalized, id);
+CREATE VIRTUAL TABLE entries_fts USING fts5 (
+    title, text, content='', tokenize='unicode61'
+);
+"""
+
+
+def _fold(text: str) -> str:
+    """Fold case and "ё" the way `lexical.tokenize` does."""
+    return text.casefold().replace("ё", "е")
+
+
+def build_kb_database(kb: Mapping[str, str], path: str) -> None:
+    """
+    Write the knowledge base to a SQLite database with an FTS5 index.
+    The file is built next to `path` and atomically moved into place, so
+    running workers never see a half-written database.
+    :param kb: The knowledge base mapping key -> text.
+    :param path: Path of the database file.
+    :return: None.
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany(
+                "INSERT INTO entries (id, title, text, lang, normalized)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        i,
+                        title,
+                        text,
+                        detect_language(title),
+                        normalize_question(title),
+                    )
+                    for i, (title, text) in enumerate(kb.items(), 1)
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO entries_fts (rowid, title, text)"
+                " VALUES (?, ?, ?)",
+                (
+                    (i, _fold(title), _fold(text))
+                    for i, (title, text) in enumerate(kb.items(), 1)
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ("schema_version", str(SCHEMA_VERSION)),
+                    ("fingerprint", kb_fingerprint(kb)),
+                    ("size", str(len(kb))),
+                ],
+            )
+            conn.execute(
+                "INSERT INTO entries_fts (entries_fts) VALUES ('optimize')"
+            )
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    LOGGER.info(
+        "Knowledge base database saved to %s (%d entries)", path, len(kb)
+    )
+
+
+class SqliteKnowledgeBase(Mapping[str, str]):
+    """
+    Read-only knowledge base backed by the database of `build_kb_database`.
+
+    Behaves as a key -> text mapping, but entries are read on demand
+    instead of being held in memory, so opening it is instant and workers
+    share the database pages through the OS page cache. Keyword search
+    uses the FTS5 index (BM25 ranked, titles weighted higher), exact
+    lookups use the stored normalized titles, and the KB fingerprint is
+    read from the metadata instead of being recomputed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the database read-only.
+        :param path: Path of the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        try:
+            self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+        if meta.get("schema_version") != str(SCHEMA_VERSION):
+            self._conn.close()
+            raise ValueError(
+                f"{path} has schema version {meta.get('schema_version')}, "
+                f"expected {SCHEMA_VERSION}"
+            )
+        self.fingerprint: str = meta["fingerprint"]
+        self._size = int(meta["size"])
+        LOGGER.info(
+            "Knowledge base database opened: %s (%d entries)", path, self._size
+        )
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Any]:
+        """
+        Run a read query on the shared connection.
+        :param sql: The SQL statement.
+        :param params: Its parameters.
+        :return: All result rows.
+        """
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def __getitem__(self, key: str) -> str:
+        rows = self._query("SELECT text FROM entries WHERE title = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return rows[0][0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(
+            [
+                r[0]
+                for r in self._query("SELECT title FROM entries ORDER BY id")
+            ]
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup_exact(self, normalized: str) -> Optional[Tuple[str, str]]:
+        """
+        Find the entry whose title has the given normalized form.
+        When several titles share it, the first in source order wins, as
+        in `lexical.build_exact_index`.
+        :param normalized: Output of `lexical.normalize_question`.
+        :return: A (title, text) tuple, or None.
+        """
+        rows = self._query(
+            "SELECT title, text FROM entries WHERE normalized = ?"
+            " ORDER BY id LIMIT 1",
+            (normalized,),
+        )
+        return tuple(rows[0]) if rows else None
+
+    def search(
+        self, query: str, top_k: int, lang: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank entries for a query with the FTS5 index.
+        Same contract as `lexical.BM25Index.search`: any query term may
+        match, compound identifiers ("R1a-Z93") match whole or by part.
+        :param query: Search query.
+        :param top_k: Max number of results.
+        :param lang: Only return entries in this language ("en" or "ru");
+            None searches all entries.
+        :return: List of dicts with title, text and BM25 score, best first.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms or top_k < 1:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        sql = (
+            "SELECT e.title, e.text, bm25(entries_fts, ?, 1.0) AS rank"
+            " FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid"
+            " WHERE entries_fts MATCH ?"
+        )
+        params: Tuple[Any, ...] = (TITLE_WEIGHT, match)
+        if lang is not None:
+            sql += " AND e.lang = ?"
+            params += (lang,)
+        sql += " ORDER BY rank LIMIT ?"
+        rows = self._query(sql, params + (top_k,))
+        # bm25() is lower-is-better; negate it so scores read like BM25.
+        return [
+            {"title": title, "text": text, "score": -rank}
+            for title, text, rank in rows
+        ]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def main() -> None:
+    """
+    Convert a knowledge base JSON file into a database.
+    Usage: python kb_store.py [knowledgebase.json] [knowledgebase.sqlite3]
+    """
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "knowledgebase.json"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "knowledgebase.sqlite3"
+    with open(json_path, "r", encoding="utf-8") as f:
+        build_kb_database(json.load(f), db_path)
+
+
+if __name__ == "__main__":
+    main()
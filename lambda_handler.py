@@ -25,6 +25,8 @@ from app import app
 # Create the AWS Lambda handler
 # This produces a function with signature (event, context) -> dict
 # Works for both API Gateway REST (v1) and HTTP API (v2) events.
+# Request timings are logged as CloudWatch EMF records (see METRICS_EMF),
+# since the /metrics of one container says little about the function.
 handler = make_lambda_handler(app)
 
 # Note: The above handler is a simplified version using apig_wsgi.
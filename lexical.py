@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Words, optionally joined by "-", "." or "/" (e.g. "R1a-Z93", "L-M20").
+TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+SPLIT_RE = re.compile(r"[-./]")
+PUNCT_RE = re.compile(r"[^\w\s]+")
+CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+LATIN_RE = re.compile(r"[a-z]", re.IGNORECASE)
+
+
+def detect_language(text: str) -> Optional[str]:
+    """
+    Guess whether text is Russian or English from its script.
+    Any Cyrillic letter means Russian, since Russian questions often carry
+    Latin terms ("Какая mtDNA у Yamnaya?") but English ones never carry
+    Cyrillic. Used both to tag entries at build time (by their question)
+    and to route queries, so both sides agree.
+    :param text: The input text.
+    :return: "ru", "en", or None if the text has no letters of either.
+    """
+    if CYRILLIC_RE.search(text):
+        return "ru"
+    if LATIN_RE.search(text):
+        return "en"
+    return None
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search tokens for English and Russian.
+    Case is folded and "ё" is mapped to "е". Compound identifiers such as
+    haplogroup names ("R1a-Z93") are kept whole and also split into their
+    parts, so both "R1a-Z93" and "Z93" match.
+    :param text: The input text.
+    :return: The list of tokens.
+    """
+    tokens = []
+    for match in TOKEN_RE.findall(text.casefold().replace("ё", "е")):
+        tokens.append(match)
+        if SPLIT_RE.search(match):
+            tokens.extend(p for p in SPLIT_RE.split(match) if p)
+    return tokens
+
+
+def normalize_question(text: str) -> str:
+    """
+    Reduce a question to a canonical form for exact lookups.
+    Case is folded, "ё" is mapped to "е", punctuation (including the
+    trailing "?") is dropped and whitespace is collapsed, so
+    "what is  Y-DNA" and "What is Y-DNA?" share a form.
+    :param text: The input question.
+    :return: The normalized question.
+    """
+    text = PUNCT_RE.sub(" ", text.casefold().replace("ё", "е"))
+    return " ".join(text.split())
+
+
+def build_exact_index(docs: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Map normalized knowledge base keys to the original keys.
+    When two keys normalize identically, the first one wins.
+    :param docs: Mapping of entry title -> entry text.
+    :return: Mapping of normalized title -> title.
+    """
+    table: Dict[str, str] = {}
+    for title in docs:
+        table.setdefault(normalize_question(title), title)
+    if len(table) < len(docs):
+        LOGGER.info(
+            "Exact lookup: %d keys share a normalized form",
+            len(docs) - len(table),
+        )
+    return table
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over knowledge base entries.
+
+    Built once from a key -> text mapping. Each posting list stores the
+    entry ids of a term together with its precomputed BM25 weight, so a
+    query only sums a few NumPy arrays and selects the top-k with
+    `argpartition`. Titles are weighted higher than texts by counting
+    their tokens `title_weight` times. Entries are tagged with the
+    language of their title so searches can be limited to one language.
+    """
+
+    def __init__(
+        self,
+        docs: Mapping[str, str],
+        k1: float = 1.5,
+        b: float = 0.75,
+        title_weight: int = 2,
+    ) -> None:
+        """
+        Build the index.
+        :param docs: Mapping of entry title -> entry text.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 document length normalization.
+        :param title_weight: How many times title tokens are counted.
+        """
+        self.source = docs
+        self.titles = list(docs)
+        self.texts = [docs[k] for k in self.titles]
+        langs = np.array([detect_language(t) or "" for t in self.titles])
+        self.language_masks: Dict[str, np.ndarray] = {
+            lang: langs == lang for lang in set(langs.tolist()) if lang
+        }
+
+        # Flat (term, entry, tf) triples; weights are computed vectorized
+        # and split into per-term posting lists (views) at the end.
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        lengths = np.zeros(len(self.titles), dtype=np.float32)
+        for i, (title, text) in enumerate(zip(self.titles, self.texts)):
+            counts = Counter(tokenize(title) * title_weight + tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(i)
+                tfs.append(tf)
+
+        n = len(self.titles)
+        avgdl = float(lengths.mean()) if n else 0.0
+        terms = np.array(term_ids, dtype=np.int64)
+        docs_arr = np.array(doc_ids, dtype=np.int32)
+        tf_arr = np.array(tfs, dtype=np.float32)
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = k1 * (1.0 - b + b * lengths[docs_arr] / (avgdl or 1.0))
+        weights = (idf[terms] * tf_arr * (k1 + 1.0) / (tf_arr + norm)).astype(
+            np.float32
+        )
+
+        order = np.argsort(terms, kind="stable")
+        bounds = np.cumsum(df.astype(np.int64))[:-1]
+        id_lists = np.split(docs_arr[order], bounds)
+        weight_lists = np.split(weights[order], bounds)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (id_lists[t], weight_lists[t]) for term, t in vocab.items()
+        }
+        LOGGER.info(
+            "BM25 index built: %d entries, %d terms", n, len(self.postings)
+        )
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def search(
+        self, query: str, top_k: int, lang: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank entries for a query by BM25 score.
+        :param query: Search query.
+        :param top_k: Max number of results.
+        :param lang: Only return entries in this language ("en" or "ru");
+            None searches all entries.
+        :return: List of dicts with title, text and BM25 score, best first.
+            Entries sharing no term with the query are not returned.
+        """
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        if not terms or top_k < 1:
+            return []
+
+        scores = np.zeros(len(self.titles), dtype=np.float32)
+        for term in terms:
+            ids, weights = self.postings[term]
+            scores[ids] += weights
+        if lang is not None:
+            mask = self.language_masks.get(lang)
+            if mask is None:
+                return []
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            part = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[part]
+        order = np.argsort(-scores[candidates], kind="stable")
+        candidates = candidates[order]
+        return [
+            {
+                "title": self.titles[i],
+                "text": self.texts[i],
+                "score": float(scores[i]),
+            }
+            for i in candidates
+        ]
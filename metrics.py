@@ -0,0 +1,533 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import glob
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; they span
+# sub-millisecond BM25 lookups up to slow completions.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+STAGE_HISTOGRAM = "stage_seconds"
+# Snapshot file holding the summed samples of exited workers.
+EXITED_SNAPSHOT = "metrics-exited.json"
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, labels, value) samples reported by collectors at scrape time.
+GaugeSample = Tuple[str, Dict[str, str], float]
+
+# Timings of the current request, in order: (stage, seconds).
+_SPANS: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "metrics_spans", default=None
+)
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    """Canonical, hashable form of a label dict."""
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    """Render labels as {k="v",...} with Prometheus escaping."""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value (integers without a trailing .0)."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms in the Prometheus text format.
+
+    Samples live in process memory behind a lock. With a `directory`,
+    every process (e.g. each Gunicorn worker) also writes a snapshot
+    file there at most every `flush_interval` seconds, and `render`
+    merges the files of all processes, so a scrape served by any worker
+    covers the whole server. Counters and histograms of exited workers
+    are kept, as Prometheus expects counters never to go down; gauges
+    are only reported for live processes. Under Gunicorn, the hooks in
+    gunicorn.conf.py empty the directory at start and fold the file of
+    each exited worker into EXITED_SNAPSHOT (see `mark_process_dead`).
+    """
+
+    def __init__(
+        self,
+        namespace: str = "cdna",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        directory: Optional[str] = None,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """
+        Create an empty registry.
+        :param namespace: Prefix of every metric name.
+        :param buckets: Histogram bucket upper bounds, in seconds.
+        :param directory: Shared directory for multi-process snapshots.
+        :param flush_interval: Min seconds between snapshot writes.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._collectors: List[Callable[[], Iterable[GaugeSample]]] = []
+        self._flushed_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """
+        Register the type and help line of a metric.
+        :param name: Metric name without the namespace.
+        :param kind: "counter", "histogram" or "gauge".
+        :param help_text: One-line description.
+        :return: None.
+        """
+        self._help[name] = (kind, help_text)
+
+    def inc(
+        self,
+        name: str,
+        labels: Optional[Dict[str, str]] = None,
+        value: float = 1.0,
+    ) -> None:
+        """
+        Increment a counter.
+        :param name: Metric name without the namespace.
+        :param labels: Label values of the series.
+        :param value: Amount to add.
+        :return: None.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(
+        self, name: str, value: float, labels: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Record one observation in a histogram.
+        :param name: Metric name without the namespace.
+        :param value: The observed value (seconds for latencies).
+        :param labels: Label values of the series.
+        :return: None.
+        """
+        key = (name, _labels(labels))
+        n = len(self.buckets)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0.0] * (n + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[n] += value
+            series[n + 1] += 1
+
+    def add_collector(
+        self, collector: Callable[[], Iterable[GaugeSample]]
+    ) -> None:
+        """
+        Register a callback sampled on every snapshot, for values owned
+        elsewhere (cache sizes, hit counters).
+        :param collector: Returns (name, labels, value) gauge samples.
+        :return: None.
+        """
+        self._collectors.append(collector)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Time a pipeline stage.
+        The duration goes to the stage histogram and, inside a request
+        started with `begin_request`, to its Server-Timing spans.
+        Exceptions are timed too and propagate unchanged.
+        :param stage: Stage name, used as the "stage" label.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(STAGE_HISTOGRAM, elapsed, {"stage": stage})
+            spans = _SPANS.get()
+            if spans is not None:
+                spans.append((stage, elapsed))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy the current samples into a JSON-serializable dict.
+        :return: Dict with pid, counters, histograms and gauges.
+        """
+        gauges = []
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges.append([name, list(_labels(labels)), value])
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Metrics collector failed")
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "buckets": list(self.buckets),
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), list(series)]
+                    for (name, labels), series in self._histograms.items()
+                ],
+                "gauges": gauges,
+            }
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Write this process's snapshot to the shared directory, if any.
+        :param force: Write even if `flush_interval` has not elapsed.
+        :return: None.
+        """
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_interval:
+            return
+        self._flushed_at = now
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            LOGGER.warning("Cannot write metrics snapshot %s: %s", path, err)
+
+    def _snapshots(self) -> List[Dict[str, Any]]:
+        """Own snapshot plus those of the other processes sharing dir."""
+        own = self.snapshot()
+        if not self.directory:
+            return [own]
+        snapshots = [own]
+        pattern = os.path.join(self.directory, "metrics-*.json")
+        for path in glob.glob(pattern):
+            data = _read_snapshot(path)
+            if data is None:
+                continue
+            if data.get("pid") == own["pid"] or data.get("buckets") != list(
+                self.buckets
+            ):
+                continue
+            if not _alive(data.get("pid")):
+                data["gauges"] = []
+            snapshots.append(data)
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Render all processes' samples in the Prometheus text format.
+        :return: The exposition text (version 0.0.4).
+        """
+        counters, histograms, gauges = _merge(self._snapshots())
+        lines: List[str] = []
+        described = set()
+        n = len(self.buckets)
+        for kind, series_map in (
+            ("counter", counters),
+            ("gauge", gauges),
+            ("histogram", histograms),
+        ):
+            for name, labels in sorted(series_map):
+                full = f"{self.namespace}_{name}"
+                if name not in described:
+                    described.add(name)
+                    help_text = self._help.get(name, (kind, name))[1]
+                    lines.append(f"# HELP {full} {help_text}")
+                    lines.append(f"# TYPE {full} {kind}")
+                value = series_map[(name, labels)]
+                if kind != "histogram":
+                    lines.append(
+                        f"{full}{_format_labels(labels)} "
+                        f"{_format_value(value)}"
+                    )
+                    continue
+                for bound, count in zip(self.buckets, value):
+                    le = (("le", _format_value(bound)),)
+                    lines.append(
+                        f"{full}_bucket{_format_labels(labels, le)} "
+                        f"{_format_value(count)}"
+                    )
+                inf = (("le", "+Inf"),)
+                lines.append(
+                    f"{full}_bucket{_format_labels(labels, inf)} "
+                    f"{_format_value(value[n + 1])}"
+                )
+                lines.append(
+                    f"{full}_sum{_format_labels(labels)} "
+                    f"{_format_value(value[n])}"
+                )
+                lines.append(
+                    f"{full}_count{_format_labels(labels)} "
+                    f"{_format_value(value[n + 1])}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _merge(
+    snapshots: Iterable[Dict[str, Any]]
+) -> Tuple[
+    Dict[Tuple[str, Labels], float],
+    Dict[Tuple[str, Labels], List[float]],
+    Dict[Tuple[str, Labels], float],
+]:
+    """
+    Sum the samples of several snapshots.
+    :param snapshots: Snapshots as written by `MetricsRegistry.flush`.
+    :return: Counters, histograms and gauges keyed by (name, labels).
+    """
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], List[float]] = {}
+    gauges: Dict[Tuple[str, Labels], float] = {}
+    for data in snapshots:
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, series in data["histograms"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            merged = histograms.setdefault(key, [0.0] * len(series))
+            for i, value in enumerate(series):
+                merged[i] += value
+        for name, labels, value in data["gauges"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            gauges[key] = gauges.get(key, 0.0) + value
+    return counters, histograms, gauges
+
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """Load a snapshot file, or None if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def clear_directory(directory: str) -> None:
+    """
+    Remove every snapshot from a metrics directory. Call it once when the
+    server starts (the Gunicorn master's `on_starting` hook), before any
+    worker writes, so samples of an earlier run are not merged in.
+    :param directory: The METRICS_DIR of the server.
+    :return: None.
+    """
+    for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+        try:
+            os.remove(path)
+        except OSError as err:
+            LOGGER.warning("Cannot remove metrics snapshot %s: %s", path, err)
+
+
+def mark_process_dead(pid: int, directory: str) -> None:
+    """
+    Fold the snapshot of an exited worker into the totals of exited
+    workers (EXITED_SNAPSHOT) and remove its file, so files do not pile
+    up across worker restarts. Its counters and histograms keep counting,
+    as Prometheus expects; its gauges are dropped. Only one process may
+    call this, e.g. the Gunicorn master from its `child_exit` hook.
+    :param pid: The pid of the exited worker.
+    :param directory: The METRICS_DIR of the server.
+    :return: None.
+    """
+    path = os.path.join(directory, f"metrics-{pid}.json")
+    data = _read_snapshot(path)
+    if data is None:
+        return
+    exited_path = os.path.join(directory, EXITED_SNAPSHOT)
+    exited = _read_snapshot(exited_path)
+    if exited is None or exited.get("buckets") != data.get("buckets"):
+        exited = {"counters": [], "histograms": []}
+    counters, histograms, _ = _merge(
+        [{**exited, "gauges": []}, {**data, "gauges": []}]
+    )
+    merged = {
+        "pid": None,
+        "buckets": data.get("buckets"),
+        "counters": [
+            [name, list(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+        "histograms": [
+            [name, list(labels), series]
+            for (name, labels), series in histograms.items()
+        ],
+        "gauges": [],
+    }
+    tmp_path = f"{exited_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f)
+        os.replace(tmp_path, exited_path)
+        os.remove(path)
+    except OSError as err:
+        LOGGER.warning("Cannot fold metrics snapshot %s: %s", path, err)
+
+
+def _alive(pid: Any) -> bool:
+    """Whether a process with this pid exists (on this host)."""
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+# -------------------
+# Request spans
+# -------------------
+def begin_request() -> Any:
+    """
+    Start collecting the stage timings of the current request.
+    Spans are kept in a context variable, so they follow the request
+    into threads started with `contextvars.copy_context().run`.
+    :return: A token for `end_request`.
+    """
+    return _SPANS.set([])
+
+
+def end_request(token: Any) -> List[Tuple[str, float]]:
+    """
+    Stop collecting stage timings for the current request.
+    :param token: The token returned by `begin_request`.
+    :return: The (stage, seconds) spans recorded, in order.
+    """
+    spans = _SPANS.get() or []
+    _SPANS.reset(token)
+    return spans
+
+
+def server_timing(
+    spans: Sequence[Tuple[str, float]], total: Optional[float] = None
+) -> str:
+    """
+    Format spans as a Server-Timing header value.
+    Repeated stages (e.g. two embeddings) are summed into one entry.
+    :param spans: (stage, seconds) pairs.
+    :param total: Optional whole-request duration, added as "total".
+    :return: The header value, e.g. "embedding;dur=12.3, total;dur=40.1".
+    """
+    merged: Dict[str, float] = {}
+    for stage, seconds in spans:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    if total is not None:
+        merged["total"] = total
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.1f}"
+        for stage, seconds in merged.items()
+    )
+
+
+def emit_emf(
+    namespace: str,
+    dimensions: Dict[str, str],
+    spans: Sequence[Tuple[str, float]],
+    total: float,
+) -> None:
+    """
+    Print one CloudWatch Embedded Metric Format record to stdout.
+    On AWS Lambda every container is a separate process that cannot be
+    scraped, but CloudWatch turns EMF log lines into metrics.
+    :param namespace: CloudWatch metric namespace.
+    :param dimensions: Dimension values of the record (e.g. endpoint).
+    :param spans: (stage, seconds) spans of the request.
+    :param total: Whole-request duration in seconds.
+    :return: None.
+    """
+    values: Dict[str, float] = {}
+    for stage, seconds in spans:
+        key = f"{stage}_ms"
+        values[key] = values.get(key, 0.0) + seconds * 1000
+    values["total_ms"] = total * 1000
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": "Milliseconds"}
+                        for name in values
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **{name: round(value, 3) for name, value in values.items()},
+    }
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
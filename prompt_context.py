@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from utils import count_tokens, get_module_logger, truncate_tokens
+
+LOGGER = get_module_logger(__name__)
+
+ELLIPSIS = " …"
+
+
+def format_context(context: Dict[str, Any]) -> str:
+    """
+    Render one retrieved context as it appears in the prompt.
+    :param context: A dict with q (question/title) and a (answer/text).
+    :return: The "Q: ...\nA: ..." block.
+    """
+    return f"Q: {context['q']}\nA: {context['a']}"
+
+
+def _normalize(text: str) -> str:
+    """Collapse case and whitespace so near-identical texts compare equal."""
+    return " ".join(text.casefold().split())
+
+
+def dedupe_contexts(contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop empty contexts and those whose answer repeats a better-ranked one.
+    A context is a duplicate when its answer is contained in (or contains)
+    the answer of a context kept before it, e.g. the same entry found as
+    a passage and as a whole entry, or overlapping hits of the vector and
+    keyword retrievers.
+    :param contexts: Retrieved contexts, best first.
+    :return: The contexts without duplicates, in order.
+    """
+    kept: List[Dict[str, Any]] = []
+    seen: List[str] = []
+    for context in contexts:
+        text = _normalize(context["a"])
+        if not text or any(text in other or other in text for other in seen):
+            continue
+        kept.append(context)
+        seen.append(text)
+    return kept
+
+
+def assemble_context(
+    contexts: List[Dict[str, Any]],
+    budget: int,
+    model: str,
+    min_tokens: int = 50,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Fit retrieved contexts into a token budget, best first.
+    Duplicates are removed, then contexts are taken in rank order while
+    they fit. The first one that does not fit is truncated if at least
+    `min_tokens` of the budget remain (filling the budget); otherwise it
+    is dropped and smaller lower-ranked contexts may still be taken.
+    :param contexts: Retrieved contexts (q, a, score), best first.
+    :param budget: Max tokens of all formatted contexts together.
+    :param model: The model whose tokenizer counts the tokens.
+    :param min_tokens: Smallest remaining budget worth a truncated context.
+    :return: A tuple of (selected contexts, tokens used).
+    """
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    unique = dedupe_contexts(contexts)
+    for context in unique:
+        # Blocks are joined by a blank line, about one token.
+        cost = count_tokens(format_context(context), model) + 1
+        if used + cost <= budget:
+            selected.append(context)
+            used += cost
+            continue
+        remaining = budget - used
+        if remaining < min_tokens:
+            continue
+        overhead = count_tokens(format_context({**context, "a": ""}), model)
+        room = remaining - overhead - count_tokens(ELLIPSIS, model) - 1
+        if room <= 0:
+            continue
+        answer = truncate_tokens(context["a"], room, model) + ELLIPSIS
+        truncated = {**context, "a": answer}
+        selected.append(truncated)
+        used += count_tokens(format_context(truncated), model) + 1
+        break
+
+    if len(selected) < len(contexts):
+        LOGGER.info(
+            "Context budget: kept %d of %d contexts (%d duplicates), "
+            "%d/%d tokens",
+            len(selected),
+            len(contexts),
+            len(contexts) - len(unique),
+            used,
+            budget,
+        )
+    return selected, used
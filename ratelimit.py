@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Atomic token bucket in Redis. KEYS[1]: bucket; ARGV: rate, burst, cost.
+# Returns the seconds to wait (as a string, Lua numbers are truncated to
+# integers on the way out), "0" if the call is admitted.
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+def client_ip(
+    remote_addr: Optional[str],
+    forwarded_for: Optional[str],
+    trusted_proxies: int = 0,
+) -> str:
+    """
+    Identify the client of a request.
+    Behind `trusted_proxies` reverse proxies, the client is the entry that
+    many hops from the right of X-Forwarded-For; entries further left can
+    be forged by the client and are ignored.
+    :param remote_addr: Address of the peer that connected to us.
+    :param forwarded_for: The X-Forwarded-For header, if any.
+    :param trusted_proxies: Number of proxies in front of the app.
+    :return: The client address ("unknown" if there is none).
+    """
+    if trusted_proxies > 0 and forwarded_for:
+        hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+        if hops:
+            return hops[-min(trusted_proxies, len(hops))]
+    return remote_addr or "unknown"
+
+
+def retry_after_header(seconds: float) -> str:
+    """
+    Format a Retry-After value.
+    :param seconds: Time until a retry may succeed.
+    :return: Whole seconds, at least 1.
+    """
+    return str(max(1, math.ceil(seconds)))
+
+
+class TokenBucket:
+    """
+    Per-key token bucket rate limiter kept in process memory.
+
+    Each key (client) holds up to `burst` tokens, refilled at `rate`
+    tokens per second; a call costs `cost` tokens. Buckets of the least
+    recently seen keys are dropped beyond `max_keys`, so a scan from
+    many addresses cannot grow memory without bound (a dropped key
+    starts again with a full bucket).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_keys: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param rate: Tokens added per second.
+        :param burst: Bucket capacity (the largest burst admitted).
+        :param max_keys: Buckets kept at most.
+        :param clock: Monotonic time source (seconds).
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.rejected = 0
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens from the bucket of `key` if it has them.
+        :param key: The client key.
+        :param cost: Tokens the call costs.
+        :return: 0.0 if admitted, otherwise the seconds until it would be.
+        """
+        with self._lock:
+            now = self._clock()
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the limiter counters.
+        :return: Dict with keys (buckets held) and rejected (calls).
+        """
+        with self._lock:
+            return {"keys": len(self._buckets), "rejected": self.rejected}
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Token bucket shared by every worker through Redis.
+
+    Buckets are Redis hashes updated atomically by a Lua script, so all
+    workers and instances draw on one budget per client. If Redis is
+    unreachable, the in-process buckets are used instead.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        rate: float,
+        burst: float,
+        prefix: str = "cdna:ratelimit",
+        **kwargs: Any,
+    ) -> None:
+        """
+        :param client: A redis.Redis client with decode_responses=True.
+        :param rate: Tokens added per second.
+        :param burst: Bucket capacity.
+        :param prefix: Key prefix of the buckets.
+        :param kwargs: Passed to `TokenBucket` (local fallback).
+        """
+        super().__init__(rate, burst, **kwargs)
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisTokenBucket":
+        """
+        Connect to Redis. Requires the optional `redis` package.
+        :param url: Redis URL, e.g. redis://localhost:6379/0.
+        :param kwargs: Passed to the constructor.
+        :return: The limiter.
+        """
+        import redis  # pylint: disable=import-outside-toplevel
+
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        try:
+            wait = float(
+                self.client.eval(
+                    _TOKEN_BUCKET_LUA,
+                    1,
+                    f"{self.prefix}:{key}",
+                    self.rate,
+                    self.burst,
+                    cost,
+                )
+            )
+        except Exception as err:  # redis.RedisError, kept import-free
+            LOGGER.warning("Shared rate limit unavailable: %s", err)
+            return super().acquire(key, cost)
+        if wait > 0:
+            with self._lock:
+                self.rejected += 1
+        return wait
+
+
+class ConcurrencyLimiter:
+    """
+    Cap the calls running at once, with a short bounded wait queue.
+
+    Up to `limit` callers run; up to `queue_size` more wait at most
+    `queue_timeout` seconds for a slot; anyone else is turned away at
+    once, so overload is answered quickly instead of by timeouts.
+    """
+
+    def __init__(
+        self, limit: int, queue_size: int = 0, queue_timeout: float = 1.0
+    ) -> None:
+        """
+        :param limit: Calls allowed to run concurrently.
+        :param queue_size: Callers allowed to wait for a slot.
+        :param queue_timeout: Max seconds a caller waits.
+        """
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self) -> bool:
+        """
+        Take a slot, waiting in the queue if there is room.
+        :return: True if a slot was taken (call `release` when done).
+        """
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(
+                    lambda: self.active < self.limit, self.queue_timeout
+                )
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        """Give a slot back and wake one waiting caller."""
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the limiter state.
+        :return: Dict with active, waiting and rejected counts.
+        """
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+            }
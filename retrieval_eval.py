@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+# Same contract as app.Retriever: (query, top_k, lang) -> ranked hits.
+Retriever = Callable[[str, int, Optional[str]], List[Dict[str, Any]]]
+
+KS = (1, 3, 10)
+WORD_RE = re.compile(r"\w+(?:[-./]\w+)*")
+PARAPHRASE_PROMPT = (
+    "Rewrite the question below with different wording but the same "
+    "meaning, in the same language. Reply with the question only.\n\n"
+    "Question: {question}"
+)
+
+
+class EvalCase(NamedTuple):
+    """A query and the knowledge base key it should retrieve."""
+
+    query: str
+    expected: str
+    kind: str
+
+
+# -------------------
+# Query perturbations
+# -------------------
+# Each takes (question, rng) and returns a perturbed query. They are
+# cheap, deterministic for a seeded rng and work for English and Russian.
+def perturb_normalize(question: str, rng: random.Random) -> str:
+    """Lowercase and strip punctuation, as typed in a hurry."""
+    return " ".join(WORD_RE.findall(question.lower()))
+
+
+def perturb_drop_word(question: str, rng: random.Random) -> str:
+    """Drop one word, keeping at least two."""
+    words = question.split()
+    if len(words) > 2:
+        del words[rng.randrange(len(words))]
+    return " ".join(words)
+
+
+def perturb_typo(question: str, rng: random.Random) -> str:
+    """Swap two adjacent letters inside one word of 4+ letters."""
+    words = question.split()
+    candidates = [i for i, w in enumerate(words) if len(w) >= 4]
+    if not candidates:
+        return question
+    i = rng.choice(candidates)
+    word = words[i]
+    j = rng.randrange(1, len(word) - 2)
+    words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2 :]
+    return " ".join(words)
+
+
+def perturb_shuffle(question: str, rng: random.Random) -> str:
+    """Reorder the words; keyword search is blind to it, embeddings not."""
+    words = question.split()
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+PERTURBATIONS: Dict[str, Callable[[str, random.Random], str]] = {
+    "normalize": perturb_normalize,
+    "drop_word": perturb_drop_word,
+    "typo": perturb_typo,
+    "shuffle": perturb_shuffle,
+}
+
+
+def build_cases(
+    keys: Sequence[str],
+    sample: int,
+    kinds: Sequence[str] = tuple(PERTURBATIONS),
+    seed: int = 0,
+) -> List[EvalCase]:
+    """
+    Build the golden set from knowledge base keys.
+    KB keys are questions, so each sampled key yields one perturbed query
+    per kind, all expecting the key's own entry.
+    :param keys: Knowledge base keys.
+    :param sample: Number of keys to sample (all if larger).
+    :param kinds: Perturbations to apply ("exact" keeps the key as is).
+    :param seed: Seed for sampling and perturbations.
+    :return: The evaluation cases.
+    """
+    rng = random.Random(seed)
+    keys = list(keys)
+    picked = rng.sample(keys, min(sample, len(keys)))
+    cases = []
+    for key in picked:
+        for kind in kinds:
+            query = key if kind == "exact" else PERTURBATIONS[kind](key, rng)
+            cases.append(EvalCase(query, key, kind))
+    return cases
+
+
+def paraphrase_cases(
+    client: Any, model: str, keys: Sequence[str]
+) -> List[EvalCase]:
+    """
+    Ask a chat model for one paraphrase of each key.
+    Paraphrases test what the perturbations cannot: the same question in
+    other words. Keys the model fails on are skipped.
+    :param client: An OpenAI client.
+    :param model: Chat model name.
+    :param keys: Knowledge base keys to paraphrase.
+    :return: The evaluation cases, of kind "paraphrase".
+    """
+    cases = []
+    for key in keys:
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": PARAPHRASE_PROMPT.format(question=key),
+                    }
+                ],
+                temperature=0.7,
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.warning("Paraphrasing %r failed: %s", key, err)
+            continue
+        query = (response.choices[0].message.content or "").strip()
+        if query:
+            cases.append(EvalCase(query, key, "paraphrase"))
+    return cases
+
+
+# -------------------
+# Metrics
+# -------------------
+def rank_of(hits: List[Dict[str, Any]], expected: str) -> Optional[int]:
+    """
+    Find the 1-based rank of the expected entry among distinct titles.
+    Passages of one entry share its title, so repeats do not push other
+    entries down.
+    :param hits: Ranked retriever results.
+    :param expected: Title of the relevant entry.
+    :return: The rank, or None if the entry was not retrieved.
+    """
+    seen: List[str] = []
+    for hit in hits:
+        title = hit.get("title")
+        if title in seen:
+            continue
+        seen.append(title)
+        if title == expected:
+            return len(seen)
+    return None
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted list (0.0 if empty)."""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(
+    ranks: List[Optional[int]], latencies: List[float], ks: Sequence[int]
+) -> Dict[str, Any]:
+    """
+    Aggregate per-query ranks and latencies.
+    :param ranks: Rank of the expected entry per query (None = missed).
+    :param latencies: Seconds per query.
+    :param ks: Cutoffs for recall@k.
+    :return: Dict with queries, recall@k, mrr and latency percentiles (ms).
+    """
+    n = len(ranks)
+    summary: Dict[str, Any] = {"queries": n}
+    for k in ks:
+        hits = sum(1 for r in ranks if r is not None and r <= k)
+        summary[f"recall@{k}"] = round(hits / n, 4) if n else 0.0
+    mrr = sum(1.0 / r for r in ranks if r is not None)
+    summary["mrr"] = round(mrr / n, 4) if n else 0.0
+    latencies = sorted(latencies)
+    summary["p50_ms"] = round(_percentile(latencies, 50) * 1000, 2)
+    summary["p95_ms"] = round(_percentile(latencies, 95) * 1000, 2)
+    summary["mean_ms"] = (
+        round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0
+    )
+    return summary
+
+
+def evaluate(
+    retriever: Retriever,
+    cases: Sequence[EvalCase],
+    ks: Sequence[int] = KS,
+    route: Optional[Callable[[str], Optional[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Run every case through a retriever and score it.
+    Failed queries count as misses and are reported under "errors".
+    :param retriever: The retriever to evaluate.
+    :param cases: The evaluation cases.
+    :param ks: Cutoffs for recall@k; the deepest one is the search depth.
+    :param route: Optional query -> language function (language routing).
+    :return: The overall summary plus one summary per case kind under
+        "by_kind".
+    """
+    depth = max(ks)
+    ranks: List[Optional[int]] = []
+    latencies: List[float] = []
+    by_kind: Dict[str, List[Any]] = {}
+    errors = 0
+    for case in cases:
+        lang = route(case.query) if route else None
+        started = time.perf_counter()
+        try:
+            hits = retriever(case.query, depth, lang)
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.debug("Query %r failed: %s", case.query, err)
+            errors += 1
+            hits = []
+        elapsed = time.perf_counter() - started
+        rank = rank_of(hits, case.expected)
+        ranks.append(rank)
+        latencies.append(elapsed)
+        kind_ranks, kind_latencies = by_kind.setdefault(case.kind, ([], []))
+        kind_ranks.append(rank)
+        kind_latencies.append(elapsed)
+
+    summary = summarize(ranks, latencies, ks)
+    summary["errors"] = errors
+    summary["by_kind"] = {
+        kind: summarize(r, lat, ks) for kind, (r, lat) in by_kind.items()
+    }
+    return summary
+
+
+def format_table(results: Dict[str, Dict[str, Any]], ks: Sequence[int]) -> str:
+    """
+    Render per-mode summaries side by side.
+    :param results: Mode -> summary (or {"unavailable": reason}).
+    :param ks: Cutoffs for recall@k.
+    :return: A plain text table.
+    """
+    columns = [f"recall@{k}" for k in ks] + ["mrr", "p50_ms", "p95_ms"]
+    lines = ["mode".ljust(10) + "".join(c.rjust(11) for c in columns)]
+    for mode, summary in results.items():
+        if "unavailable" in summary:
+            lines.append(f"{mode:<10} unavailable: {summary['unavailable']}")
+            continue
+        lines.append(
+            mode.ljust(10)
+            + "".join(f"{summary[c]:>11}" for c in columns)
+            + (f"  ({summary['errors']} errors)" if summary["errors"] else "")
+        )
+    return "\n".join(lines)
+
+
+# -------------------
+# Entrypoint
+# -------------------
+def main() -> None:
+    """
+    Measure recall@k, MRR and latency of every retrieval mode on queries
+    derived from the knowledge base keys.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["pinecone", "local", "lexical", "hybrid"],
+        choices=["pinecone", "local", "lexical", "hybrid"],
+        help="hybrid fuses BM25 with the RETRIEVER_BACKEND retriever",
+    )
+    parser.add_argument(
+        "--sample", type=int, default=200, help="KB keys to sample"
+    )
+    parser.add_argument(
+        "--perturbations",
+        nargs="+",
+        default=list(PERTURBATIONS),
+        choices=["exact", *PERTURBATIONS],
+    )
+    parser.add_argument(
+        "--paraphrase",
+        action="store_true",
+        help="also ask the chat model for one paraphrase per sampled key",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON here")
+    args = parser.parse_args()
+
+    # pylint: disable=import-outside-toplevel
+    import app
+    from lexical import detect_language
+
+    keys = list(app.KNOWLEDGEBASE)
+    cases = build_cases(keys, args.sample, args.perturbations, args.seed)
+    if args.paraphrase:
+        sampled = list(dict.fromkeys(c.expected for c in cases))
+        cases += paraphrase_cases(app.client, app.MODEL, sampled)
+    LOGGER.info("Evaluating %d queries", len(cases))
+
+    retrievers: Dict[str, Retriever] = {
+        **app.RETRIEVERS,
+        "lexical": app._fallback_search,
+        "hybrid": lambda query, top_k, lang: app._hybrid_search(
+            query, top_k, lang
+        )[0],
+    }
+    route = detect_language if app.LANGUAGE_ROUTING else None
+    results: Dict[str, Dict[str, Any]] = {}
+    for mode in args.modes:
+        # Probe once so a missing backend is reported, not scored 0 (or,
+        # for hybrid, silently scored as BM25 alone).
+        probe = retrievers[app.RETRIEVER_BACKEND if mode == "hybrid" else mode]
+        try:
+            probe(cases[0].query, 1, None)
+        except Exception as err:  # pylint: disable=broad-except
+            results[mode] = {"unavailable": str(err)}
+            continue
+        results[mode] = evaluate(retrievers[mode], cases, KS, route)
+
+    print(format_table(results, KS))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"config": vars(args), "results": results},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from deadline import DeadlineExceeded, remaining
+from utils import get_module_logger
+
+LOGGER = get_module_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    """An in-flight computation that other callers can wait on."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception), at most
+    until their own request deadline. Nothing is kept once the call
+    completes, so this is not a cache. Safe for threaded workers within
+    one process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Run `fn` once per key among concurrent callers.
+        :param key: Identifies equivalent calls.
+        :param fn: The computation.
+        :return: The result of the shared computation.
+        :raises DeadlineExceeded: If the request deadline passes while
+            waiting for another caller's computation.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(remaining()):
+                raise DeadlineExceeded(
+                    "request deadline exceeded waiting for a shared call"
+                )
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report coalescing counters.
+        :return: Dict with executed and coalesced call counts.
+        """
+        return {"executed": self.executed, "coalesced": self.coalesced}
+
+
+class RedisSingleFlight(SingleFlight):
+    """
+    Coalesce identical calls across worker processes through Redis.
+
+    Calls are first coalesced within the process. The one remaining call
+    per process then races for a Redis lock (SET NX PX): the winner
+    computes and publishes the JSON-encoded result for `result_ttl`
+    seconds, the others poll for it. If the leader dies or fails, its lock
+    expires or is released without a result and a waiting worker takes
+    over. Redis errors degrade to computing locally. Followers wait at
+    most `wait_timeout` seconds, and never past their request deadline.
+    Results rejected by `shareable` (e.g. degraded answers) are returned
+    to their caller but not published.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "cdna:flight",
+        lock_ttl: float = 60.0,
+        wait_timeout: float = 30.0,
+        result_ttl: float = 10.0,
+        poll_interval: float = 0.05,
+        shareable: Optional[Callable[[Any], bool]] = None,
+    ) -> None:
+        """
+        Wrap a Redis client.
+        :param client: A redis.Redis client with decode_responses=True.
+        :param prefix: Key prefix for locks and results.
+        :param lock_ttl: Seconds before a leader's lock expires.
+        :param wait_timeout: Max seconds a follower waits before computing.
+        :param result_ttl: Seconds a published result stays readable.
+        :param poll_interval: Seconds between follower polls.
+        :param shareable: Whether a result may be published to other
+            workers; by default every result is.
+        """
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.shareable = shareable
+        self.shared = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisSingleFlight":
+        """
+        Connect to Redis. Requires the optional `redis` package.
+        :param url: Redis URL, e.g. redis://localhost:6379/0.
+        :param kwargs: Passed to the constructor.
+        :return: The coalescer.
+        """
+        import redis  # pylint: disable=import-outside-toplevel
+
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        return super().do(key, lambda: self._do_shared(key, fn))
+
+    def _do_shared(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Run `fn` once across processes, or wait for another process.
+        :param key: Identifies equivalent calls.
+        :param fn: The computation; its result must be JSON-serializable.
+        :return: The result of the shared computation.
+        :raises DeadlineExceeded: If the request deadline passes while
+            waiting for another process.
+        """
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        lock_key = f"{self.prefix}:lock:{digest}"
+        result_key = f"{self.prefix}:result:{digest}"
+        token = uuid.uuid4().hex
+        wait_until = time.monotonic() + self.wait_timeout
+
+        try:
+            while True:
+                cached = self.client.get(result_key)
+                if cached is not None:
+                    self.shared += 1
+                    return json.loads(cached)
+                if self.client.set(
+                    lock_key, token, nx=True, px=int(self.lock_ttl * 1000)
+                ):
+                    break
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded(
+                        f"request deadline exceeded waiting for {lock_key}"
+                    )
+                if time.monotonic() >= wait_until:
+                    LOGGER.warning("Timed out waiting for %s", lock_key)
+                    return fn()
+                time.sleep(
+                    self.poll_interval
+                    if left is None
+                    else min(self.poll_interval, left)
+                )
+        except DeadlineExceeded:
+            raise
+        except Exception as err:  # redis.RedisError, kept import-free
+            LOGGER.warning("Redis single-flight unavailable: %s", err)
+            return fn()
+
+        try:
+            result = fn()
+            if self.shareable is None or self.shareable(result):
+                self._publish(result_key, result)
+            return result
+        finally:
+            try:
+                # Only release our own lock; it may have expired and been
+                # taken over by another worker.
+                if self.client.get(lock_key) == token:
+                    self.client.delete(lock_key)
+            except Exception as err:
+                LOGGER.warning("Could not release %s: %s", lock_key, err)
+
+    def _publish(self, result_key: str, result: Any) -> None:
+        """
+        Publish a result for waiting workers. A Redis error only costs
+        them the shared result: they take over the lock and compute.
+        :param result_key: The Redis key of the result.
+        :param result: The JSON-serializable result.
+        """
+        try:
+            self.client.set(
+                result_key,
+                json.dumps(result, ensure_ascii=False),
+                px=int(self.result_ttl * 1000),
+            )
+        except Exception as err:  # redis.RedisError, kept import-free
+            LOGGER.warning("Could not publish %s: %s", result_key, err)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report coalescing counters.
+        :return: Dict with executed, coalesced and shared (results read
+            from another worker) counts.
+        """
+        return {**super().stats(), "shared": self.shared}
@@ -23,7 +23,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 */
 
 window.ChatWidget = {
-    init: function ({ apiUrl, containerId, onMessage, onTyping }) {
+    // streamUrl (optional): the /api/chat/stream endpoint. When set, the
+    // answer is read as Server-Sent Events and onToken(textSoFar) is called
+    // after every token; onMessage still receives the final answer.
+    init: function ({ apiUrl, streamUrl, containerId, onMessage, onTyping, onToken }) {
         const container = document.getElementById(containerId);
         if (!container) return;
 
@@ -38,6 +41,61 @@ window.ChatWidget = {
         const input = container.querySelector("#userInput");
         const button = container.querySelector("#sendBtn");
 
+        // Parse one SSE block ("event: ..." / "data: ..." lines)
+        const parseEvent = (block) => {
+            let type = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) {
+                    type = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            }
+            return { type, data: data ? JSON.parse(data) : {} };
+        };
+
+        // Shown when the server refuses a question with 429 (rate limit)
+        const busyMessage = 'Too many questions at once. Please wait a moment and try again.';
+
+        // Read the streamed answer, reporting partial text via onToken
+        const streamAnswer = async (message) => {
+            const response = await fetch(streamUrl, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ question: message }),
+            });
+
+            if (response.status === 429) throw new Error(busyMessage);
+            if (!response.ok || !response.body) throw new Error("Network error");
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const event = parseEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.type === 'error') throw new Error(event.data.error);
+                    if (event.type === 'done') return answer;
+
+                    answer += event.data.token || '';
+                    if (onToken) {
+                        onToken(answer);
+                    }
+                }
+            }
+            return answer;
+        };
+
         const sendMessage = async () => {
             const message = input.value.trim();
             if (!message) return;
@@ -55,12 +113,23 @@ window.ChatWidget = {
             }
 
             try {
+                if (streamUrl) {
+                    const answer = await streamAnswer(message);
+
+                    // Final answer (replaces the streamed partial text)
+                    if (onMessage) {
+                        onMessage(answer, 'bot');
+                    }
+                    return;
+                }
+
                 const response = await fetch(apiUrl, {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
                     body: JSON.stringify({ question: message }),
                 });
 
+                if (response.status === 429) throw new Error(busyMessage);
                 if (!response.ok) throw new Error("Network error");
 
                 const data = await response.json();
@@ -75,7 +144,12 @@ window.ChatWidget = {
 
                 // Add error message using callback
                 if (onMessage) {
-                    onMessage('Sorry, an error occurred. Please try again.', 'bot');
+                    onMessage(
+                        err.message === busyMessage
+                            ? busyMessage
+                            : 'Sorry, an error occurred. Please try again.',
+                        'bot'
+                    );
                 }
             }
         };
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+
+# Tests must not read from or write to the on-disk embedding cache of the
+# working tree; tests that need a cache create one under tmp_path.
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+# Likewise the answer cache is off unless a test installs one.
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+# Every test client shares one address: admission control is off unless a
+# test installs a limiter.
+os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+os.environ["MAX_CONCURRENT_CHATS"] = "0"
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from answer_cache import SemanticAnswerCache
+
+
+class TestSemanticAnswerCache:
+    """
+    Tests for the embedding-keyed answer cache.
+
+    Verifies:
+    - Near-duplicate embeddings hit, distant ones miss.
+    - Entries expire after the TTL, and an expired best match does not
+      hide a fresh one above the threshold.
+    - The least recently used entry is evicted when full.
+    - A new knowledge base version drops all entries.
+    - Hit and miss counters.
+    """
+
+    def test_threshold(self):
+        """Only embeddings above the cosine threshold hit."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.put("What is Y-DNA?", [1.0, 0.0], "paternal", "v1")
+        hit = cache.get([2.0, 0.1], "v1")
+        assert hit["answer"] == "paternal"
+        assert hit["question"] == "What is Y-DNA?"
+        assert hit["similarity"] == pytest.approx(0.9988, abs=1e-3)
+        assert cache.get([1.0, 1.0], "v1") is None
+
+    def test_ttl(self, monkeypatch):
+        """Expired answers are dropped on lookup."""
+        cache = SemanticAnswerCache(ttl=10.0)
+        monkeypatch.setattr("answer_cache.time.time", lambda: 100.0)
+        cache.put("q", [1.0, 0.0], "a", "v1")
+        monkeypatch.setattr("answer_cache.time.time", lambda: 111.0)
+        assert cache.get([1.0, 0.0], "v1") is None
+        assert len(cache) == 0
+
+    def test_expired_match_does_not_shadow_fresh(self, monkeypatch):
+        """A fresh entry is found even when an expired one is closer."""
+        cache = SemanticAnswerCache(ttl=10.0, threshold=0.9)
+        monkeypatch.setattr("answer_cache.time.time", lambda: 100.0)
+        cache.put("old", [1.0, 0.0], "stale", "v1")
+        monkeypatch.setattr("answer_cache.time.time", lambda: 105.0)
+        cache.put("new", [1.0, 0.2], "fresh", "v1")
+        monkeypatch.setattr("answer_cache.time.time", lambda: 111.0)
+        assert cache.get([1.0, 0.0], "v1")["answer"] == "fresh"
+        assert len(cache) == 1
+
+    def test_lru_eviction(self):
+        """When full, the least recently used answer is evicted."""
+        cache = SemanticAnswerCache(max_entries=2)
+        cache.put("x", [1.0, 0.0, 0.0], "ax", "v1")
+        cache.put("y", [0.0, 1.0, 0.0], "ay", "v1")
+        assert cache.get([1.0, 0.0, 0.0], "v1")["answer"] == "ax"
+        cache.put("z", [0.0, 0.0, 1.0], "az", "v1")
+        assert len(cache) == 2
+        assert cache.get([0.0, 1.0, 0.0], "v1") is None
+        assert cache.get([1.0, 0.0, 0.0], "v1")["answer"] == "ax"
+        assert cache.get([0.0, 0.0, 1.0], "v1")["answer"] == "az"
+
+    def test_version_invalidation(self):
+        """Answers cached for an older knowledge base are discarded."""
+        cache = SemanticAnswerCache()
+        cache.put("q", [1.0, 0.0], "a", "v1")
+        assert cache.get([1.0, 0.0], "v2") is None
+        assert len(cache) == 0
+
+    def test_stats(self):
+        """Counters report hits, misses and the hit rate."""
+        cache = SemanticAnswerCache()
+        cache.get([1.0, 0.0], "v1")
+        cache.put("q", [1.0, 0.0], "a", "v1")
+        cache.get([1.0, 0.0], "v1")
+        assert cache.stats() == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+            "size": 1,
+        }
@@ -18,19 +18,41 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 
+import httpx
 import pytest
-from openai import OpenAIError
+from openai import APIConnectionError, OpenAIError, RateLimitError
 
+import app as app_module
+from answer_cache import SemanticAnswerCache
 from app import (
     KNOWLEDGEBASE,
     app,
     build_index,
+    build_local_index,
+    embed_many,
     embed_text,
+    embed_texts,
     query_index,
+    reset_pinecone,
     retrieve_context,
 )
+from embedding_cache import EmbeddingCache
+from index_manifest import kb_fingerprint
+from kb_store import SqliteKnowledgeBase, build_kb_database
+
+
+@pytest.fixture(autouse=True)
+def fresh_pinecone():
+    """Drop the process-wide Pinecone handle so patches take effect."""
+    reset_pinecone()
+    yield
+    reset_pinecone()
 
 
 @pytest.fixture
@@ -61,6 +83,20 @@ class TestEmbedText:
         assert emb == [0.1, 0.2, 0.3]
         create.assert_called_once()
 
+    @patch("app.client.embeddings.create")
+    def test_embed_text_uses_cache(self, create, tmp_path, monkeypatch):
+        """A repeated text should be served from the embedding cache."""
+        monkeypatch.setattr(
+            "app.EMBEDDING_CACHE",
+            EmbeddingCache(str(tmp_path / "cache.sqlite3")),
+        )
+        create.return_value = MagicMock(
+            data=[MagicMock(embedding=[0.5, 0.25])]
+        )
+        assert embed_text("hello") == [0.5, 0.25]
+        assert embed_text("hello") == [0.5, 0.25]
+        create.assert_called_once()
+
     @patch("app.client.embeddings.create")
     def test_embed_text_openai_error(self, create):
         """Embed_text should propagate OpenAIError exceptions."""
@@ -69,6 +105,109 @@ class TestEmbedText:
             embed_text("fail")
 
 
+def _embedding_response(texts):
+    """Build a fake embeddings response with one vector per input text."""
+    return MagicMock(
+        data=[
+            MagicMock(index=i, embedding=[float(len(t))])
+            for i, t in enumerate(texts)
+        ]
+    )
+
+
+class TestEmbedMany:
+    """
+    Tests for the batched embedding path used by `build_index`.
+
+    Verifies:
+    - Several inputs are sent in one embeddings request, in order.
+    - Texts are split into batches of EMBED_BATCH_SIZE.
+    - Transient failures are retried and persistent ones skip the batch.
+    - Offline builds are not cut short by the embeddings circuit breaker.
+    """
+
+    @patch("app.client.embeddings.create")
+    def test_embed_texts_keeps_input_order(self, create):
+        """Embed_texts should reorder results by their input index."""
+        response = _embedding_response(["a", "bb"])
+        response.data.reverse()
+        create.return_value = response
+        assert embed_texts(["a", "bb"]) == [[1.0], [2.0]]
+        create.assert_called_once()
+
+    @patch("app.EMBED_BATCH_SIZE", 2)
+    @patch("app.client.embeddings.create")
+    def test_embed_many_batches(self, create):
+        """Embed_many should send one request per batch."""
+        create.side_effect = lambda model, input, timeout: _embedding_response(
+            input
+        )
+        texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+        assert embed_many(texts) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+        assert create.call_count == 3
+
+    @patch("app.EMBED_BACKOFF", 0.0)
+    @patch("app.client.embeddings.create")
+    def test_embed_many_retries_transient_errors(self, create):
+        """A transient failure should be retried rather than skipped."""
+        error = APIConnectionError(request=httpx.Request("POST", "http://x"))
+        create.side_effect = [error, _embedding_response(["a"])]
+        assert embed_many(["a"]) == [[1.0]]
+        assert create.call_count == 2
+
+    @patch("app.EMBED_BACKOFF", 0.0)
+    @patch("app.EMBED_MAX_RETRIES", 10)
+    @patch("app.EMBED_BATCH_SIZE", 1)
+    @patch("app.EMBED_WORKERS", 1)
+    @patch("app.client.embeddings.create")
+    def test_embed_many_offline_ignores_circuit(self, create):
+        """Rate limits that would open the breaker only delay a build."""
+        errors = [
+            RateLimitError(
+                "slow down",
+                response=httpx.Response(
+                    429, request=httpx.Request("POST", "http://x")
+                ),
+                body=None,
+            )
+            for _ in range(app_module.CIRCUIT_FAILURES)
+        ]
+        create.side_effect = errors + [
+            _embedding_response([t]) for t in ["a", "bb", "ccc"]
+        ]
+        assert embed_many(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+        assert app_module.CIRCUITS["openai_embeddings"].state == "closed"
+
+    @patch("app.client.embeddings.create")
+    def test_embed_many_only_embeds_cache_misses(
+        self, create, tmp_path, monkeypatch
+    ):
+        """Cached texts should not be sent to the embeddings API."""
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        cache.put("text-embedding-3-small", "bb", [9.0])
+        monkeypatch.setattr("app.EMBEDDING_CACHE", cache)
+        create.side_effect = lambda model, input, timeout: _embedding_response(
+            input
+        )
+        assert embed_many(["a", "bb", "ccc"]) == [[1.0], [9.0], [3.0]]
+        create.assert_called_once()
+        assert create.call_args.kwargs["input"] == ["a", "ccc"]
+        assert cache.get("text-embedding-3-small", "ccc") == [3.0]
+
+    @patch("app.EMBED_BATCH_SIZE", 1)
+    @patch("app.client.embeddings.create")
+    def test_embed_many_skips_failed_batch(self, create):
+        """A batch failing with a non-retryable error yields None."""
+
+        def fake_create(model, input, timeout):
+            if input == ["bad"]:
+                raise OpenAIError("API failure")
+            return _embedding_response(input)
+
+        create.side_effect = fake_create
+        assert embed_many(["a", "bad", "ccc"]) == [[1.0], None, [3.0]]
+
+
 class TestBuildIndex:
     """
     Tests for the `build_index` function which constructs or updates a Pinecone
@@ -78,24 +217,38 @@ class TestBuildIndex:
     - Creation of the Pinecone index if it does not exist.
     - Calling of `upsert` to upload embedding vectors in batches.
     - Embeddings are generated for knowledge base entries.
+    - Long entries are split into passages; stale passages are deleted.
+    - Without a manifest, vectors are upserted before stale IDs found by
+      listing the namespace are deleted; the namespace is never wiped.
+    - A rebuild with failed embeddings deletes nothing and saves no
+      manifest.
     """
 
+    @pytest.fixture(autouse=True)
+    def manifest_path(self, tmp_path, monkeypatch):
+        """Keep the index manifest out of the working tree."""
+        path = str(tmp_path / "index_manifest.json")
+        monkeypatch.setattr("app.INDEX_MANIFEST", path)
+        return path
+
     @patch("app.BATCH_SIZE", 2)
-    @patch("app.embed_text")
+    @patch("app.embed_many")
     @patch("app.Pinecone")
-    def test_build_index_creates_and_upserts(self, pc_cls, mock_embed_text):
+    def test_build_index_creates_and_upserts(self, pc_cls, mock_embed_many):
         """
         Test that build_index:
         - calls Pinecone's create_index when the index does not exist,
         - calls upsert on the Pinecone index to upload vectors,
-        - calls embed_text to generate embeddings.
+        - calls embed_many to generate embeddings.
         """
 
         index_name = "test_index"
         dimension = 1536
 
         # Embedding output
-        mock_embed_text.return_value = [0.0] * dimension
+        mock_embed_many.side_effect = lambda texts: [
+            [0.0] * dimension for _ in texts
+        ]
 
         # Setup Pinecone instance
         pc_instance = pc_cls.return_value
@@ -126,7 +279,125 @@ class TestBuildIndex:
             index.upsert.call_count > 0
         ), "Expected upsert to be called at least once"
         assert index.upsert.called
-        assert mock_embed_text.called
+        assert mock_embed_many.called
+
+    @patch("app.embed_many")
+    def test_build_index_is_incremental(self, mock_embed_many, monkeypatch):
+        """
+        A second build should only embed changed entries and delete
+        vectors of removed ones, keeping IDs stable across insertions.
+        """
+        mock_embed_many.side_effect = lambda texts: [[0.0] for _ in texts]
+        pc_instance = MagicMock()
+        pc_instance.list_indexes.return_value.names.return_value = ["idx"]
+        index = pc_instance.Index.return_value
+
+        kb = {"a": "1", "b": "2", "c": "3"}
+        monkeypatch.setattr("app.KNOWLEDGEBASE", kb)
+        build_index(pc_instance, index_name="idx")
+        first_ids = {
+            v[2]["title"]: v[0]
+            for c in index.upsert.call_args_list
+            for v in c.kwargs["vectors"]
+        }
+        assert len(first_ids) == 3
+
+        index.reset_mock()
+        mock_embed_many.reset_mock()
+        kb_new = {"new": "0", "a": "1", "b": "changed"}
+        monkeypatch.setattr("app.KNOWLEDGEBASE", kb_new)
+        build_index(pc_instance, index_name="idx")
+
+        mock_embed_many.assert_called_once_with(["new\n0", "b\nchanged"])
+        upserted = {
+            v[2]["title"]: v[0]
+            for c in index.upsert.call_args_list
+            for v in c.kwargs["vectors"]
+        }
+        assert upserted["b"] == first_ids["b"]
+        index.delete.assert_called_once_with(
+            ids=[first_ids["c"]], namespace=None
+        )
+
+    @patch("app.CHUNK_MAX_TOKENS", 8)
+    @patch("app.CHUNK_OVERLAP_TOKENS", 0)
+    @patch("app.embed_many")
+    def test_build_index_chunks_long_entries(
+        self, mock_embed_many, monkeypatch
+    ):
+        """
+        Long entries are upserted as passages linked to their entry, and
+        passages an edited entry no longer has are deleted.
+        """
+        mock_embed_many.side_effect = lambda texts: [[0.0] for _ in texts]
+        pc_instance = MagicMock()
+        pc_instance.list_indexes.return_value.names.return_value = ["idx"]
+        index = pc_instance.Index.return_value
+
+        long_text = "One two three. Four five six. Seven eight nine."
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"q": long_text})
+        build_index(pc_instance, index_name="idx")
+        vectors = index.upsert.call_args.kwargs["vectors"]
+        assert [v[2]["text"] for v in vectors] == [
+            "One two three.",
+            "Four five six.",
+            "Seven eight nine.",
+        ]
+        assert {v[2]["title"] for v in vectors} == {"q"}
+        assert mock_embed_many.call_args.args[0][1] == "q\nFour five six."
+
+        index.reset_mock()
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"q": "Short now."})
+        build_index(pc_instance, index_name="idx")
+        assert len(index.upsert.call_args.kwargs["vectors"]) == 1
+        deleted = index.delete.call_args.kwargs["ids"]
+        assert sorted(deleted) == sorted(v[0] for v in vectors)
+
+    @patch("app.embed_many")
+    def test_build_index_rebuild_keeps_serving(
+        self, mock_embed_many, monkeypatch
+    ):
+        """A build without a manifest deletes only stale IDs, last."""
+        mock_embed_many.side_effect = lambda texts: [[0.0] for _ in texts]
+        pc_instance = MagicMock()
+        pc_instance.list_indexes.return_value.names.return_value = ["idx"]
+        index = pc_instance.Index.return_value
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"a": "1"})
+        calls = []
+        index.upsert.side_effect = lambda **kw: calls.append("upsert")
+
+        def list_ids(namespace):
+            calls.append("list")
+            kept = index.upsert.call_args.kwargs["vectors"][0][0]
+            yield ["kb-0", kept]
+            yield ["kb-1"]
+
+        index.list.side_effect = list_ids
+        index.delete.side_effect = lambda **kw: calls.append("delete")
+        build_index(pc_instance, index_name="idx")
+
+        assert calls == ["upsert", "list", "delete"]
+        index.delete.assert_called_once_with(
+            ids=["kb-0", "kb-1"], namespace=None
+        )
+
+    @patch("app.embed_many")
+    def test_build_index_incomplete_rebuild_deletes_nothing(
+        self, mock_embed_many, monkeypatch, manifest_path
+    ):
+        """An embedding outage during a rebuild keeps the stored vectors."""
+        mock_embed_many.side_effect = lambda texts: [[0.0], None]
+        pc_instance = MagicMock()
+        pc_instance.list_indexes.return_value.names.return_value = ["idx"]
+        index = pc_instance.Index.return_value
+        index.list.return_value = iter([["kb-0", "kb-1"]])
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"a": "1", "b": "2"})
+        build_index(pc_instance, index_name="idx")
+
+        assert len(index.upsert.call_args.kwargs["vectors"]) == 1
+        index.list.assert_not_called()
+        index.delete.assert_not_called()
+        assert not os.path.exists(manifest_path)
 
 
 class TestQueryIndex:
@@ -136,6 +407,8 @@ class TestQueryIndex:
     Verifies:
     - Proper fallback to simple search when Pinecone API key is missing.
     - Querying Pinecone index returns relevant search results with scores.
+    - A SQLite knowledge base is searched through its FTS5 index.
+    - The language top-up does not ask a failed vector retriever again.
     """
 
     def test_query_index_fallback_search(self, monkeypatch):
@@ -156,6 +429,83 @@ class TestQueryIndex:
         )
         assert all("score" in r for r in results)
 
+    def test_query_index_fallback_is_ranked(self, monkeypatch):
+        """Fallback results are ranked by BM25, not by dict order."""
+        monkeypatch.setattr("app.PINECONE_API_KEY", None)
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE",
+            {
+                "What is mtDNA?": "Mitochondrial DNA is inherited.",
+                "What is Y-DNA?": "Y-DNA is the paternal line.",
+            },
+        )
+        results = query_index("what is Y-DNA", top_k=2)
+        assert results[0]["title"] == "What is Y-DNA?"
+        assert results[0]["score"] > results[1]["score"]
+
+    def test_query_index_kb_database(self, monkeypatch, tmp_path):
+        """With a KB database, keyword search and exact lookups use it."""
+        kb = {
+            "What is mtDNA?": "Mitochondrial DNA is inherited.",
+            "What is Y-DNA?": "Y-DNA is the paternal line.",
+        }
+        build_kb_database(kb, str(tmp_path / "kb.sqlite3"))
+        monkeypatch.setattr("app.PINECONE_API_KEY", None)
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE",
+            SqliteKnowledgeBase(str(tmp_path / "kb.sqlite3")),
+        )
+        results = query_index("what is Y-DNA", top_k=2)
+        assert results[0]["title"] == "What is Y-DNA?"
+        assert (
+            app_module.lookup_exact("what is  y-dna") == kb["What is Y-DNA?"]
+        )
+        assert app_module.get_kb_version() == kb_fingerprint(kb)
+
+    def test_query_index_routes_by_language(self, monkeypatch):
+        """Russian queries search Russian entries, topped up if too few."""
+        monkeypatch.setattr("app.PINECONE_API_KEY", None)
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE",
+            {
+                "What is Y-DNA?": "Y-DNA is the paternal line.",
+                "Что такое Y-DNA?": "Y-DNA передаётся по отцовской линии.",
+                "Что такое mtDNA?": "Митохондриальная ДНК.",
+            },
+        )
+        results = query_index("Что такое Y-DNA", top_k=2)
+        assert [r["title"] for r in results] == [
+            "Что такое Y-DNA?",
+            "Что такое mtDNA?",
+        ]
+        results = query_index("Y-DNA линия", top_k=3)
+        assert results[0]["title"] == "Что такое Y-DNA?"
+        assert results[-1]["title"] == "What is Y-DNA?"
+
+    def test_language_top_up_skips_failed_retriever(self, monkeypatch):
+        """A failed vector search is topped up by keyword only."""
+        calls = []
+
+        def broken(query, top_k, lang):
+            calls.append(lang)
+            raise app_module.RetrieverUnavailableError("down")
+
+        monkeypatch.setattr("app.RETRIEVER_BACKEND", "fake")
+        monkeypatch.setitem(app_module.RETRIEVERS, "fake", broken)
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE",
+            {
+                "What is Y-DNA?": "Y-DNA is the paternal line.",
+                "Что такое Y-DNA?": "Y-DNA передаётся по отцовской линии.",
+            },
+        )
+        results = query_index("Y-DNA линия", top_k=2)
+        assert [r["title"] for r in results] == [
+            "Что такое Y-DNA?",
+            "What is Y-DNA?",
+        ]
+        assert calls == ["ru"]
+
     @patch("app.Pinecone")
     @patch("app.embed_text")
     def test_query_index_with_pinecone(
@@ -194,6 +544,156 @@ class TestQueryIndex:
         assert len(results) == 2
         assert results[0]["title"] == "Title1"
         assert results[0]["score"] == 0.99
+        query_kwargs = index.query.call_args_list[0].kwargs
+        assert query_kwargs["filter"] == {"lang": {"$eq": "en"}}
+
+    @patch("app.Pinecone")
+    @patch("app.embed_text")
+    def test_query_index_reuses_pinecone_handle(
+        self, mock_embed_text, pc_cls, monkeypatch
+    ):
+        """
+        Repeated queries reuse one client and index handle and do not
+        call list_indexes again within the TTL.
+        """
+        monkeypatch.setattr("app.PINECONE_API_KEY", "fake_key")
+        monkeypatch.setattr("app.LANGUAGE_ROUTING", False)
+        pc_instance = pc_cls.return_value
+        pc_instance.list_indexes.return_value = MagicMock(
+            names=lambda: ["circassiandna-knowledgebase"]
+        )
+        pc_instance.Index.return_value.query.return_value = MagicMock(
+            matches=[]
+        )
+        mock_embed_text.return_value = [0.1] * 1536
+
+        for _ in range(3):
+            query_index("query")
+
+        pc_cls.assert_called_once()
+        pc_instance.list_indexes.assert_called_once()
+        pc_instance.Index.assert_called_once()
+        assert pc_instance.Index.return_value.query.call_count == 3
+
+        monkeypatch.setattr("app.PINECONE_INDEX_CHECK_TTL", 0.0)
+        query_index("query")
+        assert pc_instance.list_indexes.call_count == 2
+        pc_cls.assert_called_once()
+
+
+class TestHybridRetrieval:
+    """
+    Tests for RETRIEVAL_MODE="hybrid" (vector + BM25 fused).
+
+    Verifies:
+    - Vector and BM25 rankings are fused with RRF.
+    - Both retrievers run concurrently.
+    - A failing vector retriever degrades to BM25 results.
+    """
+
+    KB = {
+        "What is Y-DNA?": "Y-DNA is the paternal line.",
+        "What is mtDNA?": "Mitochondrial DNA is inherited.",
+        "Who are the Circassians?": "An indigenous people of the Caucasus.",
+    }
+
+    @pytest.fixture(autouse=True)
+    def hybrid_mode(self, monkeypatch):
+        """Enable hybrid retrieval over a small knowledge base."""
+        monkeypatch.setattr("app.RETRIEVAL_MODE", "hybrid")
+        monkeypatch.setattr("app.RETRIEVER_BACKEND", "fake")
+        monkeypatch.setattr("app.KNOWLEDGEBASE", self.KB)
+
+    def test_hybrid_fuses_rankings(self, monkeypatch):
+        """An entry found by both retrievers ranks first."""
+        vector = [
+            {"title": "Who are the Circassians?", "text": "", "score": 0.9},
+            {"title": "What is Y-DNA?", "text": "", "score": 0.8},
+        ]
+        monkeypatch.setitem(
+            app_module.RETRIEVERS, "fake", lambda q, k, lang: vector[:k]
+        )
+        results = query_index("what is Y-DNA", top_k=2)
+        assert results[0]["title"] == "What is Y-DNA?"
+        assert len(results) == 2
+
+    def test_hybrid_runs_concurrently(self, monkeypatch):
+        """The vector search does not block the BM25 search."""
+        started = threading.Event()
+
+        def slow_vector(query, top_k, lang):
+            started.set()
+            time.sleep(0.2)
+            return []
+
+        def lexical(query, top_k, lang):
+            assert started.wait(1.0), "vector search did not start"
+            return []
+
+        monkeypatch.setitem(app_module.RETRIEVERS, "fake", slow_vector)
+        monkeypatch.setattr("app._fallback_search", lexical)
+        assert query_index("anything") == []
+
+    def test_hybrid_vector_failure_uses_bm25(self, monkeypatch):
+        """Retriever errors fall back to BM25-only results."""
+
+        def broken(query, top_k, lang):
+            raise OpenAIError("down")
+
+        monkeypatch.setitem(app_module.RETRIEVERS, "fake", broken)
+        results = query_index("mtDNA", top_k=3)
+        assert [r["title"] for r in results] == ["What is mtDNA?"]
+
+
+class TestLocalRetriever:
+    """
+    Tests for the in-process NumPy retriever backend.
+
+    Verifies:
+    - `build_local_index` embeds the knowledge base and writes the matrix.
+    - `query_index` answers from the local store when selected.
+    - A missing local index falls back to keyword search.
+    """
+
+    @pytest.fixture(autouse=True)
+    def local_backend(self, tmp_path, monkeypatch):
+        """Select the local backend with an index under tmp_path."""
+        monkeypatch.setattr("app.RETRIEVER_BACKEND", "local")
+        monkeypatch.setattr(
+            "app.LOCAL_INDEX_PATH", str(tmp_path / "local_index.bin")
+        )
+        monkeypatch.setitem(app_module._LOCAL_STORE_STATE, "store", None)
+
+    @patch("app.embed_text")
+    @patch("app.embed_many")
+    def test_build_and_query_local_index(
+        self, mock_embed_many, mock_embed_text, tmp_path, monkeypatch
+    ):
+        """The local backend ranks entries by cosine similarity."""
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"alpha": "first", "beta": "second"}
+        )
+        mock_embed_many.return_value = [[1.0, 0.0], [0.0, 1.0]]
+        build_local_index(str(tmp_path / "local_index.bin"))
+        assert (tmp_path / "local_index.bin").exists()
+
+        # A fresh process would load the artifact from disk.
+        monkeypatch.setitem(app_module._LOCAL_STORE_STATE, "store", None)
+        mock_embed_text.return_value = [0.1, 0.9]
+        results = query_index("second?", top_k=1)
+        assert results == [
+            {
+                "title": "beta",
+                "text": "second",
+                "score": pytest.approx(0.9939, abs=1e-3),
+            }
+        ]
+
+    def test_missing_local_index_falls_back(self, monkeypatch):
+        """Without a built index, keyword fallback is used."""
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"hello": "world"})
+        results = query_index("hello")
+        assert results[0]["title"] == "hello"
 
 
 class TestRetrieveContext:
@@ -204,6 +704,7 @@ class TestRetrieveContext:
     Verifies:
     - The returned context contains the expected fields and matches
       the query_index results.
+    - Passages can be expanded to their parent entries.
     """
 
     @patch("app.query_index")
@@ -225,6 +726,46 @@ class TestRetrieveContext:
         assert results[0]["q"] == "Q1"
         assert results[0]["a"] == "A1"
 
+    @patch("app.query_index")
+    def test_retrieve_context_expands_passages(
+        self, mock_query_index, monkeypatch
+    ):
+        """With EXPAND_PASSAGES, passages become their whole entries."""
+        monkeypatch.setattr("app.EXPAND_PASSAGES", True)
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"Q1": "P1. P2.", "Q2": "A2"})
+        mock_query_index.return_value = [
+            {"title": "Q1", "text": "P2.", "score": 0.9},
+            {"title": "Q2", "text": "A2", "score": 0.8},
+            {"title": "Q1", "text": "P1.", "score": 0.7},
+        ]
+        results = retrieve_context("some question")
+        assert [(r["q"], r["a"], r["score"]) for r in results] == [
+            ("Q1", "P1. P2.", 0.9),
+            ("Q2", "A2", 0.8),
+        ]
+
+
+class TestBuildPrompt:
+    """
+    Tests for the chat prompt.
+
+    Verifies:
+    - Contexts beyond CONTEXT_TOKEN_BUDGET are left out of the prompt.
+    """
+
+    def test_prompt_respects_budget(self, monkeypatch):
+        """Only the best-ranked contexts that fit are included."""
+        monkeypatch.setattr("app.CONTEXT_TOKEN_BUDGET", 20)
+        prompt = app_module.build_prompt(
+            "What is Y-DNA?",
+            [
+                {"q": "Q1", "a": "Paternal line.", "score": 0.9},
+                {"q": "Q2", "a": " ".join(["word"] * 100), "score": 0.5},
+            ],
+        )
+        assert "Q: Q1\nA: Paternal line." in prompt
+        assert "Q2" not in prompt
+
 
 class TestFlaskEndpoints:
     """
@@ -233,6 +774,8 @@ class TestFlaskEndpoints:
     Verifies:
     - The index route returns an HTML page.
     - The chat API route returns answers for valid questions.
+    - Concurrent identical questions share one completion.
+    - Stage timings are exported as Server-Timing and on /metrics.
     - The chat API route returns appropriate errors for missing/nvalid input.
     """
 
@@ -263,6 +806,125 @@ class TestFlaskEndpoints:
         assert "answer" in data
         assert data["answer"] == "Test answer"
 
+    @patch("app.retrieve_context", return_value=[])
+    @patch("app.client.chat.completions.create")
+    def test_chat_route_coalesces_identical_questions(
+        self, completion_create, _, flask_client
+    ):
+        """Identical questions asked at once share one completion."""
+
+        def slow_completion(**kwargs):
+            time.sleep(0.2)
+            return MagicMock(
+                choices=[MagicMock(message=MagicMock(content="Shared"))]
+            )
+
+        completion_create.side_effect = slow_completion
+        questions = ["What is Y-DNA?", "what is y-dna", "WHAT IS Y-DNA ?"]
+        with ThreadPoolExecutor(len(questions)) as pool:
+            responses = list(
+                pool.map(
+                    lambda q: app.test_client().post(
+                        "/api/chat", json={"question": q}
+                    ),
+                    questions,
+                )
+            )
+        assert [r.get_json()["answer"] for r in responses] == ["Shared"] * 3
+        completion_create.assert_called_once()
+
+    @patch("app.embed_text")
+    @patch("app.retrieve_context", return_value=[])
+    @patch("app.client.chat.completions.create")
+    def test_chat_route_answer_cache(
+        self, completion_create, _, mock_embed_text, flask_client, monkeypatch
+    ):
+        """A paraphrased question is answered from the answer cache."""
+        monkeypatch.setattr("app.ANSWER_CACHE", SemanticAnswerCache())
+        completion_create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="Paternal line"))]
+        )
+        mock_embed_text.return_value = [1.0, 0.0]
+        resp = flask_client.post(
+            "/api/chat", json={"question": "What is Y-DNA?"}
+        )
+        assert resp.get_json() == {"answer": "Paternal line", "source": "llm"}
+
+        mock_embed_text.return_value = [0.99, 0.05]
+        resp = flask_client.post(
+            "/api/chat", json={"question": "what's y-dna"}
+        )
+        assert resp.get_json() == {
+            "answer": "Paternal line",
+            "source": "answer_cache",
+        }
+        completion_create.assert_called_once()
+
+        # Editing the knowledge base invalidates cached answers.
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"What is Y-DNA?": "new"})
+        resp = flask_client.post(
+            "/api/chat", json={"question": "what's y-dna"}
+        )
+        assert resp.get_json()["source"] == "llm"
+
+    @patch("app.embed_text")
+    @patch("app.retrieve_context")
+    @patch("app.client.chat.completions.create")
+    def test_chat_route_exact_match(
+        self,
+        completion_create,
+        mock_retrieve_context,
+        mock_embed_text,
+        flask_client,
+        monkeypatch,
+    ):
+        """A pasted KB question is answered from the KB with no API calls."""
+        monkeypatch.setattr("app.ANSWER_CACHE", SemanticAnswerCache())
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"Что такое Y-ДНК?": "Отцовская линия."}
+        )
+        question = {"question": "  что такое y-днк "}
+        resp = flask_client.post("/api/chat", json=question)
+        assert resp.get_json() == {
+            "answer": "Отцовская линия.",
+            "source": "kb_exact",
+        }
+        resp = flask_client.post("/api/chat/stream", json=question)
+        assert _sse_events(resp.get_data(as_text=True)) == [
+            ("message", '{"token": "Отцовская линия."}'),
+            ("done", '{"source": "kb_exact"}'),
+        ]
+        completion_create.assert_not_called()
+        mock_retrieve_context.assert_not_called()
+        mock_embed_text.assert_not_called()
+
+    @patch("app.client.chat.completions.create")
+    def test_chat_route_metrics(
+        self, completion_create, flask_client, monkeypatch
+    ):
+        """Stage timings reach Server-Timing and /metrics."""
+        monkeypatch.setattr("app.PINECONE_API_KEY", None)
+        monkeypatch.setattr("app.KNOWLEDGEBASE", {"Y-DNA": "Paternal line"})
+        completion_create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="Answer"))]
+        )
+        resp = flask_client.post(
+            "/api/chat", json={"question": "Tell me about Y-DNA"}
+        )
+        assert resp.status_code == 200
+        stages = [
+            part.split(";")[0]
+            for part in resp.headers["Server-Timing"].split(", ")
+        ]
+        assert stages == ["keyword_search", "retrieval", "completion", "total"]
+
+        text = flask_client.get("/metrics").get_data(as_text=True)
+        assert 'cdna_stage_seconds_count{stage="completion"}' in text
+        assert 'cdna_fallbacks_total{reason="keyword_search"}' in text
+        assert 'cdna_cache_requests_total{cache="exact",result="miss"}' in text
+        assert 'cdna_requests_total{endpoint="chat",status="200"}' in text
+        assert 'cdna_singleflight_calls{role="executed"}' in text
+
     def test_chat_route_no_question(self, flask_client):
         """POST /api/chat with no question returns 400."""
         resp = flask_client.post("/api/chat", json={})
@@ -271,6 +933,13 @@ class TestFlaskEndpoints:
         assert data is not None
         assert "error" in data
 
+    def test_chat_route_non_string_question(self, flask_client):
+        """Numbers, lists and objects are rejected as questions."""
+        for question in (123, ["a"], {"q": "a"}):
+            resp = flask_client.post("/api/chat", json={"question": question})
+            assert resp.status_code == 400
+            assert resp.get_json() == {"error": "Question must be a string"}
+
     def test_chat_route_invalid_json(self, flask_client):
         """POST /api/chat with invalid JSON returns 400."""
         resp = flask_client.post(
@@ -280,3 +949,566 @@ class TestFlaskEndpoints:
         data = resp.get_json()
         assert data is not None
         assert "error" in data
+
+
+def _stream_chunks(*tokens):
+    """Build fake streamed completion chunks, one per token."""
+    return [
+        MagicMock(choices=[MagicMock(delta=MagicMock(content=t))])
+        for t in tokens
+    ]
+
+
+def _sse_events(body):
+    """Parse an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event", "message"), fields["data"]))
+    return events
+
+
+class TestChatStream:
+    """
+    Tests for the Server-Sent Events chat endpoint.
+
+    Verifies:
+    - Tokens are relayed as SSE events followed by a done event.
+    - OpenAI failures end the stream with an error event.
+    - Invalid requests get JSON errors like `/api/chat`.
+    """
+
+    @patch("app.retrieve_context")
+    @patch("app.client.chat.completions.create")
+    def test_stream_tokens(
+        self, completion_create, mock_retrieve_context, flask_client
+    ):
+        """Each delta becomes one event; empty deltas are skipped."""
+        mock_retrieve_context.return_value = [
+            {"q": "Q", "a": "A", "score": 1.0}
+        ]
+        completion_create.return_value = iter(
+            _stream_chunks("Hel", None, "lo\nthere") + [MagicMock(choices=[])]
+        )
+        resp = flask_client.post(
+            "/api/chat/stream", json={"question": "What is DNA?"}
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/event-stream"
+        assert _sse_events(resp.get_data(as_text=True)) == [
+            ("message", '{"token": "Hel"}'),
+            ("message", '{"token": "lo\\nthere"}'),
+            ("done", '{"source": "llm"}'),
+        ]
+        kwargs = completion_create.call_args.kwargs
+        assert kwargs["stream"] is True
+        assert "A: A" in kwargs["messages"][0]["content"]
+
+    @patch("app.retrieve_context", return_value=[])
+    @patch("app.client.chat.completions.create")
+    def test_stream_error_event(self, completion_create, _, flask_client):
+        """A failure mid-stream is reported as an error event."""
+
+        def failing():
+            yield from _stream_chunks("Par")
+            raise OpenAIError("boom")
+
+        completion_create.return_value = failing()
+        resp = flask_client.post(
+            "/api/chat/stream", json={"question": "What is DNA?"}
+        )
+        events = _sse_events(resp.get_data(as_text=True))
+        assert events[0] == ("message", '{"token": "Par"}')
+        assert events[-1][0] == "error"
+        assert "boom" in events[-1][1]
+
+    def test_stream_no_question(self, flask_client):
+        """POST /api/chat/stream with no question returns 400."""
+        resp = flask_client.post("/api/chat/stream", json={})
+        assert resp.status_code == 400
+        assert "error" in resp.get_json()
+        resp = flask_client.post("/api/chat/stream", json={"question": 123})
+        assert resp.status_code == 400
+        assert resp.get_json() == {"error": "Question must be a string"}
+
+
+class TestCircuitBreakers:
+    """
+    Tests for the per-upstream circuit breakers.
+
+    Verifies:
+    - Repeated Pinecone failures open its circuit; later queries skip
+      Pinecone and use the keyword fallback.
+    - With the chat circuit open, /api/chat and /api/chat/stream answer
+      from the best retrieved entry.
+    - /healthz and /metrics report the circuit states.
+    """
+
+    @pytest.fixture(autouse=True)
+    def fresh_circuits(self, monkeypatch):
+        """Give each test closed circuits with a low threshold."""
+        for name, circuit in list(app_module.CIRCUITS.items()):
+            monkeypatch.setitem(
+                app_module.CIRCUITS,
+                name,
+                app_module.CircuitBreaker(
+                    name,
+                    failure_threshold=2,
+                    failure_types=circuit.failure_types,
+                ),
+            )
+
+    @staticmethod
+    def _open(name):
+        """Record enough failures to open a circuit."""
+        for _ in range(2):
+            app_module.CIRCUITS[name].record_failure()
+
+    @patch("app.Pinecone")
+    @patch("app.embed_text", return_value=[0.1] * 1536)
+    def test_open_pinecone_circuit_skips_pinecone(
+        self, _, pc_cls, monkeypatch
+    ):
+        """Failing queries open the circuit; then Pinecone is not called."""
+        monkeypatch.setattr("app.PINECONE_API_KEY", "fake_key")
+        monkeypatch.setattr("app.LANGUAGE_ROUTING", False)
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"What is mtDNA?": "Mitochondrial DNA."}
+        )
+        pc_instance = pc_cls.return_value
+        pc_instance.list_indexes.return_value = MagicMock(
+            names=lambda: ["circassiandna-knowledgebase"]
+        )
+        index = pc_instance.Index.return_value
+        index.query.side_effect = TimeoutError("pinecone timed out")
+
+        for _ in range(2):
+            query_index("mtDNA")
+        assert app_module.CIRCUITS["pinecone"].state == "open"
+
+        results = query_index("mtDNA")
+        assert [r["title"] for r in results] == ["What is mtDNA?"]
+        assert index.query.call_count == 2
+
+    @patch("app.retrieve_context")
+    @patch("app.client.chat.completions.create")
+    def test_open_chat_circuit_answers_from_kb(
+        self, completion_create, mock_retrieve_context, flask_client
+    ):
+        """No completion is requested while the chat circuit is open."""
+        mock_retrieve_context.return_value = [
+            {"q": "What is DNA?", "a": "Deoxyribonucleic acid.", "score": 0.9}
+        ]
+        self._open("openai_chat")
+
+        resp = flask_client.post(
+            "/api/chat", json={"question": "Tell me about DNA"}
+        )
+        assert resp.status_code == 200
+        assert resp.get_json() == {
+            "answer": "Deoxyribonucleic acid.",
+            "source": "kb_fallback",
+        }
+
+        resp = flask_client.post(
+            "/api/chat/stream", json={"question": "Tell me about DNA"}
+        )
+        assert _sse_events(resp.get_data(as_text=True)) == [
+            ("message", '{"token": "Deoxyribonucleic acid."}'),
+            ("done", '{"source": "kb_fallback"}'),
+        ]
+        completion_create.assert_not_called()
+
+    def test_health_reports_circuits(self, flask_client):
+        """An open circuit marks the server degraded but still 200."""
+        resp = flask_client.get("/healthz")
+        assert resp.status_code == 200
+        assert resp.get_json()["status"] == "ok"
+
+        self._open("pinecone")
+        resp = flask_client.get("/healthz")
+        assert resp.status_code == 200
+        assert resp.get_json() == {
+            "status": "degraded",
+            "circuits": {
+                "pinecone": "open",
+                "openai_embeddings": "closed",
+                "openai_chat": "closed",
+            },
+        }
+        body = flask_client.get("/metrics").get_data(as_text=True)
+        assert 'cdna_circuit_state{circuit="pinecone"} 2' in body
+
+
+class TestRequestDeadline:
+    """
+    Tests for the per-request deadline of the chat endpoints.
+
+    Verifies:
+    - Upstream calls get the time left as their timeout.
+    - A slow retrieval leaves no time for a completion: the answer comes
+      from the retrieved context, or asks to try again.
+    - On Lambda the budget is capped by the invocation time left.
+    - A stream that outlives the deadline ends with an error event.
+    - Waiting for an identical in-flight question stops at the deadline.
+    """
+
+    @pytest.fixture(autouse=True)
+    def no_answer_cache(self, monkeypatch):
+        """Keep the answer cache and exact matches out of the way."""
+        monkeypatch.setattr("app.ANSWER_CACHE", None)
+        monkeypatch.setattr("app.lookup_exact", lambda question: None)
+
+    @patch("app.retrieve_context")
+    @patch("app.client.chat.completions.create")
+    def test_completion_gets_remaining_time(
+        self,
+        completion_create,
+        mock_retrieve_context,
+        monkeypatch,
+        flask_client,
+    ):
+        """The completion timeout is what retrieval left of the budget."""
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 10.0)
+        mock_retrieve_context.return_value = [
+            {"q": "Q", "a": "A", "score": 1.0}
+        ]
+        completion_create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="Answer"))]
+        )
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.get_json()["source"] == "llm"
+        assert 9.0 < completion_create.call_args.kwargs["timeout"] <= 10.0
+
+    @patch("app.client.chat.completions.create")
+    def test_slow_retrieval_answers_from_context(
+        self, completion_create, monkeypatch, flask_client
+    ):
+        """No completion is attempted once the budget is spent."""
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 1.5)
+        hits = [{"q": "What is DNA?", "a": "Deoxyribonucleic acid."}]
+
+        def slow_retrieval(question):
+            assert app_module.remaining() <= 0.6  # retrieval's share
+            time.sleep(0.6)
+            return hits
+
+        monkeypatch.setattr("app.retrieve_context", slow_retrieval)
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.status_code == 200
+        assert resp.get_json() == {
+            "answer": "Deoxyribonucleic acid.",
+            "source": "kb_fallback",
+        }
+
+        hits.clear()
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.get_json() == {
+            "answer": app_module.TRY_AGAIN_ANSWER,
+            "source": "try_again",
+        }
+        completion_create.assert_not_called()
+
+    def test_lambda_budget(self, monkeypatch, flask_client):
+        """The Lambda invocation time left caps the deadline."""
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 25.0)
+        budgets = []
+
+        def record(question, embedding=None):
+            budgets.append(app_module.remaining())
+            return {"answer": "A", "source": "llm"}
+
+        monkeypatch.setattr("app.generate_answer", record)
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 4000
+        flask_client.post(
+            "/api/chat",
+            json={"question": "DNA?"},
+            environ_base={"apig_wsgi.context": context},
+        )
+        assert 2.5 < budgets[0] <= 3.0
+
+    def test_coalesced_wait_bounded(self, monkeypatch, flask_client):
+        """A follower of a slow identical question asks to try again."""
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 0.3)
+        monkeypatch.setattr("app.SINGLE_FLIGHT", app_module.SingleFlight())
+        started, release = threading.Event(), threading.Event()
+
+        def slow(question, embedding=None):
+            started.set()
+            release.wait(5.0)
+            return {"answer": "A", "source": "llm"}
+
+        monkeypatch.setattr("app.generate_answer", slow)
+        leader = threading.Thread(
+            target=app_module.generate_answer_once, args=("DNA?",)
+        )
+        leader.start()
+        started.wait()
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        release.set()
+        leader.join()
+        assert resp.get_json()["source"] == "try_again"
+
+    @patch("app.retrieve_context", return_value=[])
+    @patch("app.client.chat.completions.create")
+    def test_stream_deadline(
+        self, completion_create, _, monkeypatch, flask_client
+    ):
+        """Tokens after the deadline are not relayed."""
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 1.2)
+
+        def slow():
+            yield from _stream_chunks("Par")
+            time.sleep(1.2)
+            yield from _stream_chunks("tial")
+
+        completion_create.return_value = slow()
+        resp = flask_client.post(
+            "/api/chat/stream", json={"question": "What is DNA?"}
+        )
+        events = _sse_events(resp.get_data(as_text=True))
+        assert events[0] == ("message", '{"token": "Par"}')
+        assert events[-1][0] == "error"
+        assert "deadline" in events[-1][1]
+        assert 1.0 < completion_create.call_args.kwargs["timeout"] <= 1.2
+
+
+class TestAdmissionControl:
+    """
+    Tests for rate limiting and the concurrency cap of the chat API.
+
+    Verifies:
+    - A client over its rate limit gets a 429 with Retry-After, while
+      other clients are still served.
+    - Without trusted proxies, X-Forwarded-For does not change the bucket.
+    - With every slot taken, chats get a 429 at once.
+    - A streamed answer holds its slot until the stream is consumed.
+    """
+
+    @pytest.fixture(autouse=True)
+    def shortcut_answers(self, monkeypatch):
+        """Answer every question from the knowledge base."""
+        monkeypatch.setattr("app.lookup_exact", lambda question: "Answer")
+
+    def test_rate_limit(self, monkeypatch, flask_client):
+        """Each client has its own bucket."""
+        monkeypatch.setattr("app.TRUSTED_PROXIES", 1)
+        monkeypatch.setattr(
+            "app.RATE_LIMITER", app_module.TokenBucket(rate=0.1, burst=2)
+        )
+
+        def ask(ip):
+            return flask_client.post(
+                "/api/chat",
+                json={"question": "DNA?"},
+                headers={"X-Forwarded-For": ip},
+            )
+
+        assert ask("1.1.1.1").status_code == 200
+        assert ask("1.1.1.1").status_code == 200
+        resp = ask("1.1.1.1")
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "10"
+        assert "error" in resp.get_json()
+        assert ask("2.2.2.2").status_code == 200
+        body = flask_client.get("/metrics").get_data(as_text=True)
+        assert 'cdna_rejected_requests_total{reason="rate_limit"} 1' in body
+
+    def test_forwarded_for_ignored_by_default(self, monkeypatch, flask_client):
+        """A client cannot forge a fresh bucket when no proxy is trusted."""
+        monkeypatch.setattr(
+            "app.RATE_LIMITER", app_module.TokenBucket(rate=0.1, burst=1)
+        )
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.status_code == 200
+        resp = flask_client.post(
+            "/api/chat",
+            json={"question": "DNA?"},
+            headers={"X-Forwarded-For": "3.3.3.3"},
+        )
+        assert resp.status_code == 429
+
+    def test_concurrency_limit(self, monkeypatch, flask_client):
+        """No slot and no queue room means an immediate 429."""
+        slots = app_module.ConcurrencyLimiter(1, queue_size=0)
+        monkeypatch.setattr("app.CHAT_SLOTS", slots)
+        assert slots.acquire()
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.status_code == 429
+        assert "Retry-After" in resp.headers
+        slots.release()
+        resp = flask_client.post("/api/chat", json={"question": "DNA?"})
+        assert resp.status_code == 200
+        assert slots.stats()["active"] == 0
+
+    @patch("app.retrieve_context", return_value=[])
+    @patch("app.client.chat.completions.create")
+    def test_stream_holds_slot(
+        self, completion_create, _, monkeypatch, flask_client
+    ):
+        """The slot is released when the stream closes, not before."""
+        monkeypatch.setattr("app.lookup_exact", lambda question: None)
+        slots = app_module.ConcurrencyLimiter(1, queue_size=0)
+        monkeypatch.setattr("app.CHAT_SLOTS", slots)
+        completion_create.return_value = iter(_stream_chunks("Hi"))
+        resp = flask_client.post(
+            "/api/chat/stream",
+            json={"question": "What is DNA?"},
+            buffered=False,
+        )
+        assert slots.stats()["active"] == 1
+        assert "Hi" in resp.get_data(as_text=True)
+        resp.close()
+        assert slots.stats()["active"] == 0
+
+
+class TestChatBatch:
+    """
+    Tests for batch answers (`answer_batch` and /api/chat/batch).
+
+    Verifies:
+    - Questions are embedded in one request and not again by retrieval.
+    - Results come back in order, duplicates answered once, with
+      per-question errors.
+    - The endpoint needs the API token and validates its input; trusted
+      clients skip the rate limit.
+    - Batch embedding and every answer stay within the request budget;
+      questions it leaves no time for are marked "deadline exceeded".
+    """
+
+    @pytest.fixture(autouse=True)
+    def fake_pipeline(self, monkeypatch):
+        """A vector retriever that embeds the query, and one KB entry."""
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"What is Y-DNA?": "Paternal"}
+        )
+        monkeypatch.setattr("app.RETRIEVER_BACKEND", "fake")
+        monkeypatch.setattr("app.RETRIEVAL_MODE", "vector")
+        monkeypatch.setattr("app.LANGUAGE_ROUTING", False)
+
+        def retriever(query, top_k, lang):
+            app_module.embed_text(query)
+            return [{"title": query, "text": "context", "score": 1.0}]
+
+        monkeypatch.setitem(app_module.RETRIEVERS, "fake", retriever)
+
+    @patch("app.client.embeddings.create")
+    @patch("app.client.chat.completions.create")
+    def test_answer_batch(self, completion_create, embeddings_create):
+        """One embeddings call; answers and errors in question order."""
+        embeddings_create.side_effect = lambda model, input, timeout: (
+            _embedding_response(input)
+        )
+
+        def complete(model, messages, timeout):
+            prompt = messages[0]["content"]
+            if "broken" in prompt:
+                raise OpenAIError("bad request")
+            return MagicMock(
+                choices=[MagicMock(message=MagicMock(content="LLM"))]
+            )
+
+        completion_create.side_effect = complete
+        results = app_module.answer_batch(
+            ["first", "What is Y-DNA?", "broken", "first"], workers=4
+        )
+
+        embeddings_create.assert_called_once()
+        assert embeddings_create.call_args.kwargs["input"] == [
+            "first",
+            "broken",
+        ]
+        assert completion_create.call_count == 2
+        assert results[0] == {
+            "question": "first",
+            "answer": "LLM",
+            "source": "llm",
+        }
+        assert results[1]["source"] == "kb_exact"
+        assert results[2]["question"] == "broken"
+        assert "bad request" in results[2]["error"]
+        assert results[3] == results[0]
+
+    @patch("app.client.embeddings.create")
+    @patch("app.client.chat.completions.create")
+    def test_batch_request_budget(
+        self, completion_create, embeddings_create, monkeypatch, flask_client
+    ):
+        """Upstream timeouts are capped by the invocation time left."""
+        monkeypatch.setattr("app.API_TOKEN", "secret")
+        monkeypatch.setattr("app.REQUEST_DEADLINE", 25.0)
+        embeddings_create.side_effect = lambda model, input, timeout: (
+            _embedding_response(input)
+        )
+        completion_create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="LLM"))]
+        )
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 3500
+        resp = flask_client.post(
+            "/api/chat/batch",
+            json={"questions": ["first", "second"]},
+            headers={"Authorization": "Bearer secret"},
+            environ_base={"apig_wsgi.context": context},
+        )
+        assert resp.status_code == 200
+        embeddings_create.assert_called_once()
+        assert 0 < embeddings_create.call_args.kwargs["timeout"] <= 0.5
+        assert completion_create.call_count == 2
+        for call in completion_create.call_args_list:
+            assert 1.0 <= call.kwargs["timeout"] <= 2.5
+
+    @patch("app.client.embeddings.create")
+    @patch("app.client.chat.completions.create")
+    def test_answer_batch_marks_deadline(
+        self, completion_create, embeddings_create
+    ):
+        """Out of time, a question gets an error instead of a fallback."""
+        embeddings_create.side_effect = lambda model, input, timeout: (
+            _embedding_response(input)
+        )
+        with app_module.deadline(0.5):
+            results = app_module.answer_batch(["first", "What is Y-DNA?"])
+        completion_create.assert_not_called()
+        assert results[0] == {
+            "question": "first",
+            "error": "deadline exceeded",
+        }
+        assert results[1]["source"] == "kb_exact"
+
+    @patch("app.answer_batch")
+    def test_batch_endpoint(self, mock_batch, monkeypatch, flask_client):
+        """Token checks, validation and rate limit bypass."""
+        mock_batch.side_effect = lambda questions: [
+            {"question": q, "answer": "A", "source": "llm"} for q in questions
+        ]
+        payload = {"questions": ["a", "b"]}
+        resp = flask_client.post("/api/chat/batch", json=payload)
+        assert resp.status_code == 403
+
+        monkeypatch.setattr("app.API_TOKEN", "secret")
+        monkeypatch.setattr(
+            "app.RATE_LIMITER", app_module.TokenBucket(rate=0.1, burst=1)
+        )
+        auth = {"Authorization": "Bearer secret"}
+        resp = flask_client.post(
+            "/api/chat/batch",
+            json=payload,
+            headers={"Authorization": "Bearer wrong"},
+        )
+        assert resp.status_code == 401
+        for bad in ({}, {"questions": []}, {"questions": ["a", 1]}):
+            resp = flask_client.post("/api/chat/batch", json=bad, headers=auth)
+            assert resp.status_code == 400
+        monkeypatch.setattr("app.MAX_BATCH_SIZE", 1)
+        resp = flask_client.post("/api/chat/batch", json=payload, headers=auth)
+        assert resp.status_code == 413
+
+        monkeypatch.setattr("app.MAX_BATCH_SIZE", 100)
+        resp = flask_client.post("/api/chat/batch", json=payload, headers=auth)
+        assert resp.status_code == 200
+        assert [r["question"] for r in resp.get_json()["results"]] == [
+            "a",
+            "b",
+        ]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from openai import OpenAIError
+
+import asgi_app
+from circuit_breaker import CircuitBreaker
+from ratelimit import TokenBucket
+
+
+def _completion(content):
+    """Build a fake chat completion response."""
+    return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+
+async def _post(path, **kwargs):
+    """Send one request to the ASGI app in-process."""
+    transport = httpx.ASGITransport(app=asgi_app.application)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test"
+    ) as client:
+        return await client.post(path, **kwargs)
+
+
+async def _get(path):
+    """Send one GET request to the ASGI app in-process."""
+    transport = httpx.ASGITransport(app=asgi_app.application)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test"
+    ) as client:
+        return await client.get(path)
+
+
+class TestAsgiChat:
+    """
+    Tests for the ASGI variant of the chat API.
+
+    Verifies:
+    - The request/response contract matches the Flask `chat()`.
+    - Completions of concurrent requests overlap on one event loop.
+    - Concurrent identical questions share one completion.
+    - Stage timings are exported as Server-Timing and on /metrics.
+    - Errors, shortcuts and CORS behave like the Flask app.
+    - An open chat circuit degrades to a knowledge base answer.
+    - Clients over their rate limit are refused with a 429.
+    """
+
+    @patch("asgi_app.retrieve_context")
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_chat_success(self, completion_create, mock_retrieve_context):
+        """POST /api/chat returns the generated answer."""
+        mock_retrieve_context.return_value = [
+            {"q": "Q", "a": "A", "score": 1.0}
+        ]
+        completion_create.side_effect = AsyncMock(
+            return_value=_completion("Test answer")
+        )
+        resp = asyncio.run(
+            _post("/api/chat", json={"question": "What is DNA?"})
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {"answer": "Test answer", "source": "llm"}
+        prompt = completion_create.call_args.kwargs["messages"][0]["content"]
+        assert "Q: Q\nA: A" in prompt
+
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_chat_metrics(self, completion_create, monkeypatch):
+        """Retrieval in the thread pool and the completion are timed."""
+        monkeypatch.setattr("app.PINECONE_API_KEY", None)
+        completion_create.side_effect = AsyncMock(
+            return_value=_completion("ok")
+        )
+        resp = asyncio.run(
+            _post("/api/chat", json={"question": "Ancient steppe DNA"})
+        )
+        timing = resp.headers["server-timing"]
+        for stage in ("retrieval", "completion", "total"):
+            assert f"{stage};dur=" in timing
+
+        async def scrape():
+            transport = httpx.ASGITransport(app=asgi_app.application)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await client.get("/metrics")
+
+        text = asyncio.run(scrape()).text
+        assert 'cdna_requests_total{endpoint="chat",status="200"}' in text
+
+    @patch("asgi_app.retrieve_context", return_value=[])
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_completions_overlap(self, completion_create, _):
+        """Twenty slow completions finish in about the time of one."""
+
+        async def slow_completion(**kwargs):
+            await asyncio.sleep(0.2)
+            return _completion("ok")
+
+        completion_create.side_effect = slow_completion
+
+        async def burst():
+            return await asyncio.gather(
+                *(
+                    _post("/api/chat", json={"question": f"q{i}"})
+                    for i in range(20)
+                )
+            )
+
+        started = time.perf_counter()
+        responses = asyncio.run(burst())
+        assert all(r.status_code == 200 for r in responses)
+        assert time.perf_counter() - started < 2.0
+
+    @patch("asgi_app.retrieve_context", return_value=[])
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_identical_questions_coalesce(self, completion_create, _):
+        """Concurrent identical questions share one completion."""
+
+        async def slow_completion(**kwargs):
+            await asyncio.sleep(0.2)
+            return _completion("shared")
+
+        completion_create.side_effect = slow_completion
+
+        async def burst():
+            return await asyncio.gather(
+                *(
+                    _post("/api/chat", json={"question": "What is DNA?"})
+                    for _ in range(10)
+                )
+            )
+
+        responses = asyncio.run(burst())
+        assert [r.json()["answer"] for r in responses] == ["shared"] * 10
+        assert completion_create.call_count == 1
+        assert not asgi_app._IN_FLIGHT
+
+    @patch("asgi_app.retrieve_context", return_value=[])
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_openai_error(self, completion_create, _):
+        """OpenAI failures are reported as 500 JSON errors."""
+        completion_create.side_effect = OpenAIError("API failure")
+        resp = asyncio.run(_post("/api/chat", json={"question": "q"}))
+        assert resp.status_code == 500
+        assert "OpenAI API error" in resp.json()["error"]
+
+    @patch("asgi_app.retrieve_context")
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_open_chat_circuit(
+        self, completion_create, mock_retrieve_context, monkeypatch
+    ):
+        """An open chat circuit answers from the best retrieved entry."""
+        mock_retrieve_context.return_value = [
+            {"q": "What is DNA?", "a": "Deoxyribonucleic acid.", "score": 0.9}
+        ]
+        circuit = CircuitBreaker("openai_chat", failure_threshold=1)
+        circuit.record_failure()
+        monkeypatch.setitem(asgi_app.CIRCUITS, "openai_chat", circuit)
+        resp = asyncio.run(_post("/api/chat", json={"question": "DNA?"}))
+        assert resp.json() == {
+            "answer": "Deoxyribonucleic acid.",
+            "source": "kb_fallback",
+        }
+        completion_create.assert_not_called()
+        resp = asyncio.run(_get("/healthz"))
+        assert resp.json()["status"] == "degraded"
+
+    @patch("asgi_app.ASYNC_CLIENT.chat.completions.create")
+    def test_exact_match(self, completion_create, monkeypatch):
+        """Pasted KB questions are answered without a completion."""
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"What is Y-DNA?": "Paternal"}
+        )
+        resp = asyncio.run(
+            _post("/api/chat", json={"question": "what is y-dna"})
+        )
+        assert resp.json() == {"answer": "Paternal", "source": "kb_exact"}
+        completion_create.assert_not_called()
+
+    def test_rate_limit(self, monkeypatch):
+        """Clients over their rate limit get a 429 with Retry-After."""
+        monkeypatch.setattr(
+            "asgi_app.RATE_LIMITER", TokenBucket(rate=0.5, burst=1)
+        )
+        monkeypatch.setattr(
+            "app.KNOWLEDGEBASE", {"What is Y-DNA?": "Paternal"}
+        )
+        question = {"question": "what is y-dna"}
+        assert asyncio.run(_post("/api/chat", json=question)).is_success
+        resp = asyncio.run(_post("/api/chat", json=question))
+        assert resp.status_code == 429
+        assert resp.headers["retry-after"] == "2"
+
+    def test_bad_requests(self):
+        """Missing or non-string questions and invalid JSON return 400."""
+        resp = asyncio.run(_post("/api/chat", json={}))
+        assert resp.status_code == 400
+        assert resp.json() == {"error": "No question provided"}
+        resp = asyncio.run(_post("/api/chat", json={"question": 123}))
+        assert resp.status_code == 400
+        assert resp.json() == {"error": "Question must be a string"}
+        resp = asyncio.run(
+            _post(
+                "/api/chat",
+                content=b"invalid json",
+                headers={"Content-Type": "application/json"},
+            )
+        )
+        assert resp.status_code == 400
+        assert resp.json() == {"error": "Invalid JSON payload"}
+
+    def test_cors_preflight(self):
+        """Allowed origins get CORS headers, others do not."""
+
+        async def preflight(origin):
+            transport = httpx.ASGITransport(app=asgi_app.application)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await client.options(
+                    "/api/chat", headers={"Origin": origin}
+                )
+
+        resp = asyncio.run(preflight("https://circassiandna.com"))
+        assert resp.status_code == 204
+        assert resp.headers["access-control-allow-origin"] == (
+            "https://circassiandna.com"
+        )
+        resp = asyncio.run(preflight("https://example.com"))
+        assert "access-control-allow-origin" not in resp.headers
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from chunking import chunk_entry, split_passages
+from index_manifest import entry_id
+from utils import count_tokens
+
+TEXT = "Alpha beta gamma. Delta epsilon zeta. Eta theta iota. Kappa lambda mu."
+
+
+class TestChunking:
+    """
+    Tests for splitting knowledge base entries into passages.
+
+    Verifies:
+    - Short texts stay whole; long ones respect the token limit.
+    - Consecutive passages overlap by whole trailing sentences.
+    - Sentences longer than the limit are split at word boundaries.
+    - Passage IDs are linked to (and, when unsplit, equal) the entry ID.
+    """
+
+    def test_short_text_is_whole(self):
+        """Texts within the limit are a single passage."""
+        assert split_passages(TEXT, 100, 10) == [TEXT]
+
+    def test_token_limit(self):
+        """Every passage fits the limit and no sentence is lost."""
+        passages = split_passages(TEXT, 10, 0)
+        assert all(count_tokens(p) <= 10 for p in passages)
+        assert " ".join(passages) == TEXT
+
+    def test_overlap(self):
+        """Each passage starts with the last sentence of the previous."""
+        passages = split_passages(TEXT, 14, 6)
+        assert passages == [
+            "Alpha beta gamma. Delta epsilon zeta.",
+            "Delta epsilon zeta. Eta theta iota.",
+            "Eta theta iota. Kappa lambda mu.",
+        ]
+
+    def test_long_sentence(self):
+        """A sentence over the limit is split between words."""
+        sentence = " ".join(["word"] * 30)
+        passages = split_passages(sentence, 8, 0)
+        assert len(passages) == 4
+        assert all(count_tokens(p) <= 8 for p in passages)
+
+    def test_chunk_entry_ids(self):
+        """Passages carry their parent; a whole entry keeps its entry ID."""
+        assert chunk_entry("q", "Short.", 100, 0)[0].id == entry_id("q")
+        passages = chunk_entry("q", TEXT, 10, 0)
+        assert [p.id for p in passages] == [
+            f"{entry_id('q')}-{i}" for i in range(len(passages))
+        ]
+        assert {p.parent for p in passages} == {"q"}
+        assert [p.index for p in passages] == list(range(len(passages)))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    """A settable monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail(breaker, exc=ConnectionError("down")):
+    """Run one failing call through the breaker."""
+    with pytest.raises(type(exc)):
+        with breaker:
+            raise exc
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        "upstream",
+        failure_threshold=3,
+        cooldown=10.0,
+        failure_types=(ConnectionError,),
+        clock=clock,
+    )
+
+
+class TestCircuitBreaker:
+    """
+    Tests for the per-upstream circuit breaker.
+
+    Verifies:
+    - The circuit opens after N consecutive failures and rejects calls.
+    - A success resets the consecutive failure count.
+    - After the cooldown one probe is let through; its result closes or
+      reopens the circuit.
+    - Exceptions outside `failure_types` do not count as failures.
+    """
+
+    def test_opens_after_threshold(self, breaker):
+        """Calls fail fast once the threshold is reached."""
+        for _ in range(3):
+            _fail(breaker)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError) as info:
+            with breaker:
+                pytest.fail("upstream called while open")
+        assert info.value.name == "upstream"
+        assert info.value.retry_after == pytest.approx(10.0)
+        assert breaker.stats() == {
+            "state": "open",
+            "failures": 3,
+            "opened": 1,
+            "rejected": 1,
+        }
+
+    def test_success_resets_failures(self, breaker):
+        """Only consecutive failures open the circuit."""
+        _fail(breaker)
+        _fail(breaker)
+        with breaker:
+            pass
+        _fail(breaker)
+        assert breaker.state == "closed"
+
+    def test_half_open_probe_closes(self, breaker, clock):
+        """A successful probe after the cooldown closes the circuit."""
+        for _ in range(3):
+            _fail(breaker)
+        clock.now = 10.0
+        assert breaker.state == "half_open"
+        breaker.allow()
+        # The single probe slot is taken: others still fail fast.
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_half_open_probe_failure_reopens(self, breaker, clock):
+        """A failed probe opens the circuit for another cooldown."""
+        for _ in range(3):
+            _fail(breaker)
+        clock.now = 10.0
+        _fail(breaker)
+        assert breaker.state == "open"
+        assert breaker.stats()["opened"] == 2
+        clock.now = 15.0
+        with pytest.raises(CircuitOpenError) as info:
+            breaker.allow()
+        assert info.value.retry_after == pytest.approx(5.0)
+
+    def test_other_errors_are_not_failures(self, breaker):
+        """An upstream that answers with an error is still up."""
+        for _ in range(5):
+            _fail(breaker, ValueError("bad request"))
+        assert breaker.state == "closed"
+        assert breaker.stats()["failures"] == 0
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+from deadline import (
+    DeadlineExceeded,
+    deadline,
+    remaining,
+    stage,
+    upstream_timeout,
+)
+
+
+class TestDeadline:
+    """
+    Tests for per-request deadlines.
+
+    Verifies:
+    - Without a deadline nothing is bounded.
+    - Nested deadlines and stages can only shorten the outer one.
+    - Upstream timeouts shrink with the time left and fail once it is
+      spent.
+    - The deadline follows the request into threads via copied contexts.
+    """
+
+    def test_unbounded(self):
+        """No deadline means no timeout."""
+        assert remaining() is None
+        assert upstream_timeout(10.0) is None
+        with stage(0.5):
+            assert remaining() is None
+
+    def test_nested_deadlines(self):
+        """An inner deadline cannot extend the outer one."""
+        with deadline(1.0):
+            with deadline(60.0):
+                assert remaining() <= 1.0
+            with deadline(0.1):
+                assert remaining() <= 0.1
+            assert 0.1 < remaining() <= 1.0
+        assert remaining() is None
+
+    def test_stage_takes_share(self):
+        """A stage gets its share and leaves the rest for later ones."""
+        with deadline(10.0):
+            with stage(0.25):
+                assert 2.0 < upstream_timeout() <= 2.5
+            assert upstream_timeout() > 9.0
+
+    def test_exhausted(self):
+        """Calls fail fast once the budget is spent or too small."""
+        with deadline(0.5):
+            with pytest.raises(DeadlineExceeded):
+                upstream_timeout(minimum=1.0)
+        with deadline(0.01):
+            time.sleep(0.02)
+            with pytest.raises(DeadlineExceeded):
+                upstream_timeout()
+        with deadline(-1.0):
+            assert remaining() < 0
+
+    def test_propagates_to_threads(self):
+        """Threads run in a copy of the context share the deadline."""
+        seen = []
+        with deadline(5.0):
+            ctx = contextvars.copy_context()
+        thread = threading.Thread(
+            target=ctx.run, args=(lambda: seen.append(remaining()),)
+        )
+        thread.start()
+        thread.join()
+        assert 0 < seen[0] <= 5.0
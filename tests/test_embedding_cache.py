@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+
+from embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache:
+    """
+    Tests for the SQLite-backed persistent embedding cache.
+
+    Verifies:
+    - Stored vectors are returned for the same model and normalized text.
+    - Hit/miss counters track lookups.
+    - Least recently used entries are evicted beyond `max_entries`.
+    - Entries survive reopening the database.
+    """
+
+    def test_get_put_and_counters(self, tmp_path):
+        """Cached vectors round-trip as float32 and count hits/misses."""
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        assert cache.get("m", "hello world") is None
+        cache.put("m", "hello world", [0.5, -1.0])
+        assert cache.get("m", "  hello\n world ") == [0.5, -1.0]
+        assert cache.get("other-model", "hello world") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    def test_lru_eviction(self, tmp_path):
+        """The least recently used entries are evicted first."""
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+        for text in ["a", "b", "c"]:
+            cache.put("m", text, [1.0])
+            time.sleep(0.01)
+        cache.get("m", "a")  # refresh "a"
+        cache.put("m", "d", [1.0])
+        assert cache.stats()["size"] <= 3
+        assert cache.get("m", "a") == [1.0]
+        assert cache.get("m", "b") is None
+
+    def test_persistence(self, tmp_path):
+        """Entries are visible to a new cache instance on the same file."""
+        path = str(tmp_path / "cache.sqlite3")
+        cache = EmbeddingCache(path)
+        cache.put_many("m", ["x", "y"], [[1.0], [2.0]])
+        cache.close()
+        reopened = EmbeddingCache(path)
+        assert reopened.get_many("m", ["y", "z", "x"]) == [[2.0], None, [1.0]]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from fusion import reciprocal_rank_fusion, weighted_fusion
+
+
+def _hits(*pairs):
+    """Build a ranked hit list from (title, score) pairs."""
+    return [{"title": t, "text": t.lower(), "score": s} for t, s in pairs]
+
+
+class TestReciprocalRankFusion:
+    """
+    Tests for rank-based fusion of retriever results.
+
+    Verifies:
+    - Entries found by both retrievers outrank single-list entries.
+    - Duplicates are merged and the result is truncated to top_k.
+    - Several passages of one entry count once, at their best rank.
+    """
+
+    def test_agreement_wins(self):
+        """An entry ranked second by both lists beats two single winners."""
+        vector = _hits(("A", 0.9), ("C", 0.8))
+        lexical = _hits(("B", 12.0), ("C", 7.0))
+        fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+        assert [h["title"] for h in fused] == ["C", "A", "B"]
+        assert fused[0]["score"] == 2 / 62
+        assert fused[0]["text"] == "c"
+
+    def test_top_k(self):
+        """At most top_k unique entries are returned."""
+        fused = reciprocal_rank_fusion(
+            [_hits(("A", 1), ("B", 1)), _hits(("A", 1))], top_k=1
+        )
+        assert [h["title"] for h in fused] == ["A"]
+
+    def test_best_passage_per_entry(self):
+        """Two weak passages of a long entry do not beat a better match."""
+        vector = [
+            {"title": "Short", "text": "short", "score": 0.9},
+            {"title": "Long", "text": "first passage", "score": 0.7},
+            {"title": "Long", "text": "second passage", "score": 0.6},
+        ]
+        lexical = _hits(("Long", 3.0), ("Short", 2.0))
+        fused = reciprocal_rank_fusion([vector, lexical], top_k=2)
+        assert [h["title"] for h in fused] == ["Short", "Long"]
+        assert fused[0]["score"] == fused[1]["score"] == 1 / 61 + 1 / 62
+        assert fused[1]["text"] == "first passage"
+
+
+class TestWeightedFusion:
+    """
+    Tests for score-based fusion of retriever results.
+
+    Verifies:
+    - Scores are normalized per list so BM25 does not swamp cosine.
+    - Weights shift the ranking between retrievers.
+    """
+
+    def test_normalized_weights(self):
+        """Each list contributes on a [0, 1] scale times its weight."""
+        vector = _hits(("A", 0.8), ("B", 0.4))
+        lexical = _hits(("B", 20.0), ("A", 5.0))
+        fused = weighted_fusion([vector, lexical], [0.5, 0.5], top_k=2)
+        assert [h["title"] for h in fused] == ["B", "A"]
+        assert fused[0]["score"] == 0.75
+        fused = weighted_fusion([vector, lexical], [0.8, 0.2], top_k=2)
+        assert fused[0]["title"] == "A"
+
+    def test_best_passage_per_entry(self):
+        """Only the best passage of an entry adds to its score."""
+        vector = [
+            {"title": "Short", "text": "short", "score": 0.9},
+            {"title": "Long", "text": "first passage", "score": 0.6},
+            {"title": "Long", "text": "second passage", "score": 0.6},
+        ]
+        fused = weighted_fusion([vector, []], [1.0, 0.0], top_k=2)
+        assert [h["title"] for h in fused] == ["Short", "Long"]
+        assert fused[1]["score"] == 0.6 / 0.9
+
+    def test_empty_lists(self):
+        """Empty inputs fuse to an empty result."""
+        assert not weighted_fusion([[], []], [0.5, 0.5], top_k=3)
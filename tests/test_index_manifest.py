@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from index_manifest import (
+    diff_manifest,
+    entry_hash,
+    entry_id,
+    load_manifest,
+    save_manifest,
+)
+
+
+class TestIndexManifest:
+    """
+    Tests for the content-hash manifest used by incremental index builds.
+
+    Verifies:
+    - IDs depend on the key only, hashes on key and text.
+    - A saved manifest round-trips; a mismatched one is ignored.
+    - Diffing reports changed and removed keys.
+    """
+
+    def test_ids_and_hashes(self):
+        """Entry IDs are stable per key; hashes track content."""
+        assert entry_id("What is Y-DNA?") == entry_id("What is Y-DNA?")
+        assert entry_id("a") != entry_id("b")
+        assert entry_hash("a", "1") != entry_hash("a", "2")
+
+    def test_round_trip_and_stale(self, tmp_path):
+        """Manifests for another index or chunking are treated as empty."""
+        path = str(tmp_path / "manifest.json")
+        entries = {"a": {"hash": entry_hash("a", "1"), "ids": [entry_id("a")]}}
+        chunking = {"max_tokens": 256, "overlap": 32}
+        save_manifest(path, "idx", None, entries, chunking)
+        assert load_manifest(path, "idx", None, chunking) == entries
+        assert load_manifest(path, "other", None, chunking) == {}
+        assert load_manifest(path, "idx", "ns", chunking) == {}
+        assert load_manifest(path, "idx", None, {"max_tokens": 128}) == {}
+        assert load_manifest(str(tmp_path / "missing.json"), "idx", None) == {}
+
+    def test_diff_manifest(self):
+        """Only new/changed keys are re-embedded, missing ones removed."""
+        manifest = {
+            k: {"hash": entry_hash(k, v), "ids": [entry_id(k)]}
+            for k, v in {"a": "1", "b": "2", "c": "3"}.items()
+        }
+        changed, removed = diff_manifest(
+            {"a": "1", "b": "2!", "d": "4"}, manifest
+        )
+        assert changed == ["b", "d"]
+        assert removed == ["c"]
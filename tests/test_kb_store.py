@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sqlite3
+
+import pytest
+
+from index_manifest import kb_fingerprint
+from kb_store import SqliteKnowledgeBase, build_kb_database
+
+DOCS = {
+    "What is Y-DNA?": "Y-DNA is passed from father to son.",
+    "What is haplogroup R1a-Z93?": "R1a-Z93 is a subclade of R1a.",
+    "Что такое гаплогруппа?": "Гаплогруппа объединяет родственные линии.",
+    "How to order a test?": "Order a Y-DNA test from FamilyTreeDNA.",
+    "what is y-dna": "Duplicate spelling of the first key.",
+}
+
+
+@pytest.fixture(name="kb")
+def fixture_kb(tmp_path):
+    """A database built from DOCS."""
+    path = str(tmp_path / "kb.sqlite3")
+    build_kb_database(DOCS, path)
+    kb = SqliteKnowledgeBase(path)
+    yield kb
+    kb.close()
+
+
+class TestSqliteKnowledgeBase:
+    """
+    Tests for the SQLite/FTS5 knowledge base store.
+
+    Verifies:
+    - The store behaves like the source mapping, in source order.
+    - FTS5 search ranks entries, matches compound identifiers, ignores
+      case and filters by language.
+    - Exact lookups and the stored fingerprint agree with the JSON path.
+    - Databases with another schema version are rejected.
+    """
+
+    def test_mapping(self, kb):
+        """Entries are read on demand like a dict."""
+        assert len(kb) == len(DOCS)
+        assert list(kb) == list(DOCS)
+        assert kb["What is Y-DNA?"] == DOCS["What is Y-DNA?"]
+        assert "missing" not in kb
+        with pytest.raises(KeyError):
+            _ = kb["missing"]
+        assert dict(kb.items()) == DOCS
+
+    def test_search(self, kb):
+        """Full-text search is ranked and weights titles higher."""
+        results = kb.search("what is Y-DNA", top_k=2)
+        assert results[0]["title"] in ("What is Y-DNA?", "what is y-dna")
+        assert results[0]["score"] >= results[1]["score"] > 0
+        assert kb.search("Z93", 3)[0]["title"] == (
+            "What is haplogroup R1a-Z93?"
+        )
+        assert kb.search("ГАПЛОГРУППА", 3)[0]["title"] == (
+            "Что такое гаплогруппа?"
+        )
+        assert kb.search("???", 3) == []
+
+    def test_search_language(self, kb):
+        """A language restricts results to entries in that language."""
+        hits = kb.search("гаплогруппа haplogroup", 5, lang="ru")
+        assert [h["title"] for h in hits] == ["Что такое гаплогруппа?"]
+        assert kb.search("гаплогруппа", 5, lang="en") == []
+
+    def test_exact_and_fingerprint(self, kb):
+        """The first key with a normalized form wins, as in JSON mode."""
+        assert kb.lookup_exact("what is y dna") == (
+            "What is Y-DNA?",
+            DOCS["What is Y-DNA?"],
+        )
+        assert kb.lookup_exact("nothing") is None
+        assert kb.fingerprint == kb_fingerprint(DOCS)
+
+    def test_schema_version(self, tmp_path):
+        """Databases of another schema version are rejected."""
+        path = str(tmp_path / "kb.sqlite3")
+        build_kb_database(DOCS, path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute(
+                "UPDATE meta SET value = '0' WHERE key = 'schema_version'"
+            )
+        conn.close()
+        with pytest.raises(ValueError):
+            SqliteKnowledgeBase(path)
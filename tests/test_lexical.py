@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from lexical import (
+    BM25Index,
+    build_exact_index,
+    detect_language,
+    normalize_question,
+    tokenize,
+)
+
+DOCS = {
+    "What is Y-DNA?": "Y-DNA is passed from father to son.",
+    "What is haplogroup R1a-Z93?": "R1a-Z93 is a subclade of R1a.",
+    "Что такое гаплогруппа?": "Гаплогруппа объединяет родственные линии.",
+    "How to order a test?": "Order a Y-DNA test from FamilyTreeDNA.",
+}
+
+
+class TestTokenize:
+    """
+    Tests for the English/Russian search tokenizer.
+
+    Verifies:
+    - Case folding and the "ё" -> "е" mapping.
+    - Compound identifiers are kept whole and split into parts.
+    """
+
+    def test_case_and_yo(self):
+        """Tokens are case-folded and "ё" is treated as "е"."""
+        assert tokenize("Всё ЕЩЁ Hello") == ["все", "еще", "hello"]
+
+    def test_compound_identifiers(self):
+        """Haplogroup names match both whole and by their parts."""
+        assert tokenize("R1a-Z93.") == ["r1a-z93", "r1a", "z93"]
+
+    def test_detect_language(self):
+        """Any Cyrillic means Russian, Latin only means English."""
+        assert detect_language("What is Y-DNA?") == "en"
+        assert detect_language("Какая mtDNA у Yamnaya?") == "ru"
+        assert detect_language("R1a-Z93") == "en"
+        assert detect_language("123 ?") is None
+
+
+class TestExactIndex:
+    """
+    Tests for the normalized question lookup table.
+
+    Verifies:
+    - Case, whitespace, punctuation and "ё" do not affect the key.
+    - Every knowledge base key is reachable from its normalized form.
+    """
+
+    def test_normalize_question(self):
+        """Trivially different spellings share a normalized form."""
+        assert normalize_question("  What is   Y-DNA? ") == "what is y dna"
+        assert normalize_question("what is y dna") == "what is y dna"
+        assert normalize_question("Что ЕЩЁ есть?!") == "что еще есть"
+
+    def test_build_exact_index(self):
+        """Normalized forms map back to the original keys."""
+        table = build_exact_index(DOCS)
+        assert table["what is haplogroup r1a z93"] == (
+            "What is haplogroup R1a-Z93?"
+        )
+        assert table["что такое гаплогруппа"] == "Что такое гаплогруппа?"
+        assert len(table) == len(DOCS)
+
+
+class TestBM25Index:
+    """
+    Tests for the BM25 inverted index used by the fallback search.
+
+    Verifies:
+    - Results are ranked with descending positive scores.
+    - Title matches outrank body-only matches.
+    - Queries without known terms return nothing.
+    """
+
+    def test_ranked_results(self):
+        """The best matching entry comes first with real scores."""
+        results = BM25Index(DOCS).search("what is haplogroup R1a-Z93", 3)
+        assert results[0]["title"] == "What is haplogroup R1a-Z93?"
+        scores = [r["score"] for r in results]
+        assert scores == sorted(scores, reverse=True)
+        assert all(s > 0 for s in scores)
+
+    def test_title_boost(self):
+        """An entry whose title matches ranks above body-only matches."""
+        results = BM25Index(DOCS).search("order", 2)
+        assert results[0]["title"] == "How to order a test?"
+
+    def test_russian_query(self):
+        """Russian queries match regardless of case."""
+        results = BM25Index(DOCS).search("ГАПЛОГРУППА", 1)
+        assert results[0]["title"] == "Что такое гаплогруппа?"
+
+    def test_no_match(self):
+        """Unknown terms and empty indexes yield no results."""
+        assert not BM25Index(DOCS).search("zzz", 3)
+        assert not BM25Index({}).search("order", 3)
+
+    def test_language_filter(self):
+        """A language-restricted search skips other-language entries."""
+        index = BM25Index(DOCS)
+        assert index.search("Y-DNA гаплогруппа", 3, "ru")[0]["title"] == (
+            "Что такое гаплогруппа?"
+        )
+        assert len(index.search("Y-DNA гаплогруппа", 3, "ru")) == 1
+        assert all(
+            detect_language(r["title"]) == "en"
+            for r in index.search("Y-DNA гаплогруппа", 3, "en")
+        )
+        assert not index.search("order", 3, "de")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+
+import pytest
+
+from metrics import (
+    MetricsRegistry,
+    begin_request,
+    clear_directory,
+    emit_emf,
+    end_request,
+    mark_process_dead,
+    server_timing,
+)
+
+DEAD_PID = 2**22 + 12345  # above Linux's pid_max, so never running
+
+
+class TestMetricsRegistry:
+    """
+    Tests for counters, histograms and the Prometheus text format.
+
+    Verifies:
+    - Counters and histogram buckets are rendered cumulatively.
+    - Timers feed the stage histogram and the spans of a request.
+    - Snapshots of other workers are merged, gauges of dead ones dropped.
+    - Exited workers' files are folded into one without losing counts,
+      and the directory can be emptied at server start.
+    """
+
+    def test_render(self):
+        """Counters, gauges and histograms use the exposition format."""
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.describe("requests_total", "counter", "Requests.")
+        registry.inc("requests_total", {"status": "200"})
+        registry.inc("requests_total", {"status": "200"})
+        registry.observe("stage_seconds", 0.05, {"stage": "embedding"})
+        registry.observe("stage_seconds", 0.5, {"stage": "embedding"})
+        registry.add_collector(lambda: [("cache_entries", {}, 3)])
+        text = registry.render()
+        assert "# HELP cdna_requests_total Requests." in text
+        assert "# TYPE cdna_requests_total counter" in text
+        assert 'cdna_requests_total{status="200"} 2' in text
+        assert "cdna_cache_entries 3" in text
+        assert "# TYPE cdna_stage_seconds histogram" in text
+        assert (
+            'cdna_stage_seconds_bucket{stage="embedding",le="0.1"} 1' in text
+        )
+        assert 'cdna_stage_seconds_bucket{stage="embedding",le="1"} 2' in text
+        assert (
+            'cdna_stage_seconds_bucket{stage="embedding",le="+Inf"} 2' in text
+        )
+        assert 'cdna_stage_seconds_sum{stage="embedding"} 0.55' in text
+        assert 'cdna_stage_seconds_count{stage="embedding"} 2' in text
+
+    def test_timer_records_request_spans(self):
+        """Spans are kept per request; timing outside one still counts."""
+        registry = MetricsRegistry()
+        with registry.timer("retrieval"):
+            pass
+        token = begin_request()
+        with registry.timer("embedding"):
+            pass
+        with pytest.raises(ValueError):
+            with registry.timer("completion"):
+                raise ValueError("boom")
+        spans = end_request(token)
+        assert [stage for stage, _ in spans] == ["embedding", "completion"]
+        assert 'cdna_stage_seconds_count{stage="retrieval"} 1' in (
+            registry.render()
+        )
+
+    def test_multiprocess_merge(self, tmp_path):
+        """A scrape sums every worker's counters from METRICS_DIR."""
+        own = MetricsRegistry(directory=str(tmp_path))
+        own.inc("requests_total")
+        own.flush()
+        other = MetricsRegistry()
+        other.inc("requests_total", value=2)
+        other.observe("stage_seconds", 0.2, {"stage": "completion"})
+        other.add_collector(lambda: [("cache_entries", {}, 5)])
+        for pid in (os.getppid(), DEAD_PID):
+            snapshot = {**other.snapshot(), "pid": pid}
+            with open(tmp_path / f"metrics-{pid}.json", "w") as f:
+                json.dump(snapshot, f)
+
+        text = own.render()
+        assert "cdna_requests_total 5" in text
+        assert 'cdna_stage_seconds_count{stage="completion"} 2' in text
+        # The exited worker's cache no longer exists.
+        assert "cdna_cache_entries 5" in text
+
+    def test_mark_process_dead(self, tmp_path):
+        """Restarted workers leave one totals file, and counts survive."""
+        own = MetricsRegistry(directory=str(tmp_path))
+        dead = MetricsRegistry()
+        dead.inc("requests_total", value=2)
+        dead.observe("stage_seconds", 0.2, {"stage": "completion"})
+        dead.add_collector(lambda: [("cache_entries", {}, 5)])
+        for pid in (DEAD_PID, DEAD_PID + 1):
+            with open(tmp_path / f"metrics-{pid}.json", "w") as f:
+                json.dump({**dead.snapshot(), "pid": pid}, f)
+            mark_process_dead(pid, str(tmp_path))
+
+        assert os.listdir(tmp_path) == ["metrics-exited.json"]
+        text = own.render()
+        assert "cdna_requests_total 4" in text
+        assert 'cdna_stage_seconds_count{stage="completion"} 2' in text
+        assert "cdna_cache_entries" not in text
+
+        clear_directory(str(tmp_path))
+        assert not os.listdir(tmp_path)
+
+    def test_flush_interval(self, tmp_path):
+        """Snapshots are rewritten at most once per interval."""
+        registry = MetricsRegistry(directory=str(tmp_path), flush_interval=60)
+        registry.flush()
+        path = tmp_path / f"metrics-{os.getpid()}.json"
+        assert json.loads(path.read_text())["counters"] == []
+        registry.inc("requests_total")
+        registry.flush()
+        assert json.loads(path.read_text())["counters"] == []
+        registry.flush(force=True)
+        assert len(json.loads(path.read_text())["counters"]) == 1
+
+
+class TestRequestTimings:
+    """
+    Tests for the per-request timing exports.
+
+    Verifies:
+    - Server-Timing merges repeated stages and reports the total.
+    - EMF records carry one millisecond metric per stage.
+    """
+
+    def test_server_timing(self):
+        """Two embeddings become one entry; total comes last."""
+        spans = [("embedding", 0.01), ("retrieval", 0.03), ("embedding", 0.02)]
+        assert server_timing(spans, 0.1) == (
+            "embedding;dur=30.0, retrieval;dur=30.0, total;dur=100.0"
+        )
+
+    def test_emit_emf(self, capsys):
+        """One JSON line CloudWatch can turn into metrics."""
+        emit_emf("cdna", {"endpoint": "chat"}, [("completion", 0.5)], 0.6)
+        record = json.loads(capsys.readouterr().out)
+        metrics = record["_aws"]["CloudWatchMetrics"][0]
+        assert metrics["Namespace"] == "cdna"
+        assert metrics["Dimensions"] == [["endpoint"]]
+        assert {m["Name"] for m in metrics["Metrics"]} == {
+            "completion_ms",
+            "total_ms",
+        }
+        assert record["endpoint"] == "chat"
+        assert record["completion_ms"] == 500.0
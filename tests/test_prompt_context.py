@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from prompt_context import assemble_context, dedupe_contexts, format_context
+from utils import count_tokens
+
+MODEL = "gpt-4o-mini"
+
+
+def _ctx(q, a, score=1.0):
+    """Build a retrieved context."""
+    return {"q": q, "a": a, "score": score}
+
+
+class TestAssembleContext:
+    """
+    Tests for fitting retrieved contexts into the prompt token budget.
+
+    Verifies:
+    - Repeated and contained answers are dropped, keeping the best rank.
+    - Contexts fit the budget in rank order.
+    - The context crossing the budget is truncated or dropped.
+    """
+
+    def test_dedupe(self):
+        """Contained or identical answers keep only the first hit."""
+        contexts = [
+            _ctx("Q1", "Y-DNA is  the paternal line."),
+            _ctx("Q1", "y-dna is the paternal line."),
+            _ctx("Q2", "The paternal line"),
+            _ctx("Q3", ""),
+            _ctx("Q4", "mtDNA is maternal."),
+        ]
+        assert [c["q"] for c in dedupe_contexts(contexts)] == ["Q1", "Q4"]
+
+    def test_everything_fits(self):
+        """Within the budget, contexts are returned unchanged."""
+        contexts = [_ctx("Q1", "A1"), _ctx("Q2", "A2")]
+        selected, used = assemble_context(contexts, 1000, MODEL)
+        assert selected == contexts
+        assert used == sum(
+            count_tokens(format_context(c)) + 1 for c in contexts
+        )
+
+    def test_truncates_within_budget(self):
+        """The context crossing the budget is cut to fill it."""
+        long_answer = " ".join(["haplogroup"] * 200)
+        contexts = [_ctx("Q1", "Short answer."), _ctx("Q2", long_answer)]
+        selected, used = assemble_context(contexts, 100, MODEL, min_tokens=20)
+        assert used <= 100
+        assert selected[0] == contexts[0]
+        assert selected[1]["a"].endswith("…")
+        assert len(selected[1]["a"]) < len(long_answer)
+
+    def test_drops_when_little_budget_left(self):
+        """With too little budget left, a big context is skipped."""
+        big = " ".join(["haplogroup"] * 200)
+        contexts = [_ctx("Q1", big), _ctx("Q2", "Small.")]
+        selected, used = assemble_context(contexts, 30, MODEL, min_tokens=50)
+        assert [c["q"] for c in selected] == ["Q2"]
+        assert used <= 30
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+
+import pytest
+
+from ratelimit import (
+    ConcurrencyLimiter,
+    RedisTokenBucket,
+    TokenBucket,
+    client_ip,
+    retry_after_header,
+)
+
+
+class FakeClock:
+    """A settable monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Records EVAL calls and answers with canned wait times."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def eval(self, script, numkeys, *args):
+        self.calls.append(args)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+class TestTokenBucket:
+    """
+    Tests for per-client token buckets.
+
+    Verifies:
+    - A burst is admitted, then calls wait for the refill rate.
+    - Clients have separate buckets, bounded in number.
+    - The Redis limiter uses the shared bucket and falls back to local
+      buckets when Redis fails.
+    """
+
+    def test_burst_then_rate(self):
+        """After the burst, calls are spaced by 1 / rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=0.5, burst=2, clock=clock)
+        assert bucket.acquire("a") == 0.0
+        assert bucket.acquire("a") == 0.0
+        assert bucket.acquire("a") == pytest.approx(2.0)
+        clock.now = 1.0
+        assert bucket.acquire("a") == pytest.approx(1.0)
+        clock.now = 2.0
+        assert bucket.acquire("a") == 0.0
+        assert bucket.acquire("a", cost=2) == pytest.approx(4.0)
+        assert bucket.stats()["rejected"] == 3
+
+    def test_clients_are_separate_and_bounded(self):
+        """One client's burst does not limit another; old keys go first."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, burst=1, max_keys=2, clock=clock)
+        assert bucket.acquire("a") == 0.0
+        assert bucket.acquire("a") > 0
+        assert bucket.acquire("b") == 0.0
+        assert bucket.acquire("c") == 0.0
+        assert bucket.stats()["keys"] == 2
+        # "a" was evicted, so it starts again with a full bucket.
+        assert bucket.acquire("a") == 0.0
+
+    def test_redis_bucket(self):
+        """The wait comes from Redis; Redis errors use local buckets."""
+        redis = FakeRedis(["0", "1.5", ConnectionError("down")])
+        bucket = RedisTokenBucket(redis, rate=2.0, burst=5, prefix="rl")
+        assert bucket.acquire("1.2.3.4") == 0.0
+        assert bucket.acquire("1.2.3.4") == 1.5
+        assert redis.calls[0] == ("rl:1.2.3.4", 2.0, 5, 1.0)
+        assert bucket.acquire("1.2.3.4") == 0.0
+        assert bucket.stats() == {"keys": 1, "rejected": 1}
+
+
+class TestConcurrencyLimiter:
+    """
+    Tests for the concurrency cap with a bounded queue.
+
+    Verifies:
+    - Calls beyond the limit and the queue are rejected at once.
+    - A queued call gets the slot released by another.
+    - A queued call gives up after the queue timeout.
+    """
+
+    def test_rejects_beyond_queue(self):
+        """With no queue, the call over the limit fails immediately."""
+        slots = ConcurrencyLimiter(1, queue_size=0)
+        assert slots.acquire()
+        started = time.perf_counter()
+        assert not slots.acquire()
+        assert time.perf_counter() - started < 0.1
+        slots.release()
+        assert slots.acquire()
+        assert slots.stats() == {"active": 1, "waiting": 0, "rejected": 1}
+
+    def test_queued_call_gets_released_slot(self):
+        """A waiting call is admitted when a slot frees up."""
+        slots = ConcurrencyLimiter(1, queue_size=1, queue_timeout=2.0)
+        assert slots.acquire()
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(slots.acquire())
+        )
+        waiter.start()
+        while slots.stats()["waiting"] == 0:
+            time.sleep(0.001)
+        # The queue is full: a third caller is turned away.
+        assert not slots.acquire()
+        slots.release()
+        waiter.join()
+        assert results == [True]
+        assert slots.stats()["active"] == 1
+
+    def test_queue_timeout(self):
+        """A queued call stops waiting after the timeout."""
+        slots = ConcurrencyLimiter(1, queue_size=1, queue_timeout=0.05)
+        assert slots.acquire()
+        assert not slots.acquire()
+        assert slots.stats() == {"active": 1, "waiting": 0, "rejected": 1}
+
+
+class TestClientIp:
+    """
+    Tests for client identification.
+
+    Verifies:
+    - Only entries added by trusted proxies are believed.
+    - Retry-After values are whole seconds, at least 1.
+    """
+
+    def test_client_ip(self):
+        """Forged X-Forwarded-For entries are ignored."""
+        forwarded = "6.6.6.6, 1.2.3.4"
+        assert client_ip("10.0.0.1", forwarded, 0) == "10.0.0.1"
+        assert client_ip("10.0.0.1", forwarded, 1) == "1.2.3.4"
+        assert client_ip("10.0.0.1", forwarded, 5) == "6.6.6.6"
+        assert client_ip("10.0.0.1", None, 1) == "10.0.0.1"
+        assert client_ip(None, "", 1) == "unknown"
+
+    def test_retry_after_header(self):
+        """Fractions round up."""
+        assert retry_after_header(0.2) == "1"
+        assert retry_after_header(2.1) == "3"
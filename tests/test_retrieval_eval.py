@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+
+from lexical import BM25Index
+from retrieval_eval import (
+    EvalCase,
+    build_cases,
+    evaluate,
+    format_table,
+    perturb_drop_word,
+    perturb_typo,
+    rank_of,
+)
+
+KB = {
+    "What is haplogroup R1a-Z93?": "A Y-DNA subclade of R1a.",
+    "Who were the Yamnaya?": "Bronze Age steppe herders.",
+    "Что такое митохондриальная ДНК?": "ДНК, наследуемая по материнской линии.",
+}
+
+
+def _retriever(ranking):
+    """A retriever returning the same titles for every query."""
+
+    def search(query, top_k, lang):
+        return [{"title": t, "text": "", "score": 1.0} for t in ranking][
+            :top_k
+        ]
+
+    return search
+
+
+class TestGoldenSet:
+    """
+    Tests for query generation from knowledge base keys.
+
+    Verifies:
+    - Perturbations change the question but keep it usable.
+    - Cases are reproducible for a seed and expect their source key.
+    """
+
+    def test_perturbations(self):
+        """Dropping a word or adding a typo alters one word only."""
+        rng = random.Random(1)
+        question = "Who were the Yamnaya people?"
+        dropped = perturb_drop_word(question, rng).split()
+        assert len(dropped) == 4
+        assert set(dropped) < set(question.split())
+        typo = perturb_typo(question, rng)
+        assert typo != question
+        assert sorted(typo) == sorted(question)
+        assert perturb_drop_word("Yamnaya?", rng) == "Yamnaya?"
+
+    def test_build_cases(self):
+        """One case per sampled key and kind, identical for a seed."""
+        cases = build_cases(list(KB), 2, ["exact", "shuffle"], seed=3)
+        assert cases == build_cases(list(KB), 2, ["exact", "shuffle"], 3)
+        assert [c.kind for c in cases] == ["exact", "shuffle"] * 2
+        exact = [c for c in cases if c.kind == "exact"]
+        assert all(c.query == c.expected in KB for c in exact)
+        assert len(build_cases(list(KB), 10, ["exact"])) == len(KB)
+
+
+class TestEvaluate:
+    """
+    Tests for recall@k, MRR and latency scoring.
+
+    Verifies:
+    - Ranks count distinct titles (passages of one entry collapse).
+    - Recall, MRR and errors are aggregated overall and per kind.
+    - Real retrievers can be scored end to end.
+    """
+
+    def test_rank_of(self):
+        """Repeated passage titles do not push the expected entry down."""
+        hits = [{"title": t} for t in ["A", "A", "B", "C"]]
+        assert rank_of(hits, "B") == 2
+        assert rank_of(hits, "D") is None
+
+    def test_metrics(self):
+        """Ranks 1, 3 and a miss give recall@1 1/3 and MRR (1 + 1/3)/3."""
+        cases = [
+            EvalCase("q1", "A", "exact"),
+            EvalCase("q2", "C", "exact"),
+            EvalCase("q3", "Z", "typo"),
+        ]
+        summary = evaluate(_retriever(["A", "B", "C"]), cases, ks=(1, 3))
+        assert summary["queries"] == 3
+        assert summary["recall@1"] == round(1 / 3, 4)
+        assert summary["recall@3"] == round(2 / 3, 4)
+        assert summary["mrr"] == round((1 + 1 / 3) / 3, 4)
+        assert summary["errors"] == 0
+        assert summary["by_kind"]["typo"]["recall@3"] == 0.0
+        assert summary["by_kind"]["exact"]["mrr"] == round(2 / 3, 4)
+        assert summary["p95_ms"] >= summary["p50_ms"] >= 0.0
+
+    def test_errors_count_as_misses(self):
+        """A failing retriever scores zero and reports its errors."""
+
+        def broken(query, top_k, lang):
+            raise RuntimeError("down")
+
+        summary = evaluate(broken, [EvalCase("q", "A", "exact")])
+        assert summary["errors"] == 1
+        assert summary["recall@10"] == 0.0
+        assert "1 errors" in format_table({"broken": summary}, (1, 3, 10))
+
+    def test_bm25(self):
+        """BM25 finds every exact key first."""
+        index = BM25Index(KB)
+        summary = evaluate(index.search, build_cases(list(KB), 3, ["exact"]))
+        assert summary["recall@1"] == 1.0
+        table = format_table(
+            {"lexical": summary, "local": {"unavailable": "no index"}},
+            (1, 3, 10),
+        )
+        assert "unavailable: no index" in table
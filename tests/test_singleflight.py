@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import threading
+import time
+
+import pytest
+
+from deadline import DeadlineExceeded, deadline
+from singleflight import RedisSingleFlight, SingleFlight
+
+
+class FakeRedis:
+    """The subset of redis.Redis used for coalescing, kept in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        with self.lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+def _burst(flight, key, fn, n=8):
+    """Call `flight.do(key, fn)` from n threads at once."""
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as err:  # collected for assertions
+            errors.append(err)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestSingleFlight:
+    """
+    Tests for in-process call coalescing.
+
+    Verifies:
+    - Concurrent calls with one key run once and share the result.
+    - A failure is raised to every waiting caller.
+    - Completed calls are not cached.
+    - A waiting caller gives up at its request deadline.
+    """
+
+    def test_concurrent_calls_run_once(self):
+        """Eight threads asking at once trigger one computation."""
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "answer"
+
+        flight = SingleFlight()
+        results, errors = _burst(flight, "q", slow)
+        assert results == ["answer"] * 8 and not errors
+        assert len(calls) == 1
+        assert flight.stats() == {"executed": 1, "coalesced": 7}
+
+    def test_error_is_shared(self):
+        """Waiting callers get the leader's exception."""
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        results, errors = _burst(SingleFlight(), "q", failing)
+        assert not results
+        assert len(errors) == 8
+        assert all(isinstance(e, ValueError) for e in errors)
+
+    def test_sequential_calls_recompute(self):
+        """Nothing is kept once a call completes."""
+        flight = SingleFlight()
+        assert flight.do("q", lambda: 1) == 1
+        assert flight.do("q", lambda: 2) == 2
+        assert flight.stats()["coalesced"] == 0
+
+    def test_wait_bounded_by_deadline(self):
+        """A follower raises DeadlineExceeded instead of waiting on."""
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5.0)
+            return "late"
+
+        leader = threading.Thread(target=flight.do, args=("q", slow))
+        leader.start()
+        started.wait()
+        begun = time.monotonic()
+        with deadline(0.1), pytest.raises(DeadlineExceeded):
+            flight.do("q", slow)
+        assert time.monotonic() - begun < 1.0
+        release.set()
+        leader.join()
+
+
+class TestRedisSingleFlight:
+    """
+    Tests for cross-worker coalescing through a shared Redis.
+
+    Verifies:
+    - Two workers (coalescers sharing one Redis) compute once.
+    - A worker takes over when the leader fails.
+    - Redis errors fall back to computing locally; a failed publish
+      still returns the computed result.
+    - Results rejected by `shareable` are not published.
+    - A waiting worker gives up at its request deadline, well before
+      `wait_timeout`.
+    """
+
+    def test_workers_share_result(self):
+        """The second worker reads the first worker's published answer."""
+        redis = FakeRedis()
+        first = RedisSingleFlight(redis, poll_interval=0.01)
+        second = RedisSingleFlight(redis, poll_interval=0.01)
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return {"answer": "shared"}
+
+        leader = threading.Thread(target=first.do, args=("q", slow))
+        leader.start()
+        started.wait()
+        assert second.do("q", slow) == {"answer": "shared"}
+        leader.join()
+        assert len(calls) == 1
+        assert second.stats()["shared"] == 1
+        assert not [k for k in redis.data if ":lock:" in k]
+
+    def test_leader_failure_hands_over(self):
+        """When the leader fails, a waiting worker computes itself."""
+        redis = FakeRedis()
+        first = RedisSingleFlight(redis, poll_interval=0.01)
+        second = RedisSingleFlight(redis, poll_interval=0.01)
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        def run_leader():
+            with pytest.raises(ValueError):
+                first.do("q", failing)
+
+        leader = threading.Thread(target=run_leader)
+        leader.start()
+        started.wait()
+        assert second.do("q", lambda: "recovered") == "recovered"
+        leader.join()
+
+    def test_redis_down_computes_locally(self):
+        """Connection errors do not fail the call."""
+
+        class BrokenRedis(FakeRedis):
+            def get(self, key):
+                raise ConnectionError("redis down")
+
+        flight = RedisSingleFlight(BrokenRedis())
+        assert flight.do("q", lambda: "local") == "local"
+
+    def test_wait_bounded_by_deadline(self):
+        """Polling for another worker stops at the request deadline."""
+        redis = FakeRedis()
+        digest = hashlib.sha256(b"q").hexdigest()
+        redis.set(f"cdna:flight:lock:{digest}", "another worker")
+        flight = RedisSingleFlight(redis, wait_timeout=30.0)
+        calls = []
+        begun = time.monotonic()
+        with deadline(0.1), pytest.raises(DeadlineExceeded):
+            flight.do("q", lambda: calls.append(1))
+        assert time.monotonic() - begun < 1.0
+        assert not calls
+
+    def test_publish_error_keeps_result(self):
+        """A Redis error after computing does not lose the answer."""
+
+        class ReadOnlyRedis(FakeRedis):
+            def set(self, key, value, nx=False, px=None):
+                if ":result:" in key:
+                    raise ConnectionError("redis down")
+                return super().set(key, value, nx=nx, px=px)
+
+        redis = ReadOnlyRedis()
+        flight = RedisSingleFlight(redis)
+        assert flight.do("q", lambda: "answer") == "answer"
+        assert not redis.data
+
+    def test_unshareable_result_not_published(self):
+        """Degraded results are returned but not left for other workers."""
+        redis = FakeRedis()
+        flight = RedisSingleFlight(
+            redis, shareable=lambda answer: answer["source"] == "llm"
+        )
+        degraded = {"answer": "try again", "source": "try_again"}
+        assert flight.do("q", lambda: degraded) == degraded
+        assert not redis.data
+        flight.do("q", lambda: {"answer": "A", "source": "llm"})
+        assert [k for k in redis.data if ":result:" in k]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import logging
+import queue
+
+import numpy as np
+
+import utils
+from utils import BoundedQueueHandler, JsonFormatter, TruncatingFilter
+
+
+def _record(msg, *args, exc_info=None):
+    """Build a log record as a logger call would."""
+    return logging.LogRecord(
+        "app", logging.INFO, __file__, 1, msg, args or None, exc_info
+    )
+
+
+class TestLogging:
+    """
+    Tests for the bounded, queue-based logging setup.
+
+    Verifies:
+    - Large arguments are abbreviated and messages capped.
+    - Argument types are kept, and formatting errors are left to the
+      handler.
+    - Records are JSON lines, tracebacks included.
+    - A full queue drops records instead of blocking.
+    """
+
+    def test_truncating_filter(self):
+        """A list of long contexts renders within the message limit."""
+        contexts = [{"q": f"Q{i}", "a": "x" * 10000} for i in range(50)]
+        record = _record("Contexts: %s (%d)", contexts, 50)
+        assert TruncatingFilter(500).filter(record)
+        message = record.getMessage()
+        assert message.startswith("Contexts: [{")
+        assert message.endswith("chars truncated]")
+        assert len(message) < 600
+        assert record.args == ()
+
+        record = _record("Hits: %d, %s", 3, "ok")
+        TruncatingFilter(500).filter(record)
+        assert record.getMessage() == "Hits: 3, ok"
+
+    def test_truncating_filter_keeps_types(self):
+        """Numpy scalars still format with %d; bad records stay as-is."""
+        record = _record("n=%d", np.int64(3))
+        assert TruncatingFilter(500).filter(record)
+        assert record.getMessage() == "n=3"
+
+        record = _record("%s and %s", "only one")
+        assert TruncatingFilter(500).filter(record)
+        assert record.msg == "%s and %s"
+        assert record.args == ("only one",)
+
+    def test_json_formatter(self):
+        """One JSON object per record, with the traceback as "exc"."""
+        try:
+            raise ValueError("bad")
+        except ValueError as err:
+            record = _record(
+                "Failed: %s", err, exc_info=(type(err), err, None)
+            )
+        TruncatingFilter(100).filter(record)
+        data = json.loads(JsonFormatter().format(record))
+        assert data["level"] == "INFO"
+        assert data["logger"] == "app"
+        assert data["message"] == "Failed: bad"
+        assert "ValueError: bad" in data["exc"]
+
+    def test_full_queue_drops(self):
+        """Records beyond the queue size are counted, not waited on."""
+        handler = BoundedQueueHandler(queue.Queue(2))
+        for i in range(5):
+            handler.handle(_record("message %d", i))
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+        assert handler.queue.get_nowait().getMessage() == "message 0"
+
+
+class TestTokenCounts:
+    """
+    Tests for token counting.
+
+    Verifies:
+    - Counting falls back to the estimate when tiktoken cannot load its
+      encoding.
+    """
+
+    def test_unavailable_encoding_estimates(self, monkeypatch):
+        """A failed encoding download does not break counting."""
+
+        class OfflineTiktoken:
+            """tiktoken without network access to its encoding files."""
+
+            @staticmethod
+            def encoding_for_model(model):
+                raise ConnectionError("offline")
+
+        monkeypatch.setattr("utils.tiktoken", OfflineTiktoken)
+        utils._token_encoding.cache_clear()
+        try:
+            assert utils.count_tokens("one two six") == 3
+            assert utils.truncate_tokens("one two six", 2) == "one two"
+        finally:
+            utils._token_encoding.cache_clear()
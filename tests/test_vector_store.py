@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2025 Mukharbek Organokov
+Website: www.circassiandna.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import pytest
+
+from vector_store import LocalVectorStore
+
+
+@pytest.fixture
+def store():
+    """A tiny store with three orthogonal-ish entries."""
+    matrix = np.array([[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]])
+    return LocalVectorStore(matrix, ["x", "y", "xy"], ["tx", "ty", "txy"])
+
+
+class TestLocalVectorStore:
+    """
+    Tests for the in-process NumPy vector search backend.
+
+    Verifies:
+    - Results are ranked by cosine similarity with correct scores.
+    - top_k larger than the corpus returns every row.
+    - The store round-trips through save/load.
+    """
+
+    def test_search_ranks_by_cosine(self, store):
+        """The closest rows come first with cosine scores."""
+        results = store.search([0.0, 5.0], top_k=2)
+        assert [r["title"] for r in results] == ["y", "xy"]
+        assert results[0]["score"] == pytest.approx(1.0)
+        assert results[1]["score"] == pytest.approx(np.sqrt(0.5))
+        assert results[0]["text"] == "ty"
+
+    def test_search_top_k_exceeds_rows(self, store):
+        """Asking for more rows than stored returns all of them."""
+        assert len(store.search([1.0, 0.0], top_k=10)) == 3
+
+    def test_mismatched_rows_rejected(self):
+        """Matrix rows must align with titles and texts."""
+        with pytest.raises(ValueError):
+            LocalVectorStore(np.zeros((2, 3)), ["a"], ["b"])
+
+    def test_save_and_load(self, store, tmp_path):
+        """A saved store answers queries identically after mapping it."""
+        path = str(tmp_path / "local_index.bin")
+        store.save(path)
+        loaded = LocalVectorStore.load(path)
+        assert len(loaded) == 3
+        assert loaded.titles == ["x", "y", "xy"]
+        assert loaded.search([0.0, 5.0], 2) == store.search([0.0, 5.0], 2)
+
+    def test_save_and_load_float16(self, tmp_path):
+        """float16 artifacts keep non-ASCII entries and close scores."""
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(5000, 8))
+        titles = [f"Что такое {i}?" for i in range(5000)]
+        store = LocalVectorStore(matrix, titles, ["ё"] * 5000)
+        path = str(tmp_path / "local_index.bin")
+        store.save(path, dtype="float16")
+        loaded = LocalVectorStore.load(path)
+        assert loaded.matrix.dtype == np.float16
+        expected = store.search(matrix[42], 1)[0]
+        found = loaded.search(matrix[42], 1)[0]
+        assert found["title"] == expected["title"] == "Что такое 42?"
+        assert found["text"] == "ё"
+        assert found["score"] == pytest.approx(1.0, abs=1e-3)
+
+    def test_load_rejects_foreign_files(self, tmp_path):
+        """Files without the artifact header are rejected."""
+        path = tmp_path / "local_index.bin"
+        path.write_bytes(b"not an index" * 10)
+        with pytest.raises(ValueError):
+            LocalVectorStore.load(str(path))
+
+    def test_language_shards(self, tmp_path):
+        """Searches limited to a language only see that shard."""
+        matrix = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.8, 0.2]])
+        store = LocalVectorStore(
+            matrix,
+            ["en1", "ru1", "en2", "none"],
+            ["a", "b", "c", "d"],
+            ["en", "ru", "en", None],
+        )
+        assert store.shards == {"en": (1, 3), "ru": (3, 4)}
+        path = str(tmp_path / "local_index.bin")
+        store.save(path, dtype="float16")
+        loaded = LocalVectorStore.load(path)
+        assert loaded.shards == store.shards
+        for s in (store, loaded):
+            assert [r["title"] for r in s.search([1.0, 0.0], 5, "en")] == [
+                "en1",
+                "en2",
+            ]
+            assert [r["title"] for r in s.search([1.0, 0.0], 5, "ru")] == [
+                "ru1"
+            ]
+            assert not s.search([1.0, 0.0], 5, "de")
+            assert len(s.search([1.0, 0.0], 5)) == 4
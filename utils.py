@@ -18,9 +18,40 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import atexit
+import json
 import logging
+import os
+import queue
 import re
-from typing import Optional
+import reprlib
+import sys
+import threading
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts for OpenAI models
+    tiktoken = None
+
+LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_MAX_CHARS: int = int(os.environ.get("LOG_MAX_CHARS", "2000"))
+LOG_QUEUE_SIZE: int = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Lambda freezes the process between invocations, which would strand
+# records in the queue, so logging stays synchronous there by default.
+LOG_ASYNC: bool = os.environ.get(
+    "LOG_ASYNC", "false" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else ""
+).lower() not in ("0", "false", "no")
+TEXT_LOG_FORMAT = "%(asctime)s %(name)-12s %(levelname)-8s %(message)s"
+
+# Without tiktoken, tokens are estimated as runs of up to 4 word characters
+# plus single punctuation marks. This overcounts English a little and is
+# close for Russian, so limits based on it are conservative.
+TOKEN_ESTIMATE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+EXACT_TOKEN_COUNTS: bool = tiktoken is not None
 
 
 def remove_trailing_commas(text: str) -> str:
@@ -34,20 +65,251 @@ def remove_trailing_commas(text: str) -> str:
     return text
 
 
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Serialize a record.
+        :param record: The log record.
+        :return: A JSON line with time, level, logger, pid and message
+            (plus the traceback as "exc", if any).
+        """
+        data: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TruncatingFilter(logging.Filter):
+    """
+    Render log messages with bounded cost and length.
+    Container arguments are abbreviated by `reprlib` and strings are cut,
+    so logging a list of retrieved contexts costs about as much as logging
+    a short string, and the message is cut to `max_chars`. The record keeps the rendered
+    message, so nothing downstream formats the payload again.
+    """
+
+    def __init__(self, max_chars: int) -> None:
+        """
+        :param max_chars: Max characters of a rendered message.
+        """
+        super().__init__()
+        self.max_chars = max_chars
+        self._repr = reprlib.Repr()
+        # Ten items of a container together stay within max_chars.
+        self._repr.maxstring = self._repr.maxother = max(max_chars // 10, 20)
+        self._repr.maxlist = self._repr.maxtuple = self._repr.maxdict = 10
+        self._repr.maxlevel = 3
+
+    def _bounded(self, arg: Any) -> Any:
+        """
+        Abbreviate one message argument. Strings and bytes are cut,
+        containers are abbreviated item by item; anything else is passed
+        unchanged so that format codes like %d still accept it.
+        """
+        if isinstance(arg, (str, bytes)):
+            return arg[: self.max_chars]
+        if isinstance(arg, (list, tuple, dict, set, frozenset)):
+            return self._repr.repr(arg)
+        return arg
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Replace the message and arguments by the bounded rendering.
+        If the message cannot be formatted, the record is left as it is,
+        so the handler reports the error as logging normally does.
+        :param record: The log record.
+        :return: True (records are never dropped here).
+        """
+        args = record.args
+        try:
+            if args:
+                if isinstance(args, dict):
+                    args = {k: self._bounded(v) for k, v in args.items()}
+                else:
+                    args = tuple(self._bounded(a) for a in args)
+                message = str(record.msg) % args
+            else:
+                message = str(record.msg)
+        except Exception:  # pylint: disable=broad-except
+            return True
+        if len(message) > self.max_chars:
+            message = (
+                f"{message[: self.max_chars]}"
+                f" [{len(message) - self.max_chars} chars truncated]"
+            )
+        record.msg, record.args = message, ()
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hand records to a background thread through a bounded queue.
+    JSON encoding and the write happen on the listener thread. When the
+    queue is full the record is dropped and counted instead of blocking
+    the request.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[Any]") -> None:
+        """
+        :param log_queue: The queue drained by a `QueueListener`.
+        """
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Detach the record from the calling thread: the traceback is
+        rendered now, since its frames may be gone by the time the
+        listener formats the record.
+        :param record: The log record (message already rendered).
+        :return: The record to enqueue.
+        """
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        record = logging.makeLogRecord(record.__dict__)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue a record, or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_LOGGING_LOCK = threading.Lock()
+_LOGGING_STATE: Dict[str, Any] = {"handler": None, "listener": None}
+
+
+def _shared_handler() -> logging.Handler:
+    """
+    Create, once per process, the handler shared by all module loggers.
+    :return: A queue handler feeding a stderr writer thread, or the
+        stderr handler itself when LOG_ASYNC is off; either way messages
+        are cut to LOG_MAX_CHARS.
+    """
+    with _LOGGING_LOCK:
+        if _LOGGING_STATE["handler"] is not None:
+            return _LOGGING_STATE["handler"]
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(
+            JsonFormatter()
+            if LOG_FORMAT == "json"
+            else logging.Formatter(TEXT_LOG_FORMAT)
+        )
+        handler: logging.Handler = stream
+        if LOG_ASYNC:
+            log_queue: "queue.Queue[Any]" = queue.Queue(LOG_QUEUE_SIZE)
+            handler = BoundedQueueHandler(log_queue)
+            listener = QueueListener(log_queue, stream)
+            listener.start()
+            # Flush what is still queued when the interpreter exits.
+            atexit.register(listener.stop)
+            _LOGGING_STATE["listener"] = listener
+        handler.addFilter(TruncatingFilter(LOG_MAX_CHARS))
+        _LOGGING_STATE["handler"] = handler
+        return handler
+
+
+def logging_stats() -> Dict[str, int]:
+    """
+    Report the state of the asynchronous log queue.
+    :return: Dict with queued and dropped record counts (zeros when
+        logging is synchronous).
+    """
+    handler = _LOGGING_STATE["handler"]
+    if not isinstance(handler, BoundedQueueHandler):
+        return {"queued": 0, "dropped": 0}
+    return {"queued": handler.queue.qsize(), "dropped": handler.dropped}
+
+
 def get_module_logger(mod_name: Optional[str] = None) -> logging.Logger:
     """
     Create and configure a logger for multi-module usage.
+    All loggers share one handler: by default a bounded queue drained by
+    a background thread that writes JSON lines to stderr, so requests
+    never wait on log I/O. The level comes from LOG_LEVEL (default INFO);
+    LOG_FORMAT=text restores the plain text format.
     :param mod_name: The name of the logger. If None, the root logger is used.
     :return: A configured logger instance.
     """
     logger = logging.getLogger(mod_name)
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter(
-            "%(asctime)s %(name)-12s %(levelname)-8s %(message)s"
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.DEBUG)
+        logger.addHandler(_shared_handler())
+        logger.setLevel(LOG_LEVEL)
 
     return logger
+
+
+@lru_cache(maxsize=None)
+def _token_encoding(model: str) -> Any:
+    """
+    Return the (cached) tiktoken encoding of a model, or None without
+    tiktoken or if its encoding files cannot be loaded (they are
+    downloaded on first use).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as err:  # pylint: disable=broad-except
+        get_module_logger(__name__).warning(
+            "tiktoken encoding unavailable, estimating tokens: %s", err
+        )
+        return None
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    """
+    Count the tokens of a text for an OpenAI model.
+    Exact when the optional `tiktoken` package is installed, otherwise a
+    conservative estimate.
+    :param text: The input text.
+    :param model: The model whose tokenizer is used.
+    :return: The number of tokens.
+    """
+    encoding = _token_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(TOKEN_ESTIMATE_RE.findall(text))
+
+
+def truncate_tokens(
+    text: str, max_tokens: int, model: str = "text-embedding-3-small"
+) -> str:
+    """
+    Cut a text to at most `max_tokens` tokens (as counted by
+    `count_tokens`).
+    :param text: The input text.
+    :param max_tokens: Max tokens to keep.
+    :param model: The model whose tokenizer is used.
+    :return: The leading part of the text, or the text if it fits.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _token_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    for i, match in enumerate(TOKEN_ESTIMATE_RE.finditer(text), 1):
+        if i == max_tokens:
+            return text[: match.end()]
+    return text